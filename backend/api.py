@@ -1,11 +1,25 @@
 # backend/api.py
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, jsonify, request, current_app, Response, stream_with_context
 from flask_login import login_user, logout_user, current_user, login_required
 from extensions import db
-from models import Users, Tool, ToolCategory, Request as RequestModel, RequestedTool
-import csv, io
-from sqlalchemy.orm import joinedload
-from datetime import datetime
+import search
+import catalog_cache
+import category_cache
+import user_cache
+import db_pool
+import compression
+import metrics
+import rollups
+import stock_ledger
+import low_stock
+from json_provider import stream_json_array
+from models import (Users, Tool, ToolCategory, ToolUsage, Request as RequestModel, RequestedTool, ConsumptionRollup,
+                    LowStock, available_quantities)
+import csv, io, json, base64, hmac, time
+from sqlalchemy import and_, or_, insert, update, false, func, case
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import joinedload, selectinload
+from datetime import datetime, timedelta
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
@@ -16,9 +30,89 @@ def tool_to_dict(t: Tool):
         "name": t.name,
         "description": t.description or "",
         "quantity": getattr(t, "quantity", 0),  # quantity in stock
-        "category": t.category.name if getattr(t, "category", None) else ""
+        "category": t.category.name if getattr(t, "category", None) else "",
+        "reorder_level": getattr(t, "reorder_level", 0) or 0,
+        "low_stock": low_stock.is_low(getattr(t, "quantity", 0), getattr(t, "reorder_level", 0)),
     }
 
+def _with_available(items):
+    """Attach 'available' (approved minus used) to serialized tools with one aggregate query."""
+    avail = available_quantities(it["id"] for it in items)
+    for it in items:
+        it["available"] = avail.get(it["id"], 0)
+    return items
+
+# legacy (unpaginated) list endpoints are streamed from the database in batches this size
+STREAM_BATCH_SIZE = 500
+
+def _batched(iterable, size=STREAM_BATCH_SIZE):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _decode_cursor(token):
+    """Returns the decoded cursor list, or None if the token is malformed."""
+    try:
+        pad = "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(token + pad).decode("utf-8"))
+    except Exception:
+        return None
+    return values if isinstance(values, list) else None
+
+def _int_arg(name, default=None, minimum=None, maximum=None):
+    """Parse an integer query arg; raises ValueError with a client-facing message."""
+    raw = request.args.get(name)
+    if raw is None or raw == "":
+        return default
+    try:
+        val = int(raw)
+    except Exception:
+        raise ValueError(f"{name} must be integer")
+    if minimum is not None and val < minimum:
+        raise ValueError(f"{name} must be >= {minimum}")
+    if maximum is not None:
+        val = min(val, maximum)
+    return val
+
+def _json_int(value):
+    """
+    int from a JSON body value: ints, integral floats (3.0) and integer strings ("3").
+    Raises ValueError for booleans, fractional floats and anything else int() rejects.
+    """
+    if isinstance(value, bool):
+        raise ValueError("boolean is not an integer")
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError("fractional number is not an integer")
+    return int(value)
+
+def _date_arg(name, end_of_day=False):
+    """
+    Parse an ISO date/datetime query arg; raises ValueError with a client-facing message.
+    A bare date with end_of_day=True becomes the start of the next day (use with '<').
+    """
+    raw = (request.args.get(name) or "").strip()
+    if not raw:
+        return None
+    try:
+        val = datetime.fromisoformat(raw)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO date (YYYY-MM-DD) or datetime")
+    if end_of_day and len(raw) == 10:
+        val += timedelta(days=1)
+    return val
+
+def _truthy_arg(name):
+    return (request.args.get(name) or "").strip().lower() in ("1", "true", "yes", "y")
+
 # --------- Health ---------
 @api_bp.route("/ping")
 def ping():
@@ -112,15 +206,155 @@ def api_logout():
     return jsonify({"message": "ok"}), 200
 
 # --------- Tools ---------
+TOOLS_PAGE_DEFAULT = 50
+TOOLS_PAGE_MAX = 500
+
 @api_bp.route('/tools')
 @login_required
 def list_tools():
+    """
+    Tools ordered by (name, id) with keyset pagination.
+
+    Query params:
+      q            - ranked search over name, description and category (see search.py);
+                     the legacy list is ordered by relevance, pages stay in (name, id) order
+      category     - category name; category_id - category id
+      stock        - 'in' (quantity > 0) | 'out' (quantity <= 0)
+      min_quantity / max_quantity - stock bounds (inclusive)
+      limit        - page size (default 50, max 500)
+      cursor       - opaque token from a previous page's next_cursor
+      include_total=1 - also count all matching rows
+      include_available=1 - add each tool's 'available' quantity (one grouped query per page)
+
+    Without limit/cursor the legacy bare list is returned so older clients keep working;
+    with either, the response is {"items", "next_cursor", "limit"[, "total"]}.
+    """
     q = request.args.get('q', '').lower()
-    query = Tool.query.order_by(Tool.name.asc())
+    paginate = 'limit' in request.args or 'cursor' in request.args
+    try:
+        limit = _int_arg('limit', TOOLS_PAGE_DEFAULT, minimum=1, maximum=TOOLS_PAGE_MAX)
+        category_id = _int_arg('category_id')
+        min_qty = _int_arg('min_quantity')
+        max_qty = _int_arg('max_quantity')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    query = Tool.query.options(joinedload(Tool.category))
+    ranked = None
     if q:
-        query = query.filter(Tool.name.ilike(f"%{q}%"))
-    items = [tool_to_dict(t) for t in query.all()]
-    return jsonify(items), 200
+        # pages filter on every match in the database; the legacy list needs the ranking
+        matches = search.match_ids(q) if paginate else search.search_tool_ids(q)
+        if matches is None:  # no search index on this database
+            query = query.filter(Tool.name.ilike(f"%{q}%"))
+        elif paginate:
+            query = query.filter(Tool.id.in_(matches))
+        else:
+            ranked = [tid for tid, _score in matches]
+
+    cat_name = (request.args.get('category') or '').strip()
+    if cat_name:
+        cid = category_cache.resolve(cat_name)
+        query = query.filter(Tool.category_id == cid if cid is not None else false())
+    if category_id is not None:
+        query = query.filter(Tool.category_id == category_id)
+
+    stock = (request.args.get('stock') or '').strip().lower()
+    if stock == 'in':
+        query = query.filter(Tool.quantity > 0)
+    elif stock == 'out':
+        query = query.filter(Tool.quantity <= 0)
+    elif stock:
+        return jsonify({"error": "stock must be 'in' or 'out'"}), 400
+    if min_qty is not None:
+        query = query.filter(Tool.quantity >= min_qty)
+    if max_qty is not None:
+        query = query.filter(Tool.quantity <= max_qty)
+
+    if not paginate:
+        query = query.order_by(Tool.name.asc(), Tool.id.asc())
+        with_available = _truthy_arg('include_available')
+
+        def batches(rows):
+            if ranked is None:
+                yield from _batched(rows.yield_per(STREAM_BATCH_SIZE))
+                return
+            # relevance order: load the ranked ids a batch at a time, keeping their order
+            for i in range(0, len(ranked), STREAM_BATCH_SIZE):
+                ids = ranked[i:i + STREAM_BATCH_SIZE]
+                by_id = {t.id: t for t in rows.filter(Tool.id.in_(ids))}
+                yield [by_id[tid] for tid in ids if tid in by_id]
+
+        def items():
+            for batch in batches(query):
+                out = [tool_to_dict(t) for t in batch]
+                if with_available:
+                    _with_available(out)
+                yield from out
+        return stream_json_array(items())
+
+    total = None
+    if _truthy_arg('include_total'):
+        # count before the keyset predicate so it reflects the whole filtered set
+        total = query.order_by(None).count()
+
+    token = request.args.get('cursor')
+    if token:
+        values = _decode_cursor(token)
+        if (not values or len(values) != 2 or not isinstance(values[0], str)
+                or not isinstance(values[1], int) or isinstance(values[1], bool)):
+            return jsonify({"error": "invalid cursor"}), 400
+        last_name, last_id = values
+        query = query.filter(or_(
+            Tool.name > last_name,
+            and_(Tool.name == last_name, Tool.id > last_id),
+        ))
+
+    # fetch one extra row to know whether another page exists
+    rows = query.order_by(Tool.name.asc(), Tool.id.asc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = [tool_to_dict(t) for t in rows]
+    if _truthy_arg('include_available'):
+        _with_available(items)
+    out = {
+        "items": items,
+        "next_cursor": _encode_cursor([rows[-1].name, rows[-1].id]) if has_more else None,
+        "limit": limit,
+    }
+    if total is not None:
+        out["total"] = total
+    return jsonify(out), 200
+
+SEARCH_PAGE_MAX = 100
+
+@api_bp.route('/tools/search')
+@login_required
+def search_tools():
+    """Best matches for ?q= (prefix and, on Postgres, typo tolerant), highest score first."""
+    q = (request.args.get('q') or '').strip()
+    try:
+        limit = _int_arg('limit', 20, minimum=1, maximum=SEARCH_PAGE_MAX)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not q:
+        return jsonify([]), 200
+
+    hits = search.search_tool_ids(q, limit=limit)
+    if hits is None:
+        rows = (Tool.query.options(joinedload(Tool.category))
+                .filter(Tool.name.ilike(f"%{q}%"))
+                .order_by(Tool.name.asc(), Tool.id.asc())
+                .limit(limit).all())
+        return jsonify([tool_to_dict(t) for t in rows]), 200
+
+    scores = dict(hits)
+    tools = {t.id: t for t in Tool.query.options(joinedload(Tool.category)).filter(Tool.id.in_(list(scores) or [-1]))}
+    out = []
+    for tid, score in hits:
+        if tid in tools:
+            out.append({**tool_to_dict(tools[tid]), "score": round(score, 4)})
+    return jsonify(out), 200
 
 @api_bp.route('/tools', methods=['POST'])
 @login_required
@@ -130,41 +364,119 @@ def create_tool():
     if not name:
         return jsonify({"error": "name required"}), 400
 
-    cat_name = (data.get('category') or '').strip()
-    category = ToolCategory.query.filter_by(name=cat_name).first() if cat_name else None
+    category_id = category_cache.resolve(data.get('category'))
+
+    try:
+        reorder_level = max(0, int(data.get('reorder_level') or 0))
+    except Exception:
+        return jsonify({"error": "reorder_level must be integer"}), 400
 
     t = Tool(
         name=name,
         description=(data.get('description') or '').strip(),
-        category=category,
+        category_id=category_id,
         quantity=int(data.get('quantity') or 0),
+        reorder_level=reorder_level,
     )
 
     db.session.add(t)
+    db.session.flush()
+    stock_ledger.record(t.id, t.quantity, "initial")
+    if reorder_level:
+        low_stock.refresh([t.id])  # also covers a tool created with no stock
+    search.index_tools([t.id])
     db.session.commit()
+    catalog_cache.invalidate()
     return jsonify(tool_to_dict(t)), 201
 
 @api_bp.route('/tools/<int:tid>', methods=['PUT'])
 @login_required
 def update_tool(tid):
-    t = Tool.query.get_or_404(tid)
     data = request.get_json(force=True) or {}
+    # validate everything before touching the tool: a 400 must not leave half an edit in the session
+    try:
+        new_qty = max(0, int(data.get('quantity'))) if 'quantity' in data else None
+    except Exception:
+        return jsonify({"error": "quantity must be integer"}), 400
+    try:
+        reorder_level = max(0, int(data.get('reorder_level') or 0)) if 'reorder_level' in data else None
+    except Exception:
+        return jsonify({"error": "reorder_level must be integer"}), 400
+
+    query = Tool.query
+    if new_qty is not None:
+        # lock the row so the ledger delta is exact even with approvals running
+        query = query.with_for_update().populate_existing()
+    t = query.get_or_404(tid)
 
     if 'name' in data: t.name = (data.get('name') or '').strip()
     if 'description' in data: t.description = (data.get('description') or '').strip()
-    if 'quantity' in data:
-        try:
-            t.quantity = max(0, int(data.get('quantity')))
-        except Exception:
-            return jsonify({"error": "quantity must be integer"}), 400
+    if new_qty is not None:
+        delta = new_qty - (t.quantity or 0)
+        t.quantity = new_qty
+        db.session.flush()
+        stock_ledger.record(t.id, delta, "edit")
+    if reorder_level is not None:
+        t.reorder_level = reorder_level
 
     if data.get('category') is not None:
-        cat_name = (data.get('category') or '').strip()
-        t.category = ToolCategory.query.filter_by(name=cat_name).first() if cat_name else None
+        t.category_id = category_cache.resolve(data.get('category'))
 
+    db.session.flush()
+    if 'reorder_level' in data:
+        low_stock.refresh([t.id])
+    search.index_tools([t.id])
     db.session.commit()
+    catalog_cache.invalidate()
     return jsonify(tool_to_dict(t)), 200
 
+@api_bp.route('/tools/<int:tid>/restock', methods=['POST'])
+@login_required
+def restock_tool(tid):
+    """Body: {"quantity": n > 0, "note": optional}. Adds to stock atomically and records a restock movement."""
+    data = request.get_json(force=True) or {}
+    try:
+        qty = int(data.get('quantity'))
+    except Exception:
+        return jsonify({"error": "quantity must be integer"}), 400
+    if qty <= 0:
+        return jsonify({"error": "quantity must be > 0"}), 400
+    note = str(data.get('note') or '').strip()[:255] or None
+
+    res = db.session.execute(
+        update(Tool)
+        .where(Tool.id == tid)
+        .values(quantity=func.coalesce(Tool.quantity, 0) + qty)
+        .execution_options(synchronize_session=False)
+    )
+    if res.rowcount != 1:
+        db.session.rollback()
+        return jsonify({"error": "Tool not found"}), 404
+    stock_ledger.record(tid, qty, "restock", note=note)
+    db.session.commit()
+    catalog_cache.invalidate()
+    t = db.session.get(Tool, tid, populate_existing=True)
+    return jsonify(tool_to_dict(t)), 200
+
+@api_bp.route('/tools/<int:tid>/stock', methods=['GET'])
+@login_required
+def tool_stock_at(tid):
+    """
+    Stock of one tool at a point in time (?at=ISO date/datetime; a bare date means the
+    end of that day). Computed from the nearest ledger snapshot plus later movements.
+    """
+    t = Tool.query.get_or_404(tid)
+    try:
+        at = _date_arg('at', end_of_day=True)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if at is None:
+        at = datetime.utcnow()
+    elif len((request.args.get('at') or '').strip()) == 10:
+        at -= timedelta(microseconds=1)  # end of the given day, inclusive
+    qty = stock_ledger.quantities_at([tid], at)[tid]
+    return jsonify({"tool_id": tid, "at": at.isoformat(), "quantity": qty, "current": t.quantity or 0}), 200
+
 @api_bp.route('/tools/<int:tid>', methods=['DELETE'])
 @login_required
 def delete_tool(tid):
@@ -174,8 +486,11 @@ def delete_tool(tid):
         return jsonify({"error": "Invalid admin password"}), 403
 
     t = Tool.query.get_or_404(tid)
-    db.session.delete(t)
+    search.remove_tools([t.id])
+    # tombstone in the ledger, request lines and derived rows go with it (see stock_ledger)
+    stock_ledger.delete_tools([t.id])
     db.session.commit()
+    catalog_cache.invalidate()
     return jsonify({"message": "deleted"}), 200
 
 @api_bp.route('/tools/<int:tid>/checkout', methods=['POST'])
@@ -202,66 +517,301 @@ def checkin_tool(tid):
     db.session.commit()
     return jsonify(tool_to_dict(t)), 200
 
+TOOL_LOGS_PAGE_DEFAULT = 50
+TOOL_LOGS_PAGE_MAX = 500
+
 @api_bp.route('/tools/<int:tid>/logs', methods=['GET'])
 @login_required
 def tool_logs(tid):
-    tool = Tool.query.get_or_404(tid)
-    # Most recent first
-    logs = (
-        tool.usage_records  # relationship from ToolUsage
+    """
+    Usage history of one tool, most recent first: a single query over tool_usage joined
+    to users (only the columns below), served by ix_tool_usage_tool_id_date_used.
+
+    Query params: from / to (ISO dates, inclusive), facility, limit, cursor.
+    Without limit/cursor the legacy bare list is streamed; with either, the response is
+    {"items", "next_cursor", "limit"}. Undated rows sort first, like Postgres' DESC.
+    """
+    Tool.query.get_or_404(tid)
+    paginate = 'limit' in request.args or 'cursor' in request.args
+    try:
+        limit = _int_arg('limit', TOOL_LOGS_PAGE_DEFAULT, minimum=1, maximum=TOOL_LOGS_PAGE_MAX)
+        date_from = _date_arg('from')
+        date_to = _date_arg('to', end_of_day=True)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    facility = (request.args.get('facility') or '').strip()
+
+    query = (
+        db.session.query(ToolUsage.id, ToolUsage.quantity_used, ToolUsage.date_used,
+                         Users.facility, Users.first_name, Users.username)
+        .outerjoin(Users, ToolUsage.user_id == Users.id)
+        .filter(ToolUsage.tool_id == tid)
+        .order_by(ToolUsage.date_used.desc().nulls_first(), ToolUsage.id.desc())
     )
-    out = []
-    for u in sorted(logs, key=lambda x: x.date_used or datetime.min, reverse=True):
-        out.append({
+    if date_from is not None:
+        query = query.filter(ToolUsage.date_used >= date_from)
+    if date_to is not None:
+        query = query.filter(ToolUsage.date_used < date_to)
+    if facility:
+        query = query.filter(Users.facility == facility)
+
+    def log_to_json(u):
+        return {
             "id": u.id,
-            "tool_id": u.tool_id,
+            "tool_id": tid,
             "quantity": u.quantity_used,
             "date": (u.date_used.isoformat() if u.date_used else None),
             # facility via user
-            "facility": getattr(u.user, "facility", ""),
-            "user_name": getattr(u.user, "first_name", getattr(u.user, "username", "")) if u.user else "",
-        })
-    return jsonify(out), 200
+            "facility": u.facility or "",
+            "user_name": u.first_name or u.username or "",
+        }
+
+    if not paginate:
+        return stream_json_array(query.yield_per(STREAM_BATCH_SIZE), log_to_json)
 
+    token = request.args.get('cursor')
+    if token:
+        values = _decode_cursor(token)
+        try:
+            last_date = datetime.fromisoformat(values[0]) if values[0] is not None else None
+            last_id = int(values[1])
+        except Exception:
+            return jsonify({"error": "invalid cursor"}), 400
+        if last_date is None:
+            query = query.filter(or_(
+                and_(ToolUsage.date_used.is_(None), ToolUsage.id < last_id),
+                ToolUsage.date_used.isnot(None),
+            ))
+        else:
+            query = query.filter(or_(
+                ToolUsage.date_used < last_date,
+                and_(ToolUsage.date_used == last_date, ToolUsage.id < last_id),
+            ))
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = _encode_cursor([last.date_used.isoformat() if last.date_used else None, last.id])
+    return jsonify({"items": [log_to_json(u) for u in rows], "next_cursor": next_cursor, "limit": limit}), 200
+
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_COLUMNS = ['id', 'name', 'category', 'quantity', 'description', 'reorder_level']
 
 @api_bp.route('/tools/export')
 @login_required
 def export_csv():
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['id', 'name', 'category', 'tag', 'serial', 'status', 'assignee', 'location'])
-    for t in Tool.query.all():
-        writer.writerow([
-            t.id, t.name, (t.category.name if t.category else ''),
-            getattr(t, 'tag', ''), getattr(t, 'serial', ''), getattr(t, 'status', 'available'),
-            getattr(t, 'assignee', ''), getattr(t, 'location', '')
-        ])
-    output.seek(0)
-    return output.getvalue(), 200, {'Content-Type': 'text/csv; charset=utf-8'}
+    """
+    Streams the tool table as CSV. Rows are fetched in batches (server-side cursor
+    on Postgres) with the category joined in, so memory stays flat and the first
+    bytes go out before the last rows are read. Compressed on the fly by compression.py
+    when the client accepts gzip/brotli.
+    """
+    query = (
+        db.session.query(Tool.id, Tool.name, ToolCategory.name, Tool.quantity, Tool.description, Tool.reorder_level)
+        .outerjoin(ToolCategory, Tool.category_id == ToolCategory.id)
+        .order_by(Tool.id.asc())
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+    def generate_rows():
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(EXPORT_COLUMNS)
+        pending = 0
+        for tid, name, cat_name, qty, desc, level in query:
+            writer.writerow([tid, name, cat_name or '', qty or 0, desc or '', level or 0])
+            pending += 1
+            if pending >= EXPORT_BATCH_SIZE:
+                yield buf.getvalue().encode('utf-8')
+                buf.seek(0)
+                buf.truncate(0)
+                pending = 0
+        yield buf.getvalue().encode('utf-8')
+
+    return Response(
+        stream_with_context(generate_rows()),
+        status=200,
+        headers={'Content-Disposition': 'attachment; filename="tools.csv"'},
+        content_type='text/csv; charset=utf-8',
+    )
+
+IMPORT_CHUNK_DEFAULT = 1000
+IMPORT_CHUNK_MAX = 10000
+IMPORT_MAX_ERRORS = 200
+
+def _first_of(row, *keys):
+    for k in keys:
+        v = row.get(k)
+        if v is not None and str(v).strip():
+            return str(v).strip()
+    return ''
+
+def _ensure_categories(names):
+    """Resolve category names to ids, inserting the missing ones in one batch."""
+    cat_ids = category_cache.resolve_many(names)
+    missing = sorted(n for n in names if n and n not in cat_ids)
+    if missing:
+        db.session.execute(insert(ToolCategory), [{"name": n} for n in missing])
+        category_cache.categories_inserted()  # their ids are cached only if the import commits
+        cat_ids.update(category_cache.resolve_many(missing))
+    return cat_ids
+
+def _import_chunk(chunk, stats):
+    """
+    Upsert one chunk of parsed rows (row_no, name, category, description, quantity, reorder_level)
+    by tool name.
+    Later rows win when a name repeats inside the chunk; the rows they replace count as
+    skipped, so created + updated + skipped always equals the number of rows read.
+    """
+    cat_ids = _ensure_categories({c for _, _, c, _, _, _ in chunk})
+
+    by_name = {}
+    for row_no, name, cat, desc, qty, level in chunk:
+        if name in by_name:
+            stats["skipped"] += 1  # superseded by a later row in the same file
+        by_name[name] = (cat, desc, qty, level)
+
+    existing = {}
+    for tid, tname, tdesc, tqty, tcat, tlevel in (
+        db.session.query(Tool.id, Tool.name, Tool.description, Tool.quantity, Tool.category_id, Tool.reorder_level)
+        .filter(Tool.name.in_(list(by_name)))
+        .order_by(Tool.id.asc())
+        .with_for_update()  # quantities are overwritten below; keeps the ledger deltas exact
+    ):
+        existing.setdefault(tname, (tid, tdesc, tqty, tcat, tlevel))  # oldest row wins on legacy duplicates
+
+    inserts, updates = [], []
+    for name, (cat, desc, qty, level) in by_name.items():
+        cat_id = cat_ids.get(cat) if cat else None
+        if name not in existing:
+            inserts.append({"name": name, "description": desc, "quantity": qty or 0, "category_id": cat_id,
+                            "reorder_level": level or 0})
+            continue
+        tid, cur_desc, cur_qty, cur_cat, cur_level = existing[name]
+        patch = {}
+        if desc and desc != (cur_desc or ''):
+            patch["description"] = desc
+        if qty is not None and qty != cur_qty:
+            patch["quantity"] = qty
+        if cat_id is not None and cat_id != cur_cat:
+            patch["category_id"] = cat_id
+        if level is not None and level != cur_level:
+            patch["reorder_level"] = level
+        if patch:
+            patch["id"] = tid
+            updates.append(patch)
+        else:
+            stats["skipped"] += 1
+
+    movements, levelled = [], []  # levelled: tools whose reorder level was set
+    if inserts:
+        created = db.session.execute(insert(Tool).returning(Tool.id, Tool.quantity, Tool.reorder_level), inserts)
+        for tid, qty, level in created:
+            movements.append({"tool_id": tid, "delta": qty, "kind": "import"})
+            if level:
+                levelled.append(tid)
+        stats["created"] += len(inserts)
+    # group by key set: executemany needs uniform parameter sets
+    groups = {}
+    for patch in updates:
+        groups.setdefault(tuple(sorted(patch)), []).append(patch)
+    for batch in groups.values():
+        db.session.execute(update(Tool), batch)
+    stats["updated"] += len(updates)
+    current = {tid: cur_qty for tid, _desc, cur_qty, _cat, _level in existing.values()}
+    movements += [{"tool_id": p["id"], "delta": p["quantity"] - (current[p["id"]] or 0), "kind": "import"}
+                  for p in updates if "quantity" in p]
+    stock_ledger.record_many(movements)  # also refreshes the low-stock set for these tools
+    levelled += [p["id"] for p in updates if "reorder_level" in p]
+    moved = {m["tool_id"] for m in movements if m["delta"]}
+    low_stock.refresh(tid for tid in levelled if tid not in moved)
+
+    search.index_tools(p["id"] for p in updates)
+    search.index_tools_by_name(r["name"] for r in inserts)
 
 @api_bp.route('/tools/import', methods=['POST'])
 @login_required
 def import_csv():
+    """
+    Streams the uploaded CSV and upserts tools by name in chunks.
+
+    Columns: name (or tool_name), category (or category_name), description, quantity,
+    reorder_level.
+    Unknown categories are created. Optional ?chunk_size= (default 1000).
+    Returns created/updated/skipped counts and a per-row error report.
+    """
     if 'file' not in request.files:
         return jsonify({"error": "file required"}), 400
+    try:
+        chunk_size = _int_arg('chunk_size', IMPORT_CHUNK_DEFAULT, minimum=1, maximum=IMPORT_CHUNK_MAX)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     f = request.files['file']
-    stream = io.StringIO(f.stream.read().decode('utf-8'))
+    stream = io.TextIOWrapper(f.stream, encoding='utf-8-sig', newline='')
     reader = csv.DictReader(stream)
-    created = 0
-    for row in reader:
-        name = row.get('name') or row.get('Name')
-        if not name:
-            continue
-        catname = row.get('category') or row.get('Category')
-        category = ToolCategory.query.filter_by(name=catname).first() if catname else None
-        t = Tool(name=name, description=row.get('description', ''), category=category)
-        for k in ['tag', 'serial', 'status', 'assignee', 'location']:
-            if hasattr(t, k) and row.get(k):
-                setattr(t, k, row.get(k))
-        db.session.add(t)
-        created += 1
-    db.session.commit()
-    return jsonify({"created": created}), 200
+
+    stats = {"created": 0, "updated": 0, "skipped": 0}
+    errors = []
+    error_count = 0
+
+    try:
+        chunk = []
+        for row_no, row in enumerate(reader, start=2):  # header is row 1
+            name = _first_of(row, 'name', 'Name', 'tool_name')
+            if not name:
+                problem = "name required"
+            else:
+                problem = None
+                qty_raw = _first_of(row, 'quantity', 'Quantity')
+                qty = None
+                if qty_raw:
+                    try:
+                        qty = max(0, int(qty_raw))
+                    except ValueError:
+                        problem = f"quantity must be integer (got {qty_raw!r})"
+                level_raw = _first_of(row, 'reorder_level', 'Reorder Level')
+                level = None
+                if level_raw and not problem:
+                    try:
+                        level = max(0, int(level_raw))
+                    except ValueError:
+                        problem = f"reorder_level must be integer (got {level_raw!r})"
+            if problem:
+                stats["skipped"] += 1
+                error_count += 1
+                if len(errors) < IMPORT_MAX_ERRORS:
+                    errors.append({"row": row_no, "error": problem})
+                continue
+
+            chunk.append((
+                row_no,
+                name[:200],
+                _first_of(row, 'category', 'Category', 'category_name'),
+                _first_of(row, 'description', 'Description')[:500],
+                qty,
+                level,
+            ))
+            if len(chunk) >= chunk_size:
+                _import_chunk(chunk, stats)
+                chunk = []
+        if chunk:
+            _import_chunk(chunk, stats)
+        db.session.commit()
+        catalog_cache.invalidate()
+    except UnicodeDecodeError:
+        db.session.rollback()
+        return jsonify({"error": "file must be UTF-8 encoded CSV"}), 400
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("import_csv failed")
+        return jsonify({"error": "Import failed"}), 500
+
+    return jsonify({**stats, "errors": errors, "error_count": error_count}), 200
 
 # --------- Meta ---------
 @api_bp.route('/categories')
@@ -273,19 +823,23 @@ def categories():
 @api_bp.route('/users')
 @login_required
 def users():
-    rows = Users.query.all()
-    out = []
-    for u in rows:
-        role = getattr(u, "role", getattr(u, "roles", "user"))
-        out.append({
+    # plain column rows (no password hash, no ORM identity map) streamed in batches
+    rows = (
+        db.session.query(Users.id, Users.first_name, Users.username, Users.email, Users.facility, Users.roles)
+        .order_by(Users.id)
+        .yield_per(STREAM_BATCH_SIZE)
+    )
+
+    def user_to_json(u):
+        return {
             "id": u.id,
-            "name": getattr(u, "first_name", ""),
-            "username": getattr(u, "username", ""),
-            "email": getattr(u, "email", ""),
-            "facility": getattr(u, "facility", ""),
-            "role": role
-        })
-    return jsonify(out), 200
+            "name": u.first_name or "",
+            "username": u.username or "",
+            "email": u.email or "",
+            "facility": u.facility or "",
+            "role": u.roles or "user",
+        }
+    return stream_json_array(rows, user_to_json)
 
 # --------- Catalog (single route; no duplicates) ---------
 @api_bp.route("/catalog", methods=['GET'])
@@ -293,14 +847,19 @@ def catalog():
     """
     Returns categories with their tools (used by dashboard and request UI).
     Public in dev; can be protected if you prefer.
+    Served from a prebuilt snapshot (catalog_cache.py) with a content ETag; a matching
+    If-None-Match gets 304 without touching the database. Weak comparison, because
+    compression.py marks the ETag weak when it sends a compressed body.
     """
-    cats = ToolCategory.query.options(joinedload(ToolCategory.tools)).order_by(ToolCategory.name.asc()).all()
-    data = [{
-        "id": c.id,
-        "category": c.name,
-        "tools": [{"id": t.id, "name": t.name, "description": t.description or ""} for t in (c.tools or [])]
-    } for c in cats]
-    return jsonify(data), 200
+    etag, body = catalog_cache.get_snapshot()
+    max_age = current_app.config.get("CATALOG_CACHE_MAX_AGE", 0)
+    if request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(body, status=200, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = f"public, max-age={max_age}, must-revalidate"
+    return resp
 
 # --------- Requests (explicit auth checks to always return JSON) ---------
 @api_bp.route("/requests", methods=["POST"])
@@ -313,30 +872,40 @@ def create_request():
         if not items or not isinstance(items, list):
             return jsonify({"error": "items array required"}), 400
 
-        valid = []
+        # merge duplicate tool ids, keeping first-seen order
+        merged = {}
         for it in items:
             try:
-                tid = int(it.get("tool_id"))
-                qty = int(it.get("quantity"))
+                tid = _json_int(it.get("tool_id"))
+                qty = _json_int(it.get("quantity"))
             except Exception:
                 return jsonify({"error": "tool_id and quantity must be integers"}), 400
             if qty <= 0:
                 return jsonify({"error": "quantity must be > 0"}), 400
-            tool = Tool.query.get(tid)
-            if not tool:
+            merged[tid] = merged.get(tid, 0) + qty
+
+        # one lookup for every line: existence + current stock for warnings
+        stock = dict(db.session.query(Tool.id, Tool.quantity).filter(Tool.id.in_(list(merged))).all())
+        for tid in merged:
+            if tid not in stock:
                 return jsonify({"error": f"tool_id {tid} not found"}), 404
-            valid.append((tool, qty))
 
         req = RequestModel(user_id=current_user.id, status="Pending")
         db.session.add(req)
         db.session.flush()  # get req.id
 
-        for tool, qty in valid:
-            db.session.add(RequestedTool(
-                request_id=req.id, tool_id=tool.id, quantity=qty, status="Pending"
-            ))
+        db.session.execute(insert(RequestedTool), [
+            {"request_id": req.id, "tool_id": tid, "quantity": qty, "status": "Pending"}
+            for tid, qty in merged.items()
+        ])
 
         db.session.commit()
+        warnings = [
+            {"tool_id": tid, "requested": qty, "in_stock": stock[tid] or 0}
+            for tid, qty in merged.items() if qty > (stock[tid] or 0)
+        ]
+        if warnings:
+            return jsonify({"message": "request created", "request_id": req.id, "warnings": warnings}), 201
         return jsonify({"message": "request created", "request_id": req.id}), 201
     except Exception:
         current_app.logger.exception("create_request failed")
@@ -398,9 +967,72 @@ def _is_admin_user(u):
 def _admin_required_json():
     return jsonify({"error": "Forbidden: admin only"}), 403
 
+# ---------- Admin: in-process cache counters (per worker) ----------
+@api_bp.route("/admin/caches", methods=["GET"])
+def admin_cache_stats():
+    if not current_user.is_authenticated or not _is_admin_user(current_user):
+        return _admin_required_json()
+    return jsonify({"category": category_cache.stats(), "user": user_cache.stats()}), 200
+
+# ---------- Admin: response compression counters (per worker) ----------
+@api_bp.route("/admin/compression", methods=["GET"])
+def admin_compression_stats():
+    if not current_user.is_authenticated or not _is_admin_user(current_user):
+        return _admin_required_json()
+    return jsonify(compression.stats(current_app)), 200
+
+# ---------- Metrics: Prometheus text for every worker on this host ----------
+@api_bp.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Scrapers send `Authorization: Bearer <METRICS_TOKEN>`; without a token set, admins only."""
+    if "metrics" not in current_app.extensions:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    token = current_app.config.get("METRICS_TOKEN")
+    if token:
+        # bytes: compare_digest rejects non-ASCII str, which a client can send
+        if not hmac.compare_digest(request.headers.get("Authorization", "").encode(), f"Bearer {token}".encode()):
+            return jsonify({"error": "Unauthorized"}), 401
+    elif not current_user.is_authenticated or not _is_admin_user(current_user):
+        return _admin_required_json()
+    return Response(metrics.render(current_app), mimetype="text/plain; version=0.0.4")
+
+# ---------- Admin: recent slow SQL statements (per worker) ----------
+@api_bp.route("/admin/slow-queries", methods=["GET"])
+def admin_slow_queries():
+    if not current_user.is_authenticated or not _is_admin_user(current_user):
+        return _admin_required_json()
+    return jsonify({
+        "threshold_ms": current_app.config.get("SLOW_QUERY_MS"),
+        "queries": metrics.slow_queries(),
+    }), 200
+
+# ---------- Admin: connection pool occupancy and wait times (per worker) ----------
+@api_bp.route("/admin/pool", methods=["GET"])
+def admin_pool_stats():
+    if not current_user.is_authenticated or not _is_admin_user(current_user):
+        return _admin_required_json()
+    opts = {k: v for k, v in (current_app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {}).items()
+            if k != "poolclass"}
+    return jsonify({
+        "config": {**opts, "statement_timeout_ms": current_app.config.get("DB_STATEMENT_TIMEOUT_MS")},
+        "stats": db_pool.stats(),
+    }), 200
+
 # ---------- Admin: list requests (optionally filter by status) ----------
+ADMIN_REQUESTS_PAGE_DEFAULT = 50
+ADMIN_REQUESTS_PAGE_MAX = 200
+
 @api_bp.route("/admin/requests", methods=["GET"])
 def admin_list_requests():
+    """
+    Admin request queue.
+
+    Query params: status, from / to (ISO dates, inclusive), facility, user_id,
+    sort=date_desc|date_asc, limit, cursor.
+    Without limit/cursor the legacy bare list is returned; with either, the response is
+    {"items", "next_cursor", "limit", "counts"} where counts are per status under the
+    same non-status filters (one GROUP BY query).
+    """
     try:
         if not current_user.is_authenticated:
             return jsonify({"error": "Unauthorized"}), 401
@@ -413,15 +1045,69 @@ def admin_list_requests():
         if status not in allowed:
             status = ""
 
+        paginate = "limit" in request.args or "cursor" in request.args
+        try:
+            limit = _int_arg("limit", ADMIN_REQUESTS_PAGE_DEFAULT, minimum=1, maximum=ADMIN_REQUESTS_PAGE_MAX)
+            user_id = _int_arg("user_id")
+            date_from = _date_arg("from")
+            date_to = _date_arg("to", end_of_day=True)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        sort = (request.args.get("sort") or "date_desc").strip().lower()
+        if sort not in ("date_desc", "date_asc"):
+            return jsonify({"error": "sort must be 'date_desc' or 'date_asc'"}), 400
+        facility = (request.args.get("facility") or "").strip()
+
+        # filters shared by the page query and the per-status counts
+        filters = []
+        if user_id is not None:
+            filters.append(RequestModel.user_id == user_id)
+        if date_from is not None:
+            filters.append(RequestModel.date_requested >= date_from)
+        if date_to is not None:
+            filters.append(RequestModel.date_requested < date_to)
+        if facility:
+            filters.append(RequestModel.user_id.in_(
+                db.session.query(Users.id).filter(Users.facility == facility)
+            ))
+
         q = RequestModel.query.options(
-            joinedload(RequestModel.user),
-            joinedload(RequestModel.requested_tools).joinedload(RequestedTool.tool),
-        )
+            selectinload(RequestModel.user),
+            selectinload(RequestModel.requested_tools).selectinload(RequestedTool.tool),
+        ).filter(*filters)
         if status:
             q = q.filter(RequestModel.status == status)
-        q = q.order_by(RequestModel.date_requested.desc())
 
-        def req_to_json(r):
+        # undated requests sort as the newest in both directions (the Postgres default),
+        # spelled out so SQLite pages the same way
+        desc = sort == "date_desc"
+        if desc:
+            q = q.order_by(RequestModel.date_requested.desc().nulls_first(), RequestModel.id.desc())
+        else:
+            q = q.order_by(RequestModel.date_requested.asc().nulls_last(), RequestModel.id.asc())
+
+        token = request.args.get("cursor")
+        if token:
+            values = _decode_cursor(token)
+            try:
+                last_date = datetime.fromisoformat(values[0]) if values[0] is not None else None
+                last_id = int(values[1])
+            except Exception:
+                return jsonify({"error": "invalid cursor"}), 400
+            undated = RequestModel.date_requested.is_(None)
+            if desc and last_date is None:
+                q = q.filter(or_(and_(undated, RequestModel.id < last_id), ~undated))
+            elif desc:
+                q = q.filter(or_(RequestModel.date_requested < last_date,
+                                 and_(RequestModel.date_requested == last_date, RequestModel.id < last_id)))
+            elif last_date is None:
+                q = q.filter(undated, RequestModel.id > last_id)
+            else:
+                q = q.filter(or_(RequestModel.date_requested > last_date,
+                                 and_(RequestModel.date_requested == last_date, RequestModel.id > last_id),
+                                 undated))
+
+        def req_to_json(r, avail):
             return {
                 "id": r.id,
                 "status": r.status,
@@ -453,18 +1139,220 @@ def admin_list_requests():
                         "status": ln.status,
                         # 👉 real current stock from Tool.quantity
                         "in_stock": (getattr(ln.tool, "quantity", 0) or 0),
+                        "available": avail.get(ln.tool_id, 0),
                     }
                     for ln in (r.requested_tools or [])
                 ],
             }
 
-        data = [req_to_json(r) for r in q.all()]
-        return jsonify(data), 200
+        def page_to_json(rows):
+            # one availability query per page/batch for every tool on its lines
+            avail = available_quantities({ln.tool_id for r in rows for ln in (r.requested_tools or [])})
+            return [req_to_json(r, avail) for r in rows]
+
+        if not paginate:
+            def items():
+                for batch in _batched(q.yield_per(STREAM_BATCH_SIZE)):
+                    yield from page_to_json(batch)
+            return stream_json_array(items())
+
+        rows = q.limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = None
+        if has_more:
+            last = rows[-1]
+            next_cursor = _encode_cursor([last.date_requested.isoformat() if last.date_requested else None, last.id])
+
+        counts = dict.fromkeys(["Pending", "Approved", "Rejected"], 0)
+        counts.update(
+            db.session.query(RequestModel.status, func.count(RequestModel.id))
+            .filter(*filters)
+            .group_by(RequestModel.status)
+            .all()
+        )
+        return jsonify({
+            "items": page_to_json(rows),
+            "next_cursor": next_cursor,
+            "limit": limit,
+            "counts": counts,
+        }), 200
 
     except Exception:
         current_app.logger.exception("admin_list_requests failed")
         return jsonify({"error": "Failed to load admin requests"}), 500
         
+# ---------- Admin: tools at or below their reorder level ----------
+@api_bp.route("/admin/low-stock", methods=["GET"])
+def admin_low_stock():
+    """
+    Tools in the low-stock set (low_stock.py), most short first; optional category_id.
+    Reads only the set, so the cost follows the number of shortages, not the catalogue.
+    """
+    if not current_user.is_authenticated or not _is_admin_user(current_user):
+        return _admin_required_json()
+    try:
+        category_id = _int_arg("category_id")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    q = (
+        db.session.query(LowStock.tool_id, Tool.name, ToolCategory.name, LowStock.quantity,
+                         LowStock.reorder_level, LowStock.since)
+        .join(Tool, Tool.id == LowStock.tool_id)
+        .outerjoin(ToolCategory, Tool.category_id == ToolCategory.id)
+        .order_by((LowStock.quantity - LowStock.reorder_level).asc(), Tool.name.asc())
+    )
+    if category_id is not None:
+        q = q.filter(Tool.category_id == category_id)
+    items = [{
+        "id": tid,
+        "name": name,
+        "category": cat or "",
+        "quantity": qty,
+        "reorder_level": level,
+        "shortfall": level - qty,
+        "since": since.isoformat() if since else None,
+    } for tid, name, cat, qty, level, since in q]
+    return jsonify({"items": items, "count": len(items)}), 200
+
+# ---------- Admin: monthly consumption report (served from consumption_rollup) ----------
+def _month_arg(name):
+    """YYYY-MM or an ISO date -> first day of that month; raises ValueError for the client."""
+    raw = (request.args.get(name) or "").strip()
+    if not raw:
+        return None
+    try:
+        val = datetime.strptime(raw, "%Y-%m") if len(raw) == 7 else datetime.fromisoformat(raw)
+    except ValueError:
+        raise ValueError(f"{name} must be a month (YYYY-MM) or an ISO date")
+    return rollups.month_start(val)
+
+@api_bp.route("/admin/reports/consumption", methods=["GET"])
+def admin_consumption_report():
+    """
+    Approved and used quantities per tool, facility and month.
+
+    Query params: from / to (YYYY-MM, inclusive), facility, tool_id, category_id.
+    Reads only the rollup rows in range (rollups.py keeps them current), so the cost
+    follows the size of the report, not the length of the history.
+    """
+    if not current_user.is_authenticated or not _is_admin_user(current_user):
+        return _admin_required_json()
+    try:
+        month_from = _month_arg("from")
+        month_to = _month_arg("to")
+        tool_id = _int_arg("tool_id")
+        category_id = _int_arg("category_id")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    facility = (request.args.get("facility") or "").strip()
+
+    R = ConsumptionRollup
+    q = (
+        db.session.query(R.tool_id, Tool.name, R.facility, R.month, R.approved_qty, R.used_qty)
+        .join(Tool, Tool.id == R.tool_id)
+        .filter(or_(R.approved_qty != 0, R.used_qty != 0))  # keys whose movements cancelled out
+        .order_by(R.month.desc(), R.facility.asc(), Tool.name.asc())
+    )
+    if month_from is not None:
+        q = q.filter(R.month >= month_from)
+    if month_to is not None:
+        q = q.filter(R.month <= month_to)
+    if facility:
+        q = q.filter(R.facility == facility)
+    if tool_id is not None:
+        q = q.filter(R.tool_id == tool_id)
+    if category_id is not None:
+        q = q.filter(Tool.category_id == category_id)
+
+    items = []
+    totals = {"approved": 0, "used": 0}
+    for tid, name, fac, month, approved, used in q:
+        items.append({
+            "tool_id": tid,
+            "tool_name": name,
+            "facility": fac,
+            "month": month.strftime("%Y-%m"),
+            "approved": approved,
+            "used": used,
+        })
+        totals["approved"] += approved
+        totals["used"] += used
+    return jsonify({"items": items, "totals": totals}), 200
+
+# ---------- Stock deduction (safe under concurrent approvals) ----------
+APPROVE_MAX_ATTEMPTS = 3
+
+class StockConflict(Exception):
+    """Raised inside an approval transaction to abort it with a client-facing message."""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def _is_retryable(exc):
+    # Postgres serialization failure / deadlock; SQLite busy
+    code = getattr(getattr(exc, "orig", None), "pgcode", None)
+    return code in ("40001", "40P01") or "database is locked" in str(exc).lower()
+
+def _with_retry(fn):
+    """Run fn() as one transaction, retrying on serialization failures/deadlocks with backoff."""
+    for attempt in range(1, APPROVE_MAX_ATTEMPTS + 1):
+        try:
+            out = fn()
+            db.session.commit()
+            return out
+        except DBAPIError as e:
+            db.session.rollback()
+            if attempt == APPROVE_MAX_ATTEMPTS or not _is_retryable(e):
+                raise
+            time.sleep(0.05 * 2 ** (attempt - 1))
+        except Exception:
+            db.session.rollback()
+            raise
+
+def _deduct_stock(totals):
+    """
+    Atomically take totals {tool_id: qty} out of stock.
+    Each tool is decremented with a conditional UPDATE (quantity >= qty), in ascending id
+    order so concurrent approvals lock rows in the same order and cannot deadlock.
+    Raises StockConflict (409) naming the first tool that is short; the caller rolls back.
+    """
+    for tid in sorted(totals):
+        qty = totals[tid]
+        res = db.session.execute(
+            update(Tool)
+            .where(Tool.id == tid, Tool.quantity >= qty)
+            .values(quantity=Tool.quantity - qty)
+            .execution_options(synchronize_session=False)
+        )
+        if res.rowcount != 1:
+            row = db.session.query(Tool.name, Tool.quantity).filter(Tool.id == tid).first()
+            if row is None:
+                raise StockConflict(f"Tool {tid} not found", 404)
+            raise StockConflict(
+                f"Insufficient stock for '{row.name}'. Requested {qty}, in stock {row.quantity or 0}. "
+                "Edit quantity to match stock before approval.",
+                409,
+            )
+
+def _claim_pending(req_ids, new_status, stamp_column):
+    """
+    Move pending requests to new_status with a conditional UPDATE.
+    Returns how many rows were claimed: another admin may have processed some already.
+    """
+    values = {"status": new_status, stamp_column: datetime.utcnow()}
+    if hasattr(RequestModel, "approved_by_id"):
+        values["approved_by_id"] = current_user.id
+    res = db.session.execute(
+        update(RequestModel)
+        .where(RequestModel.id.in_(list(req_ids)), RequestModel.status == "Pending")
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    return res.rowcount
+
 # ---------- Admin: approve a whole request ----------
 @api_bp.route("/admin/requests/<int:req_id>/approve", methods=["POST"])
 def admin_approve_request(req_id):
@@ -474,7 +1362,7 @@ def admin_approve_request(req_id):
     if (role or "").lower() != "admin":
         return jsonify({"error": "Forbidden: admin only"}), 403
 
-    r = RequestModel.query.options(joinedload(RequestModel.requested_tools).joinedload(RequestedTool.tool)).get(req_id)
+    r = db.session.get(RequestModel, req_id)
     if not r:
         return jsonify({"error": "Request not found"}), 404
 
@@ -482,55 +1370,232 @@ def admin_approve_request(req_id):
     if (r.status or "").lower() != "pending":
         return jsonify({"error": "Only pending requests can be approved"}), 400
 
-    # 1) Validate
-    for ln in (r.requested_tools or []):
-        tool = ln.tool
-        if not tool:
-            return jsonify({"error": f"Tool for line {ln.id} not found"}), 404
-        in_stock = (getattr(tool, "quantity", 0) or 0)
-        if ln.quantity > in_stock:
-            return jsonify({
-                "error": f"Insufficient stock for '{tool.name}'. Requested {ln.quantity}, in stock {in_stock}. "
-                         "Edit quantity to match stock before approval."
-            }), 400
-
-    # 2) Deduct and approve
-    for ln in (r.requested_tools or []):
-        tool = ln.tool
-        tool.quantity = (tool.quantity or 0) - ln.quantity
-        ln.status = "Approved"
-        db.session.add(tool)
-
-    r.status = "Approved"
-    if hasattr(r, "date_approved"):
-        from datetime import datetime as _dt
-        r.date_approved = _dt.utcnow()
-    # optional: who approved
-    if hasattr(r, "approved_by_id"):
-        r.approved_by_id = current_user.id
+    def approve():
+        # status flip first: a concurrent approval of the same request claims nothing and stops here
+        if _claim_pending([req_id], "Approved", "date_approved") != 1:
+            raise StockConflict("Only pending requests can be approved", 409)
+        totals = {}
+        for tid, qty in db.session.query(RequestedTool.tool_id, RequestedTool.quantity).filter(
+            RequestedTool.request_id == req_id
+        ):
+            totals[tid] = totals.get(tid, 0) + (qty or 0)
+        _deduct_stock(totals)
+        stock_ledger.record_many(
+            {"tool_id": tid, "delta": -qty, "kind": "approval", "request_id": req_id} for tid, qty in totals.items()
+        )
+        db.session.execute(
+            update(RequestedTool)
+            .where(RequestedTool.request_id == req_id)
+            .values(status="Approved")
+            .execution_options(synchronize_session=False)
+        )
+        rollups.record_approvals([req_id])
 
-    db.session.commit()
+    try:
+        _with_retry(approve)
+    except StockConflict as e:
+        return jsonify({"error": e.message}), e.status
+    catalog_cache.invalidate()  # availability changed
     return jsonify({"message": "approved"}), 200
 
+# ---------- Admin: approve/reject many requests in one transaction ----------
+BATCH_MAX_REQUESTS = 500
+
+@api_bp.route("/admin/requests/batch", methods=["POST"])
+def admin_batch_requests():
+    """
+    Body: {"ids": [request ids], "action": "approve" | "reject"}
+
+    Requests and tools are locked (FOR UPDATE, ascending id) and read in one query each,
+    stock is allocated per tool across the whole batch in the order the ids were given,
+    and all deductions go out as a single UPDATE ... CASE. Requests that do not fit the
+    remaining stock are left pending. Returns one outcome per id.
+    """
+    if not current_user.is_authenticated or not _is_admin_user(current_user):
+        return _admin_required_json()
+
+    data = request.get_json(force=True) or {}
+    action = (data.get("action") or "").strip().lower()
+    if action not in ("approve", "reject"):
+        return jsonify({"error": "action must be 'approve' or 'reject'"}), 400
+    raw_ids = data.get("ids")
+    if not isinstance(raw_ids, list) or not raw_ids:
+        return jsonify({"error": "ids array required"}), 400
+    try:
+        ids = list(dict.fromkeys(_json_int(i) for i in raw_ids))  # dedupe, keep order
+    except Exception:
+        return jsonify({"error": "ids must be integers"}), 400
+    if len(ids) > BATCH_MAX_REQUESTS:
+        return jsonify({"error": f"at most {BATCH_MAX_REQUESTS} ids per batch"}), 400
+
+    def run():
+        outcomes = {}
+        statuses = dict(
+            db.session.query(RequestModel.id, RequestModel.status)
+            .filter(RequestModel.id.in_(ids))
+            .order_by(RequestModel.id.asc())
+            .with_for_update()
+            .all()
+        )
+        pending = []
+        for rid in ids:
+            if rid not in statuses:
+                outcomes[rid] = {"id": rid, "result": "not_found"}
+            elif (statuses[rid] or "").lower() != "pending":
+                outcomes[rid] = {"id": rid, "result": "not_pending", "status": statuses[rid]}
+            else:
+                pending.append(rid)
+
+        done = []
+        if action == "reject":
+            done = pending
+        elif pending:
+            lines = {}
+            for rid, tid, qty in db.session.query(
+                RequestedTool.request_id, RequestedTool.tool_id, RequestedTool.quantity
+            ).filter(RequestedTool.request_id.in_(pending)):
+                per_tool = lines.setdefault(rid, {})
+                per_tool[tid] = per_tool.get(tid, 0) + (qty or 0)
+            tool_ids = sorted({tid for per_tool in lines.values() for tid in per_tool})
+            stock = {
+                tid: (name, qty or 0)
+                for tid, name, qty in db.session.query(Tool.id, Tool.name, Tool.quantity)
+                .filter(Tool.id.in_(tool_ids))
+                .order_by(Tool.id.asc())
+                .with_for_update()
+            }
+
+            remaining = {tid: qty for tid, (_name, qty) in stock.items()}
+            totals = {}
+            for rid in pending:
+                need = lines.get(rid, {})
+                short = [tid for tid, qty in need.items() if remaining.get(tid, 0) < qty]
+                if short:
+                    tid = min(short)
+                    name = stock[tid][0] if tid in stock else f"tool {tid}"
+                    outcomes[rid] = {
+                        "id": rid, "result": "insufficient_stock",
+                        "error": f"Insufficient stock for '{name}'. Requested {need[tid]}, "
+                                 f"available {remaining.get(tid, 0)} after earlier requests in this batch.",
+                    }
+                    continue
+                for tid, qty in need.items():
+                    remaining[tid] -= qty
+                    totals[tid] = totals.get(tid, 0) + qty
+                done.append(rid)
+
+            if totals:
+                delta = case(totals, value=Tool.id, else_=0)
+                res = db.session.execute(
+                    update(Tool)
+                    .where(Tool.id.in_(list(totals)), Tool.quantity >= delta)
+                    .values(quantity=Tool.quantity - delta)
+                    .execution_options(synchronize_session=False)
+                )
+                if res.rowcount != len(totals):  # rows are locked, so only a bug or odd isolation gets here
+                    raise StockConflict("Stock changed while approving; please retry", 409)
+                stock_ledger.record_many(
+                    {"tool_id": tid, "delta": -qty, "kind": "approval", "request_id": rid}
+                    for rid in done for tid, qty in lines.get(rid, {}).items()
+                )
+
+        if done:
+            new_status = "Approved" if action == "approve" else "Rejected"
+            stamp = "date_approved" if action == "approve" else "date_rejected"
+            if _claim_pending(done, new_status, stamp) != len(done):
+                raise StockConflict("Some requests were processed concurrently; please retry", 409)
+            db.session.execute(
+                update(RequestedTool)
+                .where(RequestedTool.request_id.in_(done))
+                .values(status=new_status)
+                .execution_options(synchronize_session=False)
+            )
+            if action == "approve":
+                rollups.record_approvals(done)
+            result = "approved" if action == "approve" else "rejected"
+            for rid in done:
+                outcomes[rid] = {"id": rid, "result": result}
+        return [outcomes[rid] for rid in ids]
+
+    try:
+        results = _with_retry(run)
+    except StockConflict as e:
+        return jsonify({"error": e.message}), e.status
+    summary = {}
+    for o in results:
+        summary[o["result"]] = summary.get(o["result"], 0) + 1
+    if summary.get("approved"):
+        catalog_cache.invalidate()  # availability changed
+    return jsonify({"results": results, "summary": summary}), 200
+
 @api_bp.route("/admin/requests/<int:req_id>/reject", methods=["POST"])
 def admin_reject_request(req_id):
     if not current_user.is_authenticated or not _is_admin_user(current_user):
         return _admin_required_json()
 
-    r = RequestModel.query.options(joinedload(RequestModel.requested_tools)).get(req_id)
+    r = db.session.get(RequestModel, req_id)
     if not r:
         return jsonify({"error": "Request not found"}), 404
 
-    r.status = "Rejected"
-    r.date_rejected = datetime.utcnow()
-    # Only set approver if the model has the column/relationship
-    if hasattr(r, "approved_by_id"):
-        r.approved_by_id = current_user.id
+    if r.status != "Approved":
+        def reject():
+            # conditional flip: an approval committed since the read claims nothing here
+            if _claim_pending([req_id], "Rejected", "date_rejected") != 1:
+                raise StockConflict("Only pending or approved requests can be rejected", 409)
+            db.session.execute(
+                update(RequestedTool)
+                .where(RequestedTool.request_id == req_id)
+                .values(status="Rejected")
+                .execution_options(synchronize_session=False)
+            )
 
-    for ln in r.requested_tools or []:
-        ln.status = "Rejected"
+        try:
+            _with_retry(reject)
+        except StockConflict as e:
+            return jsonify({"error": e.message}), e.status
+        return jsonify({"message": "rejected"}), 200
+
+    def reverse():
+        # an approved request already took its stock: put it back, with the ledger and rollup
+        rollups.record_approvals([req_id], sign=-1)  # before the lines stop counting as approved
+        values = {"status": "Rejected", "date_rejected": datetime.utcnow()}
+        if hasattr(RequestModel, "approved_by_id"):
+            values["approved_by_id"] = current_user.id
+        res = db.session.execute(
+            update(RequestModel)
+            .where(RequestModel.id == req_id, RequestModel.status == "Approved")
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        if res.rowcount != 1:  # another admin rejected it first
+            raise StockConflict("Request is no longer approved", 409)
+        totals = {}
+        for tid, qty in db.session.query(RequestedTool.tool_id, RequestedTool.quantity).filter(
+            RequestedTool.request_id == req_id
+        ):
+            totals[tid] = totals.get(tid, 0) + (qty or 0)
+        for tid in sorted(totals):  # same lock order as _deduct_stock
+            db.session.execute(
+                update(Tool)
+                .where(Tool.id == tid)
+                .values(quantity=Tool.quantity + totals[tid])
+                .execution_options(synchronize_session=False)
+            )
+        stock_ledger.record_many(
+            {"tool_id": tid, "delta": qty, "kind": "reversal", "request_id": req_id} for tid, qty in totals.items()
+        )
+        db.session.execute(
+            update(RequestedTool)
+            .where(RequestedTool.request_id == req_id)
+            .values(status="Rejected")
+            .execution_options(synchronize_session=False)
+        )
 
-    db.session.commit()
+    try:
+        _with_retry(reverse)
+    except StockConflict as e:
+        return jsonify({"error": e.message}), e.status
+    catalog_cache.invalidate()  # stock and availability changed
     return jsonify({"message": "rejected"}), 200
 
 # ---------- Admin: edit a pending request (update line quantities/status) ----------
@@ -539,7 +1604,7 @@ def admin_edit_request(req_id):
     if not current_user.is_authenticated or not _is_admin_user(current_user):
         return _admin_required_json()
 
-    r = RequestModel.query.options(joinedload(RequestModel.requested_tools)).get(req_id)
+    r = db.session.get(RequestModel, req_id, options=[joinedload(RequestModel.requested_tools)])
     if not r:
         return jsonify({"error": "Request not found"}), 404
     if (r.status or "").lower() != "pending":
@@ -559,7 +1624,7 @@ def admin_edit_request(req_id):
         ln = line_map[lid]
         if patch.get("quantity") is not None:
             try:
-                qv = int(patch.get("quantity"))
+                qv = _json_int(patch.get("quantity"))
             except Exception:
                 return jsonify({"error": "quantity must be integer"}), 400
             if qv <= 0:
@@ -577,7 +1642,7 @@ def admin_delete_request(req_id):
     if not current_user.is_authenticated or not _is_admin_user(current_user):
         return _admin_required_json()
 
-    r = RequestModel.query.get(req_id)
+    r = db.session.get(RequestModel, req_id)
     if not r:
         return jsonify({"error": "Request not found"}), 404
     if (r.status or "").lower() != "pending":
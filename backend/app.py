@@ -1,24 +1,68 @@
 import os
-from datetime import datetime
-from flask import Flask, send_from_directory, abort
-from werkzeug.security import generate_password_hash, check_password_hash
-from flask_login import LoginManager, current_user, login_required, login_user, logout_user
-from sqlalchemy.orm import joinedload
+import sys
+import time
+import logging
+import click
+from flask import Flask, abort
+from flask_login import LoginManager
 from flask_cors import CORS
 
 from extensions import db, migrate
-from models import Users, Request, Tool, ToolCategory, RequestedTool, ToolUsage
 from config import Config
-from api import api_bp
+import user_cache
+import db_pool
+import compression
+import metrics
+from json_provider import FastJSONProvider
+
+DEFAULT_CATEGORIES = ["Office Supplies", "Cleaning", "Furniture"]
+
+
+def init_db():
+    """
+    Create missing tables, seed the default categories and build the local search index.
+    Run by `flask init-db` in the pre-deploy step (after `flask db upgrade`), or on
+    startup when DB_INIT_ON_STARTUP is on (local development).
+    """
+    import search
+    import catalog_cache
+    from models import ToolCategory
+
+    db.create_all()
+    present = {n for (n,) in db.session.query(ToolCategory.name).filter(ToolCategory.name.in_(DEFAULT_CATEGORIES))}
+    missing = [n for n in DEFAULT_CATEGORIES if n not in present]
+    for name in missing:
+        db.session.add(ToolCategory(name=name))
+    db.session.commit()
+    if missing:
+        catalog_cache.invalidate()
+    search.ensure_index()  # SQLite FTS5 table for local runs; Postgres uses the migration
 
 
 def create_app():
+    t0 = time.perf_counter()
+    timings = []
+
+    def mark(phase):
+        timings.append((phase, time.perf_counter()))
+
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)  # orjson when installed, stdlib json otherwise
     app.config.from_object(Config)
+    if _under_gunicorn():
+        # reuse gunicorn's handlers and --log-level so app.logger.info reaches the service log
+        gunicorn_error = logging.getLogger("gunicorn.error")
+        app.logger.handlers = gunicorn_error.handlers
+        app.logger.setLevel(gunicorn_error.level)
+    mark("config")
 
     # --- Extensions ---
+    db_pool.configure(app)  # timed pool class; must precede engine creation
     db.init_app(app)
+    db_pool.install(app)
+    metrics.install(app)  # per-endpoint latency, SQL counts, slow-query log
     migrate.init_app(app, db)
+    mark("database")
     CORS(
         app,
         resources={
@@ -39,6 +83,7 @@ def create_app():
             }
         },
     )
+    mark("cors")
     # --- Login manager (kept for compatibility with any API that needs current_user) ---
     login_manager = LoginManager()
     login_manager.init_app(app)
@@ -46,7 +91,8 @@ def create_app():
 
     @login_manager.user_loader
     def load_user(user_id):
-        return Users.query.get(int(user_id))
+        # cached, column-limited snapshot; see user_cache.py
+        return user_cache.load(int(user_id))
     
     @login_manager.unauthorized_handler
     def _unauthorized():
@@ -56,31 +102,67 @@ def create_app():
             return jsonify({"error": "Unauthorized"}), 401
         return redirect(url_for('login'))
 
-    # --- One-time DB setup / seeding ---
-    with app.app_context():
-        db.create_all()
-        # Default categories (customize as you like)
-        default_categories = ["Office Supplies", "Cleaning", "Furniture"]
-        for name in default_categories:
-            if not ToolCategory.query.filter_by(name=name).first():
-                db.session.add(ToolCategory(name=name))
-        db.session.commit()
+    mark("login")
+
+    # --- Schema / default data: pre-deploy step in production, optional on startup ---
+    @app.cli.command("init-db")
+    def init_db_command():
+        """Create tables, seed default categories and build the search index."""
+        init_db()
+        print("database initialised")
+
+    @app.cli.command("rebuild-rollups")
+    def rebuild_rollups_command():
+        """Recompute the monthly consumption rollup from request lines and usage (backfill)."""
+        import rollups
+        print(f"consumption_rollup rebuilt: {rollups.rebuild()} rows")
+
+    @app.cli.command("stock-snapshot")
+    def stock_snapshot_command():
+        """Snapshot ledger quantities of tools that moved since their last snapshot (run nightly)."""
+        import stock_ledger
+        print(f"stock snapshots written: {stock_ledger.snapshot()}")
+
+    @app.cli.command("reconcile-stock")
+    @click.option("--fix", is_flag=True, help="Record adjustment movements so the ledger matches Tool.quantity.")
+    def reconcile_stock_command(fix):
+        """Compare every tool's quantity with its stock ledger; exit 1 on drift unless --fix."""
+        import stock_ledger
+        drift = stock_ledger.reconcile(fix=fix)
+        for d in drift:
+            print(f"tool {d['tool_id']} {d['name']!r}: quantity={d['quantity']} ledger={d['ledger']} drift={d['drift']:+d}")
+        print(f"{len(drift)} tool(s) out of balance" + (" (adjusted)" if fix and drift else ""))
+        if drift and not fix:
+            sys.exit(1)
+
+    @app.cli.command("rebuild-low-stock")
+    def rebuild_low_stock_command():
+        """Recompute the low-stock set from tool quantities and reorder levels."""
+        import low_stock
+        print(f"low-stock set rebuilt: {low_stock.rebuild()} tool(s) low")
+
+    if app.config.get("DB_INIT_ON_STARTUP"):
+        with app.app_context():
+            init_db()
+        mark("init_db")
 
     # --- Register API blueprint ---
+    from api import api_bp
     app.register_blueprint(api_bp)  # all /api/* routes
+    compression.install(app)  # gzip/brotli for /api/* responses above API_COMPRESS_MIN_BYTES
+    mark("blueprints")
 
     # =========================
     # Serve React SPA build
     # =========================
     # Expecting frontend to be at ../frontend/dist relative to this file
-    DIST_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "frontend", "dist"))
+    from spa_assets import DEFAULT_DIST as DIST_FOLDER, SpaAssets
     app.static_folder = DIST_FOLDER
     app.static_url_path = "/"
 
-    def _dist_exists() -> bool:
-        index_path = os.path.join(DIST_FOLDER, "index.html")
-        return os.path.isdir(DIST_FOLDER) and os.path.isfile(index_path)
-
+    # stat-only scan once; precompressed siblings come from the build (see spa_assets.py)
+    spa = SpaAssets(DIST_FOLDER)
+    app.extensions["spa_assets"] = spa
 
     @app.route("/", defaults={"path": ""})
     @app.route("/<path:path>")
@@ -89,7 +171,9 @@ def create_app():
         Catch-all to serve the React build. If a real static asset exists in dist, serve it.
         Otherwise, return index.html so the SPA router can handle it.
         """
-        if not _dist_exists():
+        if app.debug:
+            spa.scan()  # pick up `npm run build` output without a restart
+        if not spa.has_index:
             # Helpful message if you forgot to build the frontend
             return (
                 "Frontend build not found. Run:\n"
@@ -104,17 +188,36 @@ def create_app():
         if path.startswith("api/"):
             abort(404)
 
-        # Serve actual static files if they exist
-        absolute_target = os.path.join(DIST_FOLDER, path)
-        if path and os.path.exists(absolute_target) and os.path.isfile(absolute_target):
-            return send_from_directory(DIST_FOLDER, path)
-
-        # SPA fallback
-        return send_from_directory(DIST_FOLDER, "index.html")
+        # Serve actual static files if they exist, else the SPA fallback
+        return spa.response(path) or spa.response("index.html")
 
+    mark("spa")
+    _report_startup(app, t0, timings)
     return app
 
 
+def _under_gunicorn():
+    return os.environ.get("SERVER_SOFTWARE", "").startswith("gunicorn")  # set by the gunicorn arbiter
+
+
+def _serving():
+    """True under gunicorn or `flask run`; CLI commands and scripts that build the app stay quiet."""
+    return _under_gunicorn() or os.environ.get("FLASK_RUN_FROM_CLI") == "true"
+
+
+def _report_startup(app, t0, timings):
+    """One log line per worker boot: total create_app time and the cost of each phase."""
+    phases, prev = {}, t0
+    for phase, at in timings:
+        phases[phase] = round(1000 * (at - prev), 1)
+        prev = at
+    total = 1000 * (prev - t0)
+    app.config["STARTUP_TIMINGS_MS"] = phases
+    if app.config.get("STARTUP_TIMING_REPORT") and _serving():
+        detail = ", ".join(f"{k}={v}ms" for k, v in phases.items())
+        app.logger.info("create_app pid=%s ready in %.1fms (%s)", os.getpid(), total, detail)
+
+
 if __name__ == "__main__":
     app = create_app()
     port = int(os.environ.get("PORT", 5000))
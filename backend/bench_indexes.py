@@ -0,0 +1,170 @@
+"""
+Before/after latency benchmark for the hot-path indexes (migration c5d2a8e4f1b6).
+
+Seeds a synthetic dataset into a scratch database, drops the indexes, times
+my_requests / admin_list_requests / tool_logs / list_tools through the Flask test
+client, recreates the indexes and times them again.
+
+    python bench_indexes.py                                   # temp SQLite file
+    python bench_indexes.py --database-url postgresql://...   # scratch Postgres DB (tables are dropped!)
+    python bench_indexes.py --requests 200000 --explain
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Benchmark hot-path queries with and without indexes.")
+    p.add_argument("--database-url", help="Scratch database URL (default: a temporary SQLite file). ALL TABLES ARE DROPPED.")
+    p.add_argument("--users", type=int, default=200)
+    p.add_argument("--tools", type=int, default=5000)
+    p.add_argument("--requests", type=int, default=50000)
+    p.add_argument("--lines", type=int, default=3, help="requested_tool rows per request")
+    p.add_argument("--usage", type=int, default=100000, help="tool_usage rows")
+    p.add_argument("--repeat", type=int, default=20, help="timed calls per endpoint")
+    p.add_argument("--explain", action="store_true", help="print the query plan of each representative query")
+    return p.parse_args()
+
+
+def seed(db, models, args):
+    from sqlalchemy import insert
+    from werkzeug.security import generate_password_hash
+    Users, ToolCategory, Tool, Request, RequestedTool, ToolUsage = models
+    rnd = random.Random(42)
+    pw = generate_password_hash("bench")
+    start = datetime(2022, 1, 1)
+
+    db.session.execute(insert(Users), [{
+        "first_name": f"User{i}", "email": f"u{i}@bench", "username": f"bench{i}", "password": pw,
+        "facility": f"Facility {i % 40}", "roles": "admin" if i == 0 else "user", "is_active_flag": True,
+    } for i in range(args.users)])
+    db.session.execute(insert(ToolCategory), [{"name": f"Bench Category {i}"} for i in range(50)])
+    cat_ids = [c for (c,) in db.session.query(ToolCategory.id)]
+    db.session.execute(insert(Tool), [{
+        "name": f"Tool {i:06d}", "description": f"synthetic tool {i}", "quantity": rnd.randint(0, 500),
+        "category_id": rnd.choice(cat_ids),
+    } for i in range(args.tools)])
+    user_ids = [u for (u,) in db.session.query(Users.id)]
+    tool_ids = [t for (t,) in db.session.query(Tool.id)]
+
+    batch = 10000
+    for lo in range(0, args.requests, batch):
+        n = min(batch, args.requests - lo)
+        db.session.execute(insert(Request), [{
+            "user_id": rnd.choice(user_ids),
+            "status": rnd.choices(["Pending", "Approved", "Rejected"], weights=[1, 8, 1])[0],
+            "date_requested": start + timedelta(minutes=rnd.randint(0, 60 * 24 * 1000)),
+        } for _ in range(n)])
+    req_ids = [r for (r,) in db.session.query(Request.id)]
+    lines = [{"request_id": r, "tool_id": rnd.choice(tool_ids), "quantity": rnd.randint(1, 20), "status": "Approved"}
+             for r in req_ids for _ in range(args.lines)]
+    for lo in range(0, len(lines), batch):
+        db.session.execute(insert(RequestedTool), lines[lo:lo + batch])
+    for lo in range(0, args.usage, batch):
+        n = min(batch, args.usage - lo)
+        db.session.execute(insert(ToolUsage), [{
+            "tool_id": rnd.choice(tool_ids[:50]),  # concentrate history on a few heavily used tools
+            "user_id": rnd.choice(user_ids), "quantity_used": rnd.randint(1, 5),
+            "date_used": start + timedelta(minutes=rnd.randint(0, 60 * 24 * 1000)),
+        } for _ in range(n)])
+    db.session.commit()
+    return user_ids, tool_ids
+
+
+def timed(client, url, repeat):
+    client.get(url)  # warm-up (caches, prepared statements)
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        r = client.get(url)
+        samples.append((time.perf_counter() - t0) * 1000)
+        if r.status_code != 200:
+            raise RuntimeError(f"{url} -> {r.status_code}: {r.data[:200]!r}")
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def explain(db, queries):
+    from sqlalchemy import text
+    dialect = db.engine.dialect.name
+    prefix = "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN "
+    for name, (sql, params) in queries.items():
+        print(f"  [{name}]")
+        for row in db.session.execute(text(prefix + sql), params):
+            print("    " + " | ".join(str(c) for c in row))
+
+
+def main():
+    args = parse_args()
+    url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = url
+    os.environ["DEV_DATABASE_URL"] = url
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    from app import create_app
+    from api import _encode_cursor
+    from extensions import db
+    from models import Users, ToolCategory, Tool, Request, RequestedTool, ToolUsage
+
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        t0 = time.perf_counter()
+        user_ids, tool_ids = seed(db, (Users, ToolCategory, Tool, Request, RequestedTool, ToolUsage), args)
+        print(f"seeded in {time.perf_counter() - t0:.1f}s on {db.engine.dialect.name}")
+
+        indexes = [ix for table in db.metadata.sorted_tables for ix in table.indexes]
+        busy_user = db.session.query(Request.user_id).group_by(Request.user_id) \
+            .order_by(db.func.count().desc()).limit(1).scalar()
+        busy_tool = tool_ids[0]
+        endpoints = {
+            "my_requests": ("/api/requests", f"bench{user_ids.index(busy_user)}"),
+            "admin_list_requests": ("/api/admin/requests?status=Pending&limit=50", "bench0"),
+            "tool_logs": (f"/api/tools/{busy_tool}/logs", "bench0"),
+            "list_tools": ("/api/tools?limit=50&cursor=" + _encode_cursor(["Tool 002500", 0]), "bench0"),
+        }
+        queries = {
+            "my_requests": ("SELECT id FROM request WHERE user_id = :u ORDER BY date_requested DESC", {"u": busy_user}),
+            "admin_list_requests": ("SELECT id FROM request WHERE status = 'Pending' "
+                                    "ORDER BY date_requested DESC, id DESC LIMIT 51", {}),
+            "tool_logs": ("SELECT id FROM tool_usage WHERE tool_id = :t ORDER BY date_used DESC", {"t": busy_tool}),
+            "list_tools": ("SELECT id FROM tool WHERE name > 'Tool 002500' ORDER BY name, id LIMIT 51", {}),
+        }
+
+    clients = {}
+    for _name, (_url, user) in endpoints.items():
+        if user not in clients:
+            c = app.test_client()
+            assert c.post("/api/login", json={"username": user, "password": "bench"}).status_code == 200
+            clients[user] = c
+
+    results = {}
+    for phase in ("before", "after"):
+        with app.app_context():
+            for ix in indexes:
+                if phase == "before":
+                    ix.drop(db.engine, checkfirst=True)
+                else:
+                    ix.create(db.engine, checkfirst=True)
+            if args.explain:
+                print(f"\nquery plans ({phase}):")
+                explain(db, queries)
+                db.session.rollback()
+        for name, (path, user) in endpoints.items():
+            results.setdefault(name, {})[phase] = timed(clients[user], path, args.repeat)
+
+    print(f"\n{'endpoint':<22}{'before p50':>12}{'p95':>10}{'after p50':>12}{'p95':>10}{'speedup':>10}")
+    for name, r in results.items():
+        (b50, b95), (a50, a95) = r["before"], r["after"]
+        print(f"{name:<22}{b50:>10.1f}ms{b95:>8.1f}ms{a50:>10.1f}ms{a95:>8.1f}ms{b50 / a50:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
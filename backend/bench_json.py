@@ -0,0 +1,133 @@
+"""
+Throughput and peak-memory benchmark for JSON responses (json_provider.py).
+
+Seeds a synthetic tool catalogue into a scratch database, then for each encoder
+(stdlib json via Flask's DefaultJSONProvider, and FastJSONProvider/orjson when
+installed) times:
+
+  buffered  - the previous /api/tools implementation: load every row, build the
+              list of dicts, jsonify() it in one piece
+  streamed  - the current /api/tools legacy list (stream_json_array over yield_per)
+  paged     - /api/tools?limit=500, a normal jsonify() response
+
+Peak memory is the tracemalloc high-water mark while one response is produced and
+consumed chunk by chunk, so it covers rows, dicts and the encoded body.
+
+    python bench_json.py                                   # temp SQLite file
+    python bench_json.py --database-url postgresql://...   # scratch Postgres DB (tables are dropped!)
+    python bench_json.py --tools 100000 --repeat 5
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+import statistics
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Benchmark JSON encoding and streamed list responses.")
+    p.add_argument("--database-url", help="Scratch database URL (default: a temporary SQLite file). ALL TABLES ARE DROPPED.")
+    p.add_argument("--tools", type=int, default=50000)
+    p.add_argument("--repeat", type=int, default=5, help="timed calls per case")
+    return p.parse_args()
+
+
+def seed(db, Tool, ToolCategory, n):
+    from sqlalchemy import insert
+    db.session.execute(insert(ToolCategory), [{"name": f"Bench Category {i}"} for i in range(50)])
+    cat_ids = [c for (c,) in db.session.query(ToolCategory.id)]
+    for lo in range(0, n, 10000):
+        db.session.execute(insert(Tool), [{
+            "name": f"Tool {i:07d}", "description": f"synthetic tool {i} – ünïcode description text",
+            "quantity": i % 500, "category_id": cat_ids[i % len(cat_ids)],
+        } for i in range(lo, min(n, lo + 10000))])
+    db.session.commit()
+
+
+def consume(client, url):
+    """Issue a GET and read the body chunk by chunk without keeping it; returns the body size."""
+    r = client.get(url, buffered=False)
+    if r.status_code != 200:
+        raise RuntimeError(f"{url} -> {r.status_code}")
+    size = 0
+    for chunk in r.response:
+        size += len(chunk)
+    r.close()
+    return size
+
+
+def measure(client, url, repeat):
+    consume(client, url)  # warm-up
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        size = consume(client, url)
+        samples.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    consume(client, url)
+    _cur, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(samples), size, peak
+
+
+def main():
+    args = parse_args()
+    url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = url
+    os.environ["DEV_DATABASE_URL"] = url
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    from flask import jsonify
+    from flask.json.provider import DefaultJSONProvider
+    from werkzeug.security import generate_password_hash
+    from sqlalchemy.orm import joinedload
+    from app import create_app
+    from api import tool_to_dict
+    from extensions import db
+    from json_provider import FastJSONProvider, orjson
+    from models import Users, Tool, ToolCategory
+
+    app = create_app()
+
+    @app.route("/bench/buffered-tools")
+    def buffered_tools():
+        rows = Tool.query.options(joinedload(Tool.category)).order_by(Tool.name.asc(), Tool.id.asc()).all()
+        return jsonify([tool_to_dict(t) for t in rows]), 200
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(Users(first_name="Bench", email="b@bench", username="bench", facility="HQ",
+                             password=generate_password_hash("bench"), roles="admin"))
+        db.session.commit()
+        t0 = time.perf_counter()
+        seed(db, Tool, ToolCategory, args.tools)
+        print(f"seeded {args.tools} tools in {time.perf_counter() - t0:.1f}s on {db.engine.dialect.name}")
+
+    client = app.test_client()
+    assert client.post("/api/login", json={"username": "bench", "password": "bench"}).status_code == 200
+
+    providers = [("json", DefaultJSONProvider)]
+    if orjson is not None:
+        providers.append(("orjson", FastJSONProvider))
+    else:
+        print("orjson is not installed; FastJSONProvider uses the stdlib encoder")
+    cases = [
+        ("buffered", "/bench/buffered-tools", args.tools),
+        ("streamed", "/api/tools", args.tools),
+        ("paged", "/api/tools?limit=500", 500),
+    ]
+
+    print(f"\n{'encoder':<9}{'case':<11}{'p50':>10}{'items/s':>12}{'MB/s':>9}{'body':>10}{'peak mem':>11}")
+    for enc_name, provider_cls in providers:
+        app.json = provider_cls(app)
+        for case, path, items in cases:
+            secs, size, peak = measure(client, path, args.repeat)
+            print(f"{enc_name:<9}{case:<11}{secs * 1000:>8.1f}ms{items / secs:>12,.0f}"
+                  f"{size / secs / 1e6:>9.1f}{size / 1e6:>8.1f}MB{peak / 1e6:>9.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
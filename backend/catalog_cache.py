@@ -0,0 +1,95 @@
+# backend/catalog_cache.py
+"""
+Prebuilt /api/catalog body (categories -> tools) kept per worker process.
+
+Each tool carries its available quantity (models.available_quantities), so approvals
+and rejections invalidate the snapshot as well as tool writes.
+
+The snapshot is rebuilt only when the catalog version changes. The version is the single
+row of the catalog_version table, so every process that shares the database sees a bump:
+web workers on any instance, the pre-deploy `flask init-db` and seed.py alike.
+invalidate() increments it after a committed write; checking it is one primary-key read.
+A TTL (CATALOG_SNAPSHOT_TTL) bounds staleness if a writer ever forgets to invalidate.
+"""
+import json
+import time
+import hashlib
+import threading
+
+from flask import current_app
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import CatalogVersion, Tool, ToolCategory, available_quantities
+
+_lock = threading.Lock()
+_snapshot = {}  # database url -> (version, built_at, etag, body)
+
+
+def _key():
+    return current_app.config.get("SQLALCHEMY_DATABASE_URI") or ""
+
+
+def _current_version():
+    return db.session.execute(select(CatalogVersion.version).where(CatalogVersion.id == 1)).scalar()
+
+
+def invalidate():
+    """
+    Mark the catalog as changed for every process. Call after the write has committed:
+    the bump runs on its own connection and commits immediately.
+    """
+    with db.engine.begin() as conn:
+        res = conn.execute(update(CatalogVersion).where(CatalogVersion.id == 1).values(version=CatalogVersion.version + 1))
+        if res.rowcount == 0:
+            try:
+                with conn.begin_nested():
+                    conn.execute(insert(CatalogVersion).values(id=1, version=1))
+            except IntegrityError:  # another process created it first
+                conn.execute(update(CatalogVersion).where(CatalogVersion.id == 1).values(version=CatalogVersion.version + 1))
+    _snapshot.pop(_key(), None)
+
+
+def _build():
+    """Three flat queries instead of a joinedload fan-out; returns the serialized body."""
+    cats = db.session.query(ToolCategory.id, ToolCategory.name).order_by(ToolCategory.name.asc()).all()
+    avail = available_quantities()
+    tools = {}
+    for tid, name, desc, cat_id in (
+        db.session.query(Tool.id, Tool.name, Tool.description, Tool.category_id)
+        .filter(Tool.category_id.isnot(None))
+        .order_by(Tool.name.asc(), Tool.id.asc())
+    ):
+        tools.setdefault(cat_id, []).append(
+            {"id": tid, "name": name, "description": desc or "", "available": avail.get(tid, 0)}
+        )
+    data = [{"id": cid, "category": cname, "tools": tools.get(cid, [])} for cid, cname in cats]
+    provider = current_app.json
+    if hasattr(provider, "dumps_bytes"):
+        return provider.dumps_bytes(data)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def get_snapshot():
+    """Returns (etag, body_bytes) for the current catalog, rebuilding at most once per change."""
+    key = _key()
+    ttl = current_app.config.get("CATALOG_SNAPSHOT_TTL", 300)
+    version = _current_version()
+    snap = _snapshot.get(key)
+    if snap and snap[0] == version and version is not None and time.monotonic() - snap[1] < ttl:
+        return snap[2], snap[3]
+
+    with _lock:
+        snap = _snapshot.get(key)
+        if snap and snap[0] == version and version is not None and time.monotonic() - snap[1] < ttl:
+            return snap[2], snap[3]
+        if version is None:
+            db.session.rollback()  # end the read transaction before bumping on another connection
+            invalidate()
+            version = _current_version()
+        # version is read before building: a write committing mid-build bumps it again
+        body = _build()
+        etag = hashlib.sha1(body).hexdigest()
+        _snapshot[key] = (version, time.monotonic(), etag, body)
+        return etag, body
@@ -0,0 +1,149 @@
+# backend/category_cache.py
+"""
+Shared ToolCategory name -> id resolver for every tool write path.
+
+A bounded LRU per worker process. Only hits are cached (an unknown name is looked up
+again next time, so categories created elsewhere show up immediately). ORM updates and
+deletes of ToolCategory clear the cache. Entries also expire after CATEGORY_CACHE_TTL
+seconds to bound staleness from other processes.
+
+Only committed ids are cached. Once a transaction has inserted categories (bulk paths
+call categories_inserted(); ORM inserts are caught by a listener), lookups in it are
+held on the session and reach the cache after commit, or are dropped on rollback, so a
+failed import cannot leave ids of rows that never existed.
+"""
+import time
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from extensions import db
+from models import ToolCategory
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # (db url, name) -> (id, stored_at)
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_HELD = "category_cache_held"  # session.info key: {(db url, name): id} awaiting commit
+
+
+def _url():
+    return str(db.session.get_bind().url)
+
+
+def _limits():
+    cfg = current_app.config
+    return cfg.get("CATEGORY_CACHE_SIZE", 1024), cfg.get("CATEGORY_CACHE_TTL", 600)
+
+
+def _get(key, ttl):
+    hit = _entries.get(key)
+    if hit is None:
+        return None
+    if time.monotonic() - hit[1] > ttl:
+        del _entries[key]
+        return None
+    _entries.move_to_end(key)
+    return hit[0]
+
+
+def _store(pairs):
+    size, _ttl = _limits()
+    with _lock:
+        for key, category_id in pairs:
+            _entries[key] = (category_id, time.monotonic())
+            _entries.move_to_end(key)
+        while len(_entries) > size:
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+
+
+def remember(name, category_id):
+    """Record a known name -> id; held until commit if this transaction inserted categories."""
+    if not name or category_id is None:
+        return
+    key = (_url(), name)
+    held = db.session.info.get(_HELD)
+    if held is not None:
+        held[key] = category_id
+    else:
+        _store([(key, category_id)])
+
+
+def categories_inserted(session=None):
+    """Call after inserting ToolCategory rows with Core statements in the current transaction."""
+    (session or db.session).info.setdefault(_HELD, {})
+
+
+def resolve_many(names):
+    """Returns {name: id} for the names that exist; misses are fetched with one IN query."""
+    names = {(n or "").strip() for n in names}
+    names.discard("")
+    if not names:
+        return {}
+    url = _url()
+    _size, ttl = _limits()
+    out, missing = {}, []
+    with _lock:
+        for n in names:
+            cid = _get((url, n), ttl)
+            if cid is None:
+                missing.append(n)
+            else:
+                out[n] = cid
+        _stats["hits"] += len(out)
+        _stats["misses"] += len(missing)
+    for i in range(0, len(missing), 500):
+        for cid, cname in (
+            db.session.query(ToolCategory.id, ToolCategory.name)
+            .filter(ToolCategory.name.in_(missing[i:i + 500]))
+        ):
+            out[cname] = cid
+            remember(cname, cid)
+    return out
+
+
+def resolve(name):
+    """Id of the category called name, or None if it does not exist (or name is blank)."""
+    name = (name or "").strip()
+    if not name:
+        return None
+    return resolve_many([name]).get(name)
+
+
+def invalidate():
+    with _lock:
+        _entries.clear()
+
+
+def stats():
+    with _lock:
+        return {**_stats, "size": len(_entries), "max_size": _limits()[0]}
+
+
+@event.listens_for(ToolCategory, "after_insert")
+def _category_inserted(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        categories_inserted(session)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_held(session):
+    held = session.info.pop(_HELD, None)
+    if held:
+        _store(held.items())
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_held(session, previous_transaction):
+    session.info.pop(_HELD, None)  # savepoint rollbacks too; losing cache entries is harmless
+
+
+@event.listens_for(ToolCategory, "after_update")
+@event.listens_for(ToolCategory, "after_delete")
+def _category_changed(mapper, connection, target):
+    # renames/deletes are rare; dropping everything keeps this trivially correct
+    invalidate()
@@ -0,0 +1,236 @@
+# backend/compression.py
+"""
+gzip / brotli compression for /api/* responses.
+
+install(app) adds an after_request hook that compresses JSON, CSV and text responses
+when the client's Accept-Encoding allows it:
+
+  - buffered responses at or above API_COMPRESS_MIN_BYTES are compressed in one go;
+    bodies that carry a strong ETag keep their compressed form in a small LRU, so a
+    prebuilt body (e.g. the /api/catalog snapshot) is compressed once per version
+  - streamed responses (stream_json_array, CSV export) are compressed chunk by chunk,
+    flushing after every chunk so the client still receives data progressively
+  - the ETag of a compressed response is made weak (W/"..."), since the bytes differ
+    from the identity encoding; If-None-Match uses weak comparison, so revalidation
+    keeps working for either encoding
+
+brotli is used only if the optional `brotli` package is installed and API_COMPRESS_BROTLI
+is on; otherwise gzip. stats() (per worker) is served by /api/admin/compression.
+"""
+import time
+import zlib
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "text/csv", "text/plain", "text/html", "application/xml"}
+ETAG_CACHE_SIZE = 32
+
+_lock = threading.Lock()
+_etag_cache = OrderedDict()  # (path, etag, encoding, level) -> compressed body
+_stats = {
+    "compressed": {"gzip": 0, "br": 0},
+    "streamed": 0,
+    "skipped_small": 0,
+    "skipped_not_accepted": 0,
+    "etag_cache_hits": 0,
+    "bytes_in": 0,
+    "bytes_out": 0,
+    "time_s": 0.0,
+}
+
+
+def accepted_encodings(header):
+    """Accept-Encoding header -> {token: q}."""
+    accepted = {}
+    for part in (header or "").lower().split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if token:
+            accepted[token] = q
+    return accepted
+
+
+def negotiate(header, offered):
+    """First encoding in `offered` (preference order) the client accepts, else 'identity'."""
+    accepted = accepted_encodings(header)
+    for enc in offered:
+        if accepted.get(enc, accepted.get("*", 0)) > 0:
+            return enc
+    return "identity"
+
+
+class _Settings:
+    __slots__ = ("min_bytes", "gzip_level", "br_quality", "offered")
+
+    def __init__(self, cfg):
+        self.min_bytes = int(cfg.get("API_COMPRESS_MIN_BYTES", 1024))
+        self.gzip_level = int(cfg.get("API_COMPRESS_LEVEL", 6))
+        self.br_quality = int(cfg.get("API_BROTLI_QUALITY", 4))
+        use_br = brotli is not None and cfg.get("API_COMPRESS_BROTLI", True)
+        self.offered = ("br", "gzip") if use_br else ("gzip",)
+
+    def level(self, encoding):
+        return self.br_quality if encoding == "br" else self.gzip_level
+
+
+def _compress(body, encoding, settings):
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.br_quality)
+    gz = zlib.compressobj(settings.gzip_level, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    return gz.compress(body) + gz.flush()
+
+
+def _stream(chunks, encoding, settings):
+    if encoding == "br":
+        comp = brotli.Compressor(quality=settings.br_quality)
+
+        def step(chunk):
+            return comp.process(chunk) + comp.flush()
+        finish = comp.finish
+    else:
+        comp = zlib.compressobj(settings.gzip_level, zlib.DEFLATED, 31)
+
+        def step(chunk):
+            return comp.compress(chunk) + comp.flush(zlib.Z_SYNC_FLUSH)
+        finish = comp.flush
+
+    bytes_in = bytes_out = 0
+    spent = 0.0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            if not chunk:
+                continue
+            t0 = time.perf_counter()
+            out = step(chunk)
+            spent += time.perf_counter() - t0
+            bytes_in += len(chunk)
+            bytes_out += len(out)
+            if out:
+                yield out
+        tail = finish()
+        bytes_out += len(tail)
+        yield tail
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+        with _lock:
+            _stats["bytes_in"] += bytes_in
+            _stats["bytes_out"] += bytes_out
+            _stats["time_s"] += spent
+
+
+def _weaken_etag(response):
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return etag, weak
+
+
+def _compress_response(response, settings):
+    if not request.path.startswith("/api/") or request.method == "HEAD":
+        return response
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return response
+    if "Content-Encoding" in response.headers or response.direct_passthrough:
+        return response
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    if "no-transform" in (response.headers.get("Cache-Control") or ""):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate(request.headers.get("Accept-Encoding"), settings.offered)
+    if encoding == "identity":
+        with _lock:
+            _stats["skipped_not_accepted"] += 1
+        return response
+
+    if response.is_streamed:
+        response.response = _stream(response.response, encoding, settings)
+        response.headers.pop("Content-Length", None)
+        response.headers["Content-Encoding"] = encoding
+        _weaken_etag(response)
+        with _lock:
+            _stats["compressed"][encoding] += 1
+            _stats["streamed"] += 1
+        return response
+
+    body = response.get_data()
+    if len(body) < settings.min_bytes:
+        with _lock:
+            _stats["skipped_small"] += 1
+        return response
+
+    etag, weak = response.get_etag()
+    key = (request.path, etag, encoding, settings.level(encoding)) if etag and not weak else None
+    with _lock:
+        out = _etag_cache.get(key) if key else None
+        if out is not None:
+            _etag_cache.move_to_end(key)
+            _stats["etag_cache_hits"] += 1
+    spent = 0.0
+    if out is None:
+        t0 = time.perf_counter()
+        out = _compress(body, encoding, settings)
+        spent = time.perf_counter() - t0
+        if key:
+            with _lock:
+                _etag_cache[key] = out
+                while len(_etag_cache) > ETAG_CACHE_SIZE:
+                    _etag_cache.popitem(last=False)
+
+    response.set_data(out)  # also updates Content-Length
+    response.headers["Content-Encoding"] = encoding
+    _weaken_etag(response)
+    with _lock:
+        _stats["compressed"][encoding] += 1
+        _stats["bytes_in"] += len(body)
+        _stats["bytes_out"] += len(out)
+        _stats["time_s"] += spent
+    return response
+
+
+def install(app):
+    """Compress eligible /api/* responses (no-op when API_COMPRESS_ENABLED is off)."""
+    if not app.config.get("API_COMPRESS_ENABLED", True):
+        return
+    settings = _Settings(app.config)
+    app.extensions["api_compression"] = settings
+
+    @app.after_request
+    def _compress_api_response(response):
+        return _compress_response(response, settings)
+
+
+def stats(app):
+    settings = app.extensions.get("api_compression")
+    with _lock:
+        s = {**_stats, "compressed": dict(_stats["compressed"])}
+        cached = len(_etag_cache)
+    spent = s.pop("time_s")
+    return {
+        "enabled": settings is not None,
+        "encodings": list(settings.offered) if settings else [],
+        "min_bytes": settings.min_bytes if settings else None,
+        "gzip_level": settings.gzip_level if settings else None,
+        "brotli_quality": settings.br_quality if settings and "br" in settings.offered else None,
+        **s,
+        "time_ms": round(1000 * spent, 3),
+        "ratio": round(s["bytes_out"] / s["bytes_in"], 4) if s["bytes_in"] else None,
+        "etag_cache_size": cached,
+    }
@@ -12,6 +12,24 @@ def _normalize_pg_url(url: str | None) -> str | None:
         url = url.replace("postgres://", "postgresql://", 1)
     return url
 
+def _engine_options(uri: str) -> dict:
+    """
+    Connection pool settings, env-driven with defaults sized to the gunicorn layout:
+    every worker process has its own pool and up to GUNICORN_THREADS threads using it,
+    so pool_size defaults to the thread count plus a little overflow.
+    In-memory SQLite keeps SQLAlchemy's own pool (one shared connection).
+    """
+    if uri.startswith("sqlite") and (":memory:" in uri or uri.rstrip("/") == "sqlite:"):
+        return {}
+    threads = int(os.getenv("GUNICORN_THREADS", "8"))
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", str(threads))),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", str(max(2, threads // 4)))),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),      # seconds to wait for a connection
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),      # drop connections older than this
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1",     # survive idle disconnects
+    }
+
 class Config:
     # --- Core ---
     SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-key")
@@ -28,6 +46,45 @@ class Config:
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # --- Startup ---
+    # Production runs `flask db upgrade && flask init-db` as the pre-deploy step, so workers
+    # boot without DDL or seed queries; local runs keep the create-on-start convenience.
+    DB_INIT_ON_STARTUP = os.getenv("DB_INIT_ON_STARTUP", "0" if os.getenv("PRODUCTION", "0") == "1" else "1") == "1"
+    STARTUP_TIMING_REPORT = os.getenv("STARTUP_TIMING_REPORT", "1") == "1"
+
+    # --- Connection pool (see db_pool.py for metrics and statement_timeout) ---
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(SQLALCHEMY_DATABASE_URI)
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))  # Postgres only; 0 = off
+
+    # --- Catalog snapshot (/api/catalog) ---
+    CATALOG_SNAPSHOT_TTL = int(os.getenv("CATALOG_SNAPSHOT_TTL", "300"))    # seconds; safety net only
+    CATALOG_CACHE_MAX_AGE = int(os.getenv("CATALOG_CACHE_MAX_AGE", "0"))    # browser max-age; ETag revalidates
+
+    # --- Stock ledger snapshots (stock_ledger.py) ---
+    STOCK_SNAPSHOT_SAFETY_S = int(os.getenv("STOCK_SNAPSHOT_SAFETY_S", "300"))  # movements younger than this wait for the next run
+
+    # --- Response compression for /api/* (compression.py) ---
+    API_COMPRESS_ENABLED = os.getenv("API_COMPRESS_ENABLED", "1") == "1"
+    API_COMPRESS_MIN_BYTES = int(os.getenv("API_COMPRESS_MIN_BYTES", "1024"))  # smaller bodies go out as-is
+    API_COMPRESS_LEVEL = int(os.getenv("API_COMPRESS_LEVEL", "6"))            # gzip 1-9
+    API_COMPRESS_BROTLI = os.getenv("API_COMPRESS_BROTLI", "1") == "1"         # needs the optional brotli package
+    API_BROTLI_QUALITY = int(os.getenv("API_BROTLI_QUALITY", "4"))            # 0-11; low keeps CPU per request small
+
+    # --- Request / SQL metrics and slow-query log (metrics.py) ---
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")                              # Bearer token for /api/metrics scrapers
+    METRICS_DIR = os.getenv("METRICS_DIR")                                  # default: per-DB dir in tempdir
+    METRICS_FLUSH_S = float(os.getenv("METRICS_FLUSH_S", "5"))              # how often a worker publishes counters
+    SLOW_QUERY_MS = int(os.getenv("SLOW_QUERY_MS", "500"))                  # 0 disables the slow-query log
+
+    # --- Category name -> id resolver (category_cache.py) ---
+    CATEGORY_CACHE_SIZE = int(os.getenv("CATEGORY_CACHE_SIZE", "1024"))
+    CATEGORY_CACHE_TTL = int(os.getenv("CATEGORY_CACHE_TTL", "600"))        # seconds
+
+    # --- Authenticated user loader cache (user_cache.py) ---
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "2048"))
+    USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "60"))                 # seconds
+
     # --- CORS / cookies for SPA ---
     FRONTEND_ORIGIN = os.getenv("FRONTEND_ORIGIN", "http://localhost:5173")
 
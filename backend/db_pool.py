@@ -0,0 +1,113 @@
+# backend/db_pool.py
+"""
+Connection pool instrumentation.
+
+configure(app) swaps in TimedQueuePool (a QueuePool that measures how long each
+checkout waited) before the engine is built; install(app) hooks pool events for
+connect/checkout/invalidate counts and applies DB_STATEMENT_TIMEOUT_MS on Postgres.
+stats() is served by /api/admin/pool. Counters are per worker process.
+"""
+import time
+import threading
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+from extensions import db
+
+WAIT_SAMPLES = 1000
+
+_lock = threading.Lock()
+_waits = deque(maxlen=WAIT_SAMPLES)  # seconds waited by recent checkouts
+_counters = {"connects": 0, "checkouts": 0, "checkins": 0, "invalidations": 0, "timeouts": 0,
+             "wait_total_s": 0.0, "wait_max_s": 0.0}
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records the time spent waiting for a free connection."""
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeout:
+            with _lock:
+                _counters["timeouts"] += 1
+            raise
+        finally:
+            waited = time.perf_counter() - t0
+            with _lock:
+                _waits.append(waited)
+                _counters["wait_total_s"] += waited
+                _counters["wait_max_s"] = max(_counters["wait_max_s"], waited)
+
+
+def configure(app):
+    """Call before db.init_app(app): use TimedQueuePool wherever a sized pool is configured."""
+    opts = dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    if "pool_size" in opts and "poolclass" not in opts:
+        opts["poolclass"] = TimedQueuePool
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = opts
+
+
+def _bump(name):
+    with _lock:
+        _counters[name] += 1
+
+
+def install(app):
+    """Call after db.init_app(app): attach pool listeners and per-connection settings."""
+    timeout_ms = int(app.config.get("DB_STATEMENT_TIMEOUT_MS") or 0)
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, _record):
+        _bump("connects")
+        if timeout_ms and engine.dialect.name == "postgresql":
+            cur = dbapi_conn.cursor()
+            cur.execute(f"SET statement_timeout = {timeout_ms}")
+            cur.close()
+            if not getattr(dbapi_conn, "autocommit", False):
+                dbapi_conn.commit()  # keep the SET when SQLAlchemy later rolls back
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(_dbapi_conn, _record, _proxy):
+        _bump("checkouts")
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(_dbapi_conn, _record):
+        _bump("checkins")
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(_dbapi_conn, _record, _exc):
+        _bump("invalidations")
+
+
+def stats():
+    """Pool occupancy for the current engine plus this worker's checkout/wait counters."""
+    pool = db.engine.pool
+    out = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        out.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(0, pool.overflow()),
+            "max_overflow": pool._max_overflow,
+            "timeout_s": pool.timeout(),
+        })
+    with _lock:
+        waits = sorted(_waits)
+        c = dict(_counters)
+    out.update({k: v for k, v in c.items() if not k.startswith("wait_")})
+    out["wait_ms"] = {
+        "samples": len(waits),
+        "avg": round(1000 * sum(waits) / len(waits), 3) if waits else 0.0,
+        "p95": round(1000 * waits[max(0, int(len(waits) * 0.95) - 1)], 3) if waits else 0.0,
+        "max": round(1000 * c["wait_max_s"], 3),
+        "total": round(1000 * c["wait_total_s"], 3),
+    }
+    return out
@@ -2,12 +2,13 @@ import pandas as pd
 from app import create_app
 from extensions import db
 from models import ToolCategory, Tool
+import category_cache
 
 # Initialize the app
 app = create_app()
 
 # Load the Excel file
-excel_file = "C:\Users\Administrator\Desktop\Softwares\Tools.xlsx"  # Update with the path to your file
+excel_file = r"C:\Users\Administrator\Desktop\Softwares\Tools.xlsx"  # Update with the path to your file
 data = pd.read_excel(excel_file)
 
 # Ensure the file has the following columns: "Category", "Tool Name", "Description"
@@ -15,17 +16,19 @@ with app.app_context():
     for _, row in data.iterrows():
         # Fetch or create the category
         category_name = row["Category"]
-        category = ToolCategory.query.filter_by(name=category_name).first()
-        if not category:
+        category_id = category_cache.resolve(category_name)
+        if category_id is None:
             category = ToolCategory(name=category_name)
             db.session.add(category)
             db.session.commit()
+            category_id = category.id
+            category_cache.remember(category_name, category_id)
 
         # Add the tool
         tool_name = row["Tool Name"]
         description = row["Description"]
-        if not Tool.query.filter_by(name=tool_name, category_id=category.id).first():
-            tool = Tool(name=tool_name, description=description, category=category)
+        if not Tool.query.filter_by(name=tool_name, category_id=category_id).first():
+            tool = Tool(name=tool_name, description=description, category_id=category_id)
             db.session.add(tool)
 
     db.session.commit()
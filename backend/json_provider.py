@@ -0,0 +1,123 @@
+# backend/json_provider.py
+"""
+JSON encoding for the API.
+
+FastJSONProvider is Flask's DefaultJSONProvider with orjson doing the encoding when it
+is installed (the stdlib encoder is used otherwise, and for pretty-printed debug
+output). Responses keep their shape: sorted keys, compact separators, and Flask's own
+handling of datetimes (HTTP dates), dates, Decimals, UUIDs and dataclasses through the
+provider's default hook. orjson writes non-ASCII characters as UTF-8 instead of \\u
+escapes, which is equivalent JSON.
+
+stream_json_array() sends a JSON array item by item, so large endpoints hold neither
+the full list of dicts nor the full serialized body in memory.
+"""
+from flask import Response, current_app, request, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+
+from extensions import db
+
+
+try:
+    import orjson
+except ImportError:  # optional
+    orjson = None
+
+STREAM_FLUSH_BYTES = 64 * 1024
+_END = object()
+
+if orjson is not None:
+    # datetimes and dataclasses go through Flask's default() to match stdlib output
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """DefaultJSONProvider that encodes with orjson when available."""
+
+    @property
+    def backend(self):
+        return "orjson" if orjson is not None else "json"
+
+    def _pretty(self):
+        return (self.compact is None and self._app.debug) or self.compact is False
+
+    def dumps_bytes(self, obj):
+        """Compact UTF-8 encoding of obj."""
+        if orjson is not None:
+            option = _ORJSON_OPTIONS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+            try:
+                return orjson.dumps(obj, default=self.default, option=option)
+            except TypeError:
+                pass  # e.g. ints wider than 64 bits: the stdlib encoder handles (or rejects) them
+        return super().dumps(obj, separators=(",", ":")).encode("utf-8")
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and set(kwargs) <= {"separators"} and kwargs.get("separators", (",", ":")) == (",", ":"):
+            return self.dumps_bytes(obj).decode("utf-8")
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if self._pretty():
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj) + b"\n", mimetype=self.mimetype)
+
+
+def stream_json_array(items, serialize=None, status=200):
+    """
+    Stream `items` as a JSON array; serialize(item) -> JSON-able value (default: item).
+
+    `items` may be a lazy query on db.session. Flask removes that session when the view
+    returns, before the body is iterated, even under stream_with_context (which only
+    re-pushes the context), so ORM rows would be detached mid-stream. The stream takes
+    the session over instead: it leaves the scoped registry until the body starts and
+    is put back there, so the stream's own teardown closes it. No second session or
+    pool connection is used.
+
+    The first item is fetched and encoded before the Response is returned, so a failing
+    query or serializer raises inside the view (and its error handling) while the status
+    can still change. A failure after that is logged and re-raised: the server drops the
+    connection, so the client sees a broken response instead of a short but valid array.
+    """
+    provider = current_app.json
+    if hasattr(provider, "dumps_bytes"):
+        dump = provider.dumps_bytes
+    else:
+        def dump(obj):
+            return provider.dumps(obj).encode("utf-8")
+
+    rows = iter(items)
+    first = next(rows, _END)
+    head = b"" if first is _END else dump(serialize(first) if serialize else first)
+
+    session = db.session()
+    db.session.registry.clear()  # the view's teardown must not close it
+
+    def generate():
+        db.session.registry.set(session)
+        buf = bytearray(b"[")
+        buf += head
+        sent = 0 if first is _END else 1
+        try:
+            if sent:
+                for item in rows:
+                    buf += b","
+                    buf += dump(serialize(item) if serialize else item)
+                    sent += 1
+                    if len(buf) >= STREAM_FLUSH_BYTES:
+                        yield bytes(buf)
+                        buf.clear()
+        except Exception:
+            current_app.logger.exception("%s: stream failed after %d item(s)", request.path, sent)
+            raise
+        buf += b"]"
+        yield bytes(buf)
+
+    resp = Response(stream_with_context(generate()), status=status, mimetype="application/json")
+    resp.call_on_close(session.close)  # also when the client goes away before the body starts
+    return resp
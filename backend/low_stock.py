@@ -0,0 +1,75 @@
+# backend/low_stock.py
+"""
+Set of tools at or below their reorder level (Tool.reorder_level > 0).
+
+The low_stock table is updated incrementally: refresh(tool_ids) re-checks only the
+given tools and is called by stock_ledger.record_many (every quantity change goes
+through the ledger) and when a tool's reorder level is edited. Listing shortages
+therefore reads the set itself, never the tool table. rebuild() recomputes the whole
+set (`flask rebuild-low-stock`) after bulk SQL that bypassed the API.
+"""
+from datetime import datetime
+
+from sqlalchemy import and_, delete, func, insert, literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from extensions import db
+from models import LowStock, Tool
+
+
+def is_low(quantity, reorder_level):
+    return (reorder_level or 0) > 0 and (quantity or 0) <= reorder_level
+
+
+def refresh(tool_ids):
+    """Re-evaluate membership of tool_ids, in the caller's transaction."""
+    ids = list({int(i) for i in tool_ids})
+    if not ids:
+        return
+    rows = db.session.execute(
+        select(Tool.id, Tool.quantity, Tool.reorder_level).where(Tool.id.in_(ids))
+    ).all()
+    low = [
+        {"tool_id": tid, "quantity": qty or 0, "reorder_level": level, "since": datetime.utcnow()}
+        for tid, qty, level in rows if is_low(qty, level)
+    ]
+    low_ids = {r["tool_id"] for r in low}
+    cleared = [tid for tid in ids if tid not in low_ids]
+    if cleared:
+        db.session.execute(delete(LowStock).where(LowStock.tool_id.in_(cleared)))
+    if not low:
+        return
+
+    table = LowStock.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        stmt = (postgresql if dialect == "postgresql" else sqlite).insert(table)
+        stmt = stmt.on_conflict_do_update(  # keep `since` for tools that were already low
+            index_elements=["tool_id"],
+            set_={"quantity": stmt.excluded.quantity, "reorder_level": stmt.excluded.reorder_level},
+        )
+        db.session.execute(stmt, low)
+        return
+    present = {tid for (tid,) in db.session.execute(select(table.c.tool_id).where(table.c.tool_id.in_(low_ids)))}
+    fresh = [r for r in low if r["tool_id"] not in present]
+    if fresh:
+        db.session.execute(insert(table), fresh)
+    for r in low:
+        if r["tool_id"] in present:
+            db.session.execute(
+                update(table).where(table.c.tool_id == r["tool_id"])
+                .values(quantity=r["quantity"], reorder_level=r["reorder_level"])
+            )
+
+
+def rebuild():
+    """Recompute the whole set from the tool table. Returns the number of low tools."""
+    table = LowStock.__table__
+    db.session.execute(delete(table))
+    db.session.execute(insert(table).from_select(
+        ["tool_id", "quantity", "reorder_level", "since"],
+        select(Tool.id, Tool.quantity, Tool.reorder_level, literal(datetime.utcnow()))
+        .where(and_(Tool.reorder_level > 0, Tool.quantity <= Tool.reorder_level)),
+    ))
+    db.session.commit()
+    return db.session.query(func.count()).select_from(table).scalar()
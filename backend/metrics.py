@@ -0,0 +1,360 @@
+# backend/metrics.py
+"""
+Request and SQL instrumentation, exported as Prometheus text by /api/metrics.
+
+install(app) wraps the WSGI app so each request is timed until its body has been
+sent (streamed responses included) and hooks SQLAlchemy cursor events to count
+statements and SQL time against the request that issued them. Per endpoint it keeps:
+  - a latency histogram (LATENCY_BUCKETS, seconds)
+  - responses by status code
+  - SQL statement count and SQL seconds
+  - slow statements (>= SLOW_QUERY_MS), which are also logged with the route and SQL
+
+Counters live in this process behind a lock (gunicorn threads share them). Each worker
+writes them to METRICS_DIR/<pid>-<start>-<random>.json at most every METRICS_FLUSH_S
+seconds; render() merges every worker's file so a scrape that lands on either worker
+sees the whole host. Files of workers that have exited (their pid is gone) are folded
+into retired.json, so restarted workers neither pile up files nor make totals go back.
+"""
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import deque
+from contextvars import ContextVar
+
+from flask import request
+from sqlalchemy import event
+from werkzeug.wsgi import ClosingIterator
+
+from extensions import db
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: exited workers' files are kept as they are
+    fcntl = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RETIRED_FILE = "retired.json"
+SLOW_SAMPLES = 50
+STATEMENT_LOG_CHARS = 1000
+
+log = logging.getLogger("ecews.metrics")
+
+_lock = threading.Lock()
+_latency = {}    # (endpoint, method) -> [bucket counts..., +Inf count, sum seconds]
+_responses = {}  # (endpoint, method, status) -> count
+_sql = {}        # endpoint -> [statements, seconds, slow statements]
+_slow = deque(maxlen=SLOW_SAMPLES)  # recent slow statements, newest last
+_state = {"last_flush": 0.0}
+
+_current = ContextVar("ecews_request_metrics", default=None)
+
+
+class _RequestStats:
+    __slots__ = ("endpoint", "method", "status", "sql_count", "sql_seconds", "slow")
+
+    def __init__(self, method):
+        self.endpoint = "unmatched"
+        self.method = method
+        self.status = "500"
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.slow = 0
+
+
+def current_sql_count():
+    """Statements issued so far by the request running on this thread (None outside requests)."""
+    rec = _current.get()
+    return rec.sql_count if rec is not None else None
+
+
+def _observe(rec, elapsed):
+    with _lock:
+        hist = _latency.get((rec.endpoint, rec.method))
+        if hist is None:
+            hist = _latency[(rec.endpoint, rec.method)] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed <= bound:
+                hist[i] += 1
+                break
+        else:
+            hist[len(LATENCY_BUCKETS)] += 1
+        hist[-1] += elapsed
+        key = (rec.endpoint, rec.method, rec.status)
+        _responses[key] = _responses.get(key, 0) + 1
+        sql = _sql.setdefault(rec.endpoint, [0, 0.0, 0])
+        sql[0] += rec.sql_count
+        sql[1] += rec.sql_seconds
+        sql[2] += rec.slow
+
+
+class _Middleware:
+    """Times the whole WSGI exchange, including iteration of streamed bodies."""
+
+    def __init__(self, wsgi_app, flush_s, metrics_dir):
+        self.wsgi_app = wsgi_app
+        self.flush_s = flush_s
+        self.metrics_dir = metrics_dir
+
+    def __call__(self, environ, start_response):
+        rec = _RequestStats(environ.get("REQUEST_METHOD", "GET"))
+        token = _current.set(rec)
+        t0 = time.perf_counter()
+
+        def _start_response(status, headers, exc_info=None):
+            rec.status = status.split(" ", 1)[0]
+            return start_response(status, headers, exc_info)
+
+        def finish():
+            _observe(rec, time.perf_counter() - t0)
+            try:
+                _current.reset(token)
+            except ValueError:
+                _current.set(None)  # closed from another context
+            if time.monotonic() - _state["last_flush"] >= self.flush_s:
+                flush(self.metrics_dir)
+
+        try:
+            app_iter = self.wsgi_app(environ, _start_response)
+        except Exception:
+            finish()
+            raise
+        return ClosingIterator(app_iter, [finish])
+
+
+def _default_dir(app):
+    url = app.config.get("SQLALCHEMY_DATABASE_URI") or ""
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"ecews-metrics-{key}")
+
+
+def install(app):
+    """Call after db_pool.install(app). No-op when METRICS_ENABLED is off."""
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+    metrics_dir = app.config.get("METRICS_DIR") or _default_dir(app)
+    os.makedirs(metrics_dir, exist_ok=True)
+    slow_s = (app.config.get("SLOW_QUERY_MS") or 0) / 1000.0
+    app.extensions["metrics"] = {"dir": metrics_dir, "slow_query_ms": app.config.get("SLOW_QUERY_MS") or 0}
+    app.wsgi_app = _Middleware(app.wsgi_app, float(app.config.get("METRICS_FLUSH_S", 5)), metrics_dir)
+
+    @app.before_request
+    def _label_request():
+        rec = _current.get()
+        if rec is not None:
+            rec.endpoint = request.endpoint or "unmatched"
+
+    with app.app_context():
+        engine = db.engine
+
+    # start times are popped by after_cursor_execute, or by handle_error when the statement fails
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("ecews_query_start", []).append((context, time.perf_counter()))
+
+    @event.listens_for(engine, "handle_error")
+    def _failed(exception_context):
+        conn = exception_context.connection
+        starts = conn.info.get("ecews_query_start") if conn is not None else None
+        if starts and starts[-1][0] is exception_context.execution_context:
+            starts.pop()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("ecews_query_start")
+        if not starts or starts[-1][0] is not context:
+            return
+        elapsed = time.perf_counter() - starts.pop()[1]
+        rec = _current.get()
+        if rec is not None:
+            rec.sql_count += 1
+            rec.sql_seconds += elapsed
+        if slow_s and elapsed >= slow_s:
+            route = rec.endpoint if rec is not None else "-"
+            sql = " ".join(statement.split())[:STATEMENT_LOG_CHARS]
+            if rec is not None:
+                rec.slow += 1
+            with _lock:
+                _slow.append({"at": time.time(), "route": route, "ms": round(elapsed * 1000, 1), "statement": sql})
+            log.warning("slow query %.1fms route=%s: %s", elapsed * 1000, route, sql)
+
+
+# ---------- Cross-worker aggregation ----------
+def _snapshot():
+    with _lock:
+        return {
+            "latency": [[e, m, list(h)] for (e, m), h in _latency.items()],
+            "responses": [[e, m, s, n] for (e, m, s), n in _responses.items()],
+            "sql": [[e, list(v)] for e, v in _sql.items()],
+        }
+
+
+def _worker_file():
+    """This process's file name; a new pid (fork) or a reused one never shares a file."""
+    pid = os.getpid()
+    if _state.get("pid") != pid:
+        _state["pid"] = pid
+        _state["file"] = f"{pid}-{int(time.time())}-{uuid.uuid4().hex[:8]}.json"
+    return _state["file"]
+
+
+def flush(metrics_dir):
+    """Write this worker's counters to its file in metrics_dir (atomic replace)."""
+    _state["last_flush"] = time.monotonic()
+    path = os.path.join(metrics_dir, _worker_file())
+    tmp = f"{path}.{uuid.uuid4().hex}"
+    try:
+        with open(tmp, "w") as fh:
+            json.dump({"pid": os.getpid(), **_snapshot()}, fh)
+        os.replace(tmp, path)
+    except OSError:
+        log.exception("could not write metrics to %s", metrics_dir)
+
+
+def _load(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None  # gone, a worker is mid-replace, or the file is damaged
+
+
+def _add(totals, snap):
+    """Add a snapshot's counters into totals = (latency, responses, sql)."""
+    latency, responses, sql = totals
+    for e, m, h in snap.get("latency", []):
+        cur = latency.setdefault((e, m), [0] * len(h))
+        for i, v in enumerate(h):
+            cur[i] += v
+    for e, m, s, n in snap.get("responses", []):
+        responses[(e, m, s)] = responses.get((e, m, s), 0) + n
+    for e, v in snap.get("sql", []):
+        cur = sql.setdefault(e, [0, 0.0, 0])
+        for i, x in enumerate(v):
+            cur[i] += x
+
+
+def _exited(name):
+    """True when the file's worker pid no longer exists."""
+    try:
+        pid = int(name[:-len(".json")].split("-", 1)[0])  # also the older <pid>.json names
+    except ValueError:
+        return False
+    if pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)  # signal 0: existence check only (POSIX)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass  # e.g. EPERM: alive under another user
+    return False
+
+
+def _retire(metrics_dir, names):
+    """
+    Fold the files of exited workers into RETIRED_FILE, under a lock file so two
+    workers never fold the same file twice. Returns the names still to be read.
+    """
+    if fcntl is None:
+        return names
+    dead = [n for n in names if n != RETIRED_FILE and _exited(n)]
+    if not dead:
+        return names
+    with open(os.path.join(metrics_dir, ".retire.lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            retired_path = os.path.join(metrics_dir, RETIRED_FILE)
+            totals = ({}, {}, {})
+            _add(totals, _load(retired_path) or {})
+            folded = []
+            for name in dead:
+                snap = _load(os.path.join(metrics_dir, name))
+                if snap is not None:  # None: folded by another worker meanwhile
+                    _add(totals, snap)
+                    folded.append(name)
+            if folded:
+                latency, responses, sql = totals
+                tmp = f"{retired_path}.{uuid.uuid4().hex}"
+                with open(tmp, "w") as fh:
+                    json.dump({
+                        "latency": [[e, m, h] for (e, m), h in latency.items()],
+                        "responses": [[e, m, s, n] for (e, m, s), n in responses.items()],
+                        "sql": [[e, v] for e, v in sql.items()],
+                    }, fh)
+                os.replace(tmp, retired_path)
+                for name in folded:
+                    os.remove(os.path.join(metrics_dir, name))
+        except OSError:
+            log.exception("could not retire metrics files in %s", metrics_dir)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return [n for n in os.listdir(metrics_dir) if n.endswith(".json")]
+
+
+def _merged(metrics_dir):
+    totals = ({}, {}, {})
+    try:
+        names = [n for n in os.listdir(metrics_dir) if n.endswith(".json")]
+    except FileNotFoundError:
+        names = []
+    if names:
+        names = _retire(metrics_dir, names)
+    for name in names:
+        snap = _load(os.path.join(metrics_dir, name))
+        if snap is not None:
+            _add(totals, snap)
+    return totals
+
+
+def _labels(**kw):
+    parts = []
+    for k, v in kw.items():
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def render(app):
+    """Prometheus text exposition of every worker's counters on this host."""
+    metrics_dir = app.extensions["metrics"]["dir"]
+    flush(metrics_dir)  # include this worker's latest numbers
+    latency, responses, sql = _merged(metrics_dir)
+    out = [
+        "# HELP ecews_http_request_duration_seconds Request latency until the body was sent.",
+        "# TYPE ecews_http_request_duration_seconds histogram",
+    ]
+    for (e, m), h in sorted(latency.items()):
+        cumulative = 0
+        for bound, n in zip(LATENCY_BUCKETS, h):
+            cumulative += n
+            out.append(f"ecews_http_request_duration_seconds_bucket{_labels(endpoint=e, method=m, le=bound)} {cumulative}")
+        cumulative += h[len(LATENCY_BUCKETS)]
+        out.append(f"ecews_http_request_duration_seconds_bucket{_labels(endpoint=e, method=m, le='+Inf')} {cumulative}")
+        out.append(f"ecews_http_request_duration_seconds_sum{_labels(endpoint=e, method=m)} {h[-1]:.6f}")
+        out.append(f"ecews_http_request_duration_seconds_count{_labels(endpoint=e, method=m)} {cumulative}")
+    out += ["# HELP ecews_http_responses_total Responses by status code.",
+            "# TYPE ecews_http_responses_total counter"]
+    for (e, m, s), n in sorted(responses.items()):
+        out.append(f"ecews_http_responses_total{_labels(endpoint=e, method=m, status=s)} {n}")
+    out += ["# HELP ecews_sql_statements_total SQL statements executed while serving the endpoint.",
+            "# TYPE ecews_sql_statements_total counter"]
+    out += [f"ecews_sql_statements_total{_labels(endpoint=e)} {v[0]}" for e, v in sorted(sql.items())]
+    out += ["# HELP ecews_sql_seconds_total Time spent in SQL while serving the endpoint.",
+            "# TYPE ecews_sql_seconds_total counter"]
+    out += [f"ecews_sql_seconds_total{_labels(endpoint=e)} {v[1]:.6f}" for e, v in sorted(sql.items())]
+    out += ["# HELP ecews_sql_slow_statements_total Statements at or above SLOW_QUERY_MS.",
+            "# TYPE ecews_sql_slow_statements_total counter"]
+    out += [f"ecews_sql_slow_statements_total{_labels(endpoint=e)} {v[2]}" for e, v in sorted(sql.items())]
+    return "\n".join(out) + "\n"
+
+
+def slow_queries():
+    """Recent slow statements seen by this worker, newest first."""
+    with _lock:
+        return list(reversed(_slow))
@@ -0,0 +1,31 @@
+"""add catalog version
+
+Revision ID: a9c3e5f7b1d2
+Revises: f2b8d4a6c9e7
+Create Date: 2026-10-18 09:14:52.301877
+
+Single-row catalog_version table. catalog_cache.invalidate() bumps it after catalog
+writes so every instance sharing the database (web workers, pre-deploy init-db, seed)
+rebuilds its /api/catalog snapshot.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'a9c3e5f7b1d2'
+down_revision = 'f2b8d4a6c9e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'catalog_version',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('version', sa.Integer(), nullable=False),
+    )
+    op.execute("INSERT INTO catalog_version (id, version) VALUES (1, 1)")
+
+
+def downgrade():
+    op.drop_table('catalog_version')
@@ -0,0 +1,58 @@
+"""add tool search index
+
+Revision ID: b3f1c9d2e7a4
+Revises: 9291c0cb6304
+Create Date: 2026-10-17 09:12:40.118204
+
+Postgres: tool_search (tsvector + GIN, lowercased text + pg_trgm GIN).
+SQLite: FTS5 virtual table tool_fts. Both are backfilled from tool/tool_category.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b3f1c9d2e7a4'
+down_revision = '9291c0cb6304'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.create_table(
+            'tool_search',
+            sa.Column('tool_id', sa.Integer(), sa.ForeignKey('tool.id', ondelete='CASCADE'), primary_key=True),
+            sa.Column('body', sa.Text(), nullable=False),
+            sa.Column('document', sa.dialects.postgresql.TSVECTOR(), nullable=False),
+        )
+        op.execute("CREATE INDEX ix_tool_search_document ON tool_search USING gin (document)")
+        op.execute("CREATE INDEX ix_tool_search_body_trgm ON tool_search USING gin (body gin_trgm_ops)")
+        op.execute("""
+            INSERT INTO tool_search (tool_id, body, document)
+            SELECT t.id,
+                   lower(coalesce(t.name, '') || ' ' || coalesce(c.name, '') || ' ' || coalesce(t.description, '')),
+                   setweight(to_tsvector('simple', coalesce(t.name, '')), 'A')
+                     || setweight(to_tsvector('simple', coalesce(c.name, '')), 'B')
+                     || setweight(to_tsvector('simple', coalesce(t.description, '')), 'C')
+            FROM tool t LEFT JOIN tool_category c ON c.id = t.category_id
+        """)
+    elif dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS tool_fts USING fts5("
+            "name, category, description, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        op.execute("""
+            INSERT INTO tool_fts (rowid, name, category, description)
+            SELECT t.id, coalesce(t.name, ''), coalesce(c.name, ''), coalesce(t.description, '')
+            FROM tool t LEFT JOIN tool_category c ON c.id = t.category_id
+        """)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.drop_table('tool_search')
+    elif dialect == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS tool_fts")
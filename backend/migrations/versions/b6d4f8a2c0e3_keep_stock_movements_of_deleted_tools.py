@@ -0,0 +1,38 @@
+"""keep stock movements of deleted tools
+
+Revision ID: b6d4f8a2c0e3
+Revises: a9c3e5f7b1d2
+Create Date: 2026-10-18 11:02:37.516204
+
+stock_movement.tool_id becomes nullable with ON DELETE SET NULL instead of CASCADE, so
+deleting a tool no longer erases its ledger history; delete_tool records a 'deletion'
+movement naming the tool first. Snapshots stay ON DELETE CASCADE: they are derived
+from the ledger and only meaningful for a live tool.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b6d4f8a2c0e3'
+down_revision = 'a9c3e5f7b1d2'
+branch_labels = None
+depends_on = None
+
+# names the unnamed constraint on SQLite (batch mode) the way Postgres already did
+NAMING = {"fk": "%(table_name)s_%(column_0_name)s_fkey"}
+FK = 'stock_movement_tool_id_fkey'
+
+
+def upgrade():
+    with op.batch_alter_table('stock_movement', schema=None, naming_convention=NAMING) as batch_op:
+        batch_op.drop_constraint(FK, type_='foreignkey')
+        batch_op.alter_column('tool_id', existing_type=sa.Integer(), nullable=True)
+        batch_op.create_foreign_key(FK, 'tool', ['tool_id'], ['id'], ondelete='SET NULL')
+
+
+def downgrade():
+    op.execute("DELETE FROM stock_movement WHERE tool_id IS NULL")
+    with op.batch_alter_table('stock_movement', schema=None, naming_convention=NAMING) as batch_op:
+        batch_op.drop_constraint(FK, type_='foreignkey')
+        batch_op.alter_column('tool_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key(FK, 'tool', ['tool_id'], ['id'], ondelete='CASCADE')
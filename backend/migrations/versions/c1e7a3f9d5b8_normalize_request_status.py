@@ -0,0 +1,33 @@
+"""normalize request status
+
+Revision ID: c1e7a3f9d5b8
+Revises: b6d4f8a2c0e3
+Create Date: 2026-10-18 14:21:06.448913
+
+Rewrites request.status and requested_tool.status to the canonical 'Pending' /
+'Approved' / 'Rejected' spelling. The models normalize on write from now on, so queries
+compare status directly and ix_request_status_date_requested /
+ix_requested_tool_tool_id_status can serve them (lower(status) could not).
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'c1e7a3f9d5b8'
+down_revision = 'b6d4f8a2c0e3'
+branch_labels = None
+depends_on = None
+
+STATUSES = ("Pending", "Approved", "Rejected")
+
+
+def upgrade():
+    for table in ("request", "requested_tool"):
+        for status in STATUSES:
+            op.execute(
+                f"UPDATE {table} SET status = '{status}' "
+                f"WHERE lower(trim(status)) = '{status.lower()}' AND status <> '{status}'"
+            )
+
+
+def downgrade():
+    pass  # the canonical spelling is valid for the old code as well
@@ -0,0 +1,49 @@
+"""add hot-path indexes
+
+Revision ID: c5d2a8e4f1b6
+Revises: b3f1c9d2e7a4
+Create Date: 2026-10-17 11:40:08.532971
+
+Composite indexes for the queries in api.py. On Postgres they are built
+CONCURRENTLY (outside the migration transaction) so writes are not blocked.
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'c5d2a8e4f1b6'
+down_revision = 'b3f1c9d2e7a4'
+branch_labels = None
+depends_on = None
+
+# (index name, table, columns) -- keep in sync with __table_args__ in models.py
+INDEXES = [
+    ('ix_request_user_id_date_requested', 'request', ['user_id', 'date_requested']),
+    ('ix_request_status_date_requested', 'request', ['status', 'date_requested', 'id']),
+    ('ix_request_date_requested_id', 'request', ['date_requested', 'id']),
+    ('ix_requested_tool_request_id', 'requested_tool', ['request_id']),
+    ('ix_requested_tool_tool_id_status', 'requested_tool', ['tool_id', 'status']),
+    ('ix_tool_usage_tool_id_date_used', 'tool_usage', ['tool_id', 'date_used']),
+    ('ix_tool_name_id', 'tool', ['name', 'id']),
+    ('ix_tool_category_id_name', 'tool', ['category_id', 'name']),
+    ('ix_users_facility', 'users', ['facility']),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, cols in INDEXES:
+                op.create_index(name, table, cols, postgresql_concurrently=True, if_not_exists=True)
+    else:
+        for name, table, cols in INDEXES:
+            op.create_index(name, table, cols, if_not_exists=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, _cols in reversed(INDEXES):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    else:
+        for name, table, _cols in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True)
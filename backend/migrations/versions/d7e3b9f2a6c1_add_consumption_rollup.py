@@ -0,0 +1,35 @@
+"""add consumption rollup
+
+Revision ID: d7e3b9f2a6c1
+Revises: c5d2a8e4f1b6
+Create Date: 2026-10-17 15:02:51.270443
+
+Approved/used quantities per (tool, facility, month), kept current by rollups.py.
+Backfill existing history with `flask rebuild-rollups` after upgrading.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd7e3b9f2a6c1'
+down_revision = 'c5d2a8e4f1b6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'consumption_rollup',
+        sa.Column('tool_id', sa.Integer(), sa.ForeignKey('tool.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('facility', sa.String(length=100), nullable=False, server_default=''),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('approved_qty', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('used_qty', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('tool_id', 'facility', 'month'),
+    )
+    op.create_index('ix_consumption_rollup_month_facility', 'consumption_rollup', ['month', 'facility'])
+
+
+def downgrade():
+    op.drop_index('ix_consumption_rollup_month_facility', table_name='consumption_rollup')
+    op.drop_table('consumption_rollup')
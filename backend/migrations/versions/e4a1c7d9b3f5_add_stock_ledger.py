@@ -0,0 +1,57 @@
+"""add stock ledger
+
+Revision ID: e4a1c7d9b3f5
+Revises: d7e3b9f2a6c1
+Create Date: 2026-10-17 17:26:13.904127
+
+Append-only stock_movement table plus stock_snapshot (see stock_ledger.py). Every
+tool's current quantity is recorded as an 'opening' movement so the ledger balances
+from the start.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e4a1c7d9b3f5'
+down_revision = 'd7e3b9f2a6c1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'stock_movement',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('tool_id', sa.Integer(), sa.ForeignKey('tool.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('delta', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('request_id', sa.Integer(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('note', sa.String(length=255), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_stock_movement_tool_id_id', 'stock_movement', ['tool_id', 'id'])
+    op.create_index('ix_stock_movement_tool_id_created_at', 'stock_movement', ['tool_id', 'created_at'])
+    op.create_table(
+        'stock_snapshot',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('tool_id', sa.Integer(), sa.ForeignKey('tool.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('taken_at', sa.DateTime(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('last_movement_id', sa.Integer(), nullable=False, server_default='0'),
+    )
+    op.create_index('ix_stock_snapshot_tool_id_taken_at', 'stock_snapshot', ['tool_id', 'taken_at'])
+
+    op.execute(
+        "INSERT INTO stock_movement (tool_id, delta, kind, note, created_at) "
+        "SELECT id, quantity, 'opening', 'balance when the ledger was introduced', CURRENT_TIMESTAMP "
+        "FROM tool WHERE quantity IS NOT NULL AND quantity <> 0"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_stock_snapshot_tool_id_taken_at', table_name='stock_snapshot')
+    op.drop_table('stock_snapshot')
+    op.drop_index('ix_stock_movement_tool_id_created_at', table_name='stock_movement')
+    op.drop_index('ix_stock_movement_tool_id_id', table_name='stock_movement')
+    op.drop_table('stock_movement')
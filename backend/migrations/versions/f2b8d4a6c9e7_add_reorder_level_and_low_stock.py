@@ -0,0 +1,34 @@
+"""add reorder level and low-stock set
+
+Revision ID: f2b8d4a6c9e7
+Revises: e4a1c7d9b3f5
+Create Date: 2026-10-17 19:08:37.615920
+
+tool.reorder_level (0 = no alert) and the low_stock table maintained by low_stock.py.
+Every existing tool starts at level 0, so the set starts empty.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'f2b8d4a6c9e7'
+down_revision = 'e4a1c7d9b3f5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('tool', sa.Column('reorder_level', sa.Integer(), nullable=False, server_default='0'))
+    op.create_table(
+        'low_stock',
+        sa.Column('tool_id', sa.Integer(), sa.ForeignKey('tool.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('reorder_level', sa.Integer(), nullable=False),
+        sa.Column('since', sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('low_stock')
+    with op.batch_alter_table('tool') as batch_op:
+        batch_op.drop_column('reorder_level')
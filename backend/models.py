@@ -81,9 +81,27 @@ class Request(db.Model):
 from extensions import db
 from datetime import datetime
 from flask_login import UserMixin
+from sqlalchemy import select, func, union_all
+from sqlalchemy.orm import column_property, validates
+
+# Request and line statuses are stored in this spelling (see normalize_status), so the
+# status indexes serve plain equality filters; never compare through lower().
+STATUSES = ("Pending", "Approved", "Rejected")
+
+
+def normalize_status(value):
+    """'approved' / ' APPROVED ' -> 'Approved'; anything else is kept as given."""
+    if value is None:
+        return value
+    folded = str(value).strip().capitalize()
+    return folded if folded in STATUSES else value
+
 
 class Users(db.Model, UserMixin):
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('ix_users_facility', 'facility'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     first_name = db.Column(db.String(100), nullable=False)
@@ -140,11 +158,16 @@ class ToolCategory(db.Model):
 
 class Tool(db.Model):
     __tablename__ = 'tool'
+    __table_args__ = (
+        db.Index('ix_tool_name_id', 'name', 'id'),                 # list_tools keyset order, name lookups
+        db.Index('ix_tool_category_id_name', 'category_id', 'name'),  # category filter, catalog
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     description = db.Column(db.String(500), nullable=True)
     quantity = db.Column(db.Integer, nullable=False, default=0)
     category_id = db.Column(db.Integer, db.ForeignKey('tool_category.id'))
+    reorder_level = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # 0 = no alert
 
 
     # Relationship with requested_tool (a tool can appear in many requested_tool records)
@@ -157,17 +180,17 @@ class Tool(db.Model):
             "description": self.description,
             "category": self.category.name
         }
-    
-    # Define a property to calculate available quantity dynamically
-    @property
-    def available_quantity(self):
-        approved_requests = RequestedTool.query.filter_by(tool_id=self.id, status='approved').all()
-        total_requested_quantity = sum(request.quantity for request in approved_requests)
-        total_used_quantity = sum(usage.quantity_used for usage in self.usage_records)
-        return total_requested_quantity - total_used_quantity
+
+    # available_quantity is attached below as a deferred column_property, once
+    # RequestedTool and ToolUsage exist to build the aggregate from.
 
 class Request(db.Model):
     __tablename__ = 'request'
+    __table_args__ = (
+        db.Index('ix_request_user_id_date_requested', 'user_id', 'date_requested'),        # my_requests
+        db.Index('ix_request_status_date_requested', 'status', 'date_requested', 'id'),    # admin queue by status
+        db.Index('ix_request_date_requested_id', 'date_requested', 'id'),                  # admin queue, all
+    )
     id = db.Column(db.Integer, primary_key=True)
 #   tool_id = db.Column(db.Integer, db.ForeignKey('tool.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -184,6 +207,10 @@ class Request(db.Model):
 
     # Relationship with RequestedTool
     requested_tools = db.relationship('RequestedTool', back_populates='request', cascade="all, delete-orphan")
+
+    @validates('status')
+    def _normalize_status(self, _key, value):
+        return normalize_status(value)
     
     def to_dict(self):
         return {
@@ -198,6 +225,10 @@ class Request(db.Model):
 
 class RequestedTool(db.Model):
     __tablename__ = 'requested_tool'
+    __table_args__ = (
+        db.Index('ix_requested_tool_request_id', 'request_id'),               # selectin of request lines
+        db.Index('ix_requested_tool_tool_id_status', 'tool_id', 'status'),    # availability aggregates
+    )
     id = db.Column(db.Integer, primary_key=True)
     request_id = db.Column(db.Integer, db.ForeignKey('request.id'), nullable=False)
     tool_id = db.Column(db.Integer, db.ForeignKey('tool.id'), nullable=False)
@@ -211,6 +242,10 @@ class RequestedTool(db.Model):
     # Relationship with Tool
     tool = db.relationship('Tool', back_populates='requested_tool')
 
+    @validates('status')
+    def _normalize_status(self, _key, value):
+        return normalize_status(value)
+
   
     
     def to_dict(self):
@@ -224,6 +259,9 @@ class RequestedTool(db.Model):
 
 class ToolUsage(db.Model):
     __tablename__ = 'tool_usage'
+    __table_args__ = (
+        db.Index('ix_tool_usage_tool_id_date_used', 'tool_id', 'date_used'),  # tool_logs, newest first
+    )
     id = db.Column(db.Integer, primary_key=True)
     tool_id = db.Column(db.Integer, db.ForeignKey('tool.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -244,3 +282,110 @@ class ToolUsage(db.Model):
             "quantity_used": self.quantity_used,
             "date_used": self.date_used
         }
+
+
+# --------- Availability (approved quantity minus recorded usage) ---------
+def _approved_filter():
+    # plain equality so ix_requested_tool_tool_id_status applies; statuses are normalized on write
+    return RequestedTool.status == 'Approved'
+
+Tool.available_quantity = column_property(
+    select(func.coalesce(func.sum(RequestedTool.quantity), 0))
+    .where(RequestedTool.tool_id == Tool.id, _approved_filter())
+    .correlate_except(RequestedTool)
+    .scalar_subquery()
+    - select(func.coalesce(func.sum(ToolUsage.quantity_used), 0))
+    .where(ToolUsage.tool_id == Tool.id)
+    .correlate_except(ToolUsage)
+    .scalar_subquery(),
+    deferred=True,
+)
+
+
+def available_quantities(tool_ids=None):
+    """
+    Available quantity for many tools in one grouped query.
+    Returns {tool_id: int}; ids with no approved lines or usage map to 0.
+    With tool_ids=None every tool that has approved lines or usage is returned
+    (callers default the rest to 0), without an IN list.
+    """
+    approved = select(RequestedTool.tool_id.label('tool_id'), RequestedTool.quantity.label('qty')).where(_approved_filter())
+    used = select(ToolUsage.tool_id.label('tool_id'), (-ToolUsage.quantity_used).label('qty'))
+    ids = None
+    if tool_ids is not None:
+        ids = list({int(i) for i in tool_ids})
+        if not ids:
+            return {}
+        approved = approved.where(RequestedTool.tool_id.in_(ids))
+        used = used.where(ToolUsage.tool_id.in_(ids))
+    movements = union_all(approved, used).subquery()
+    rows = db.session.execute(
+        select(movements.c.tool_id, func.sum(movements.c.qty)).group_by(movements.c.tool_id)
+    )
+    out = dict.fromkeys(ids or (), 0)
+    out.update({tid: int(total or 0) for tid, total in rows})
+    return out
+
+
+# --------- Catalog snapshot version (bumped by catalog_cache.invalidate) ---------
+class CatalogVersion(db.Model):
+    """Single row (id=1) whose version changes whenever the /api/catalog contents do."""
+    __tablename__ = 'catalog_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+
+
+# --------- Consumption rollup (maintained by rollups.py) ---------
+class ConsumptionRollup(db.Model):
+    """Approved and used quantities per (tool, facility, month); month is its first day."""
+    __tablename__ = 'consumption_rollup'
+    __table_args__ = (
+        db.Index('ix_consumption_rollup_month_facility', 'month', 'facility'),  # report by period
+    )
+    tool_id = db.Column(db.Integer, db.ForeignKey('tool.id', ondelete='CASCADE'), primary_key=True)
+    facility = db.Column(db.String(100), primary_key=True, default='')  # '' when the user has none
+    month = db.Column(db.Date, primary_key=True)
+    approved_qty = db.Column(db.Integer, nullable=False, default=0)
+    used_qty = db.Column(db.Integer, nullable=False, default=0)
+
+
+# --------- Stock ledger (maintained by stock_ledger.py) ---------
+class StockMovement(db.Model):
+    """One change to Tool.quantity. Rows are only ever appended."""
+    __tablename__ = 'stock_movement'
+    __table_args__ = (
+        db.Index('ix_stock_movement_tool_id_id', 'tool_id', 'id'),                  # deltas after a snapshot
+        db.Index('ix_stock_movement_tool_id_created_at', 'tool_id', 'created_at'),  # point-in-time, history
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    # SET NULL: history outlives the tool; delete_tool leaves a 'deletion' tombstone naming it
+    tool_id = db.Column(db.Integer, db.ForeignKey('tool.id', ondelete='SET NULL'), nullable=True)
+    delta = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # opening | initial | restock | approval | edit | import | adjustment | reversal | deletion
+    request_id = db.Column(db.Integer, nullable=True)  # approvals: the request that consumed the stock
+    user_id = db.Column(db.Integer, nullable=True)     # who made the change, when known
+    note = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class StockSnapshot(db.Model):
+    """Tool quantity according to the ledger, up to and including movement last_movement_id."""
+    __tablename__ = 'stock_snapshot'
+    __table_args__ = (
+        db.Index('ix_stock_snapshot_tool_id_taken_at', 'tool_id', 'taken_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    tool_id = db.Column(db.Integer, db.ForeignKey('tool.id', ondelete='CASCADE'), nullable=False)
+    taken_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    quantity = db.Column(db.Integer, nullable=False)
+    last_movement_id = db.Column(db.Integer, nullable=False, default=0)
+
+
+# --------- Low-stock set (maintained by low_stock.py) ---------
+class LowStock(db.Model):
+    """Tools at or below their reorder level; `since` is when the tool went low."""
+    __tablename__ = 'low_stock'
+    tool_id = db.Column(db.Integer, db.ForeignKey('tool.id', ondelete='CASCADE'), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    reorder_level = db.Column(db.Integer, nullable=False)
+    since = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,62 @@
+"""
+Command-line run of the SQL statement budgets in tests/budgets.py (the same check
+as tests/test_query_budget.py), printing each endpoint's worst count per seed size:
+
+    python query_budget.py                                   # temp SQLite file
+    python query_budget.py --database-url postgresql://...   # scratch Postgres DB (tables are dropped!)
+    python query_budget.py --rows 10,200 -v                  # seed sizes; -v lists every statement on failure
+"""
+import os
+import sys
+import argparse
+import tempfile
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Check SQL statement budgets for every API endpoint.")
+    p.add_argument("--database-url", help="Scratch database URL (default: a temporary SQLite file). ALL TABLES ARE DROPPED.")
+    p.add_argument("--rows", default="10,100", help="comma-separated seed sizes (default 10,100)")
+    p.add_argument("-v", "--verbose", action="store_true", help="print the statements of failing requests")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "budget.db")
+    os.environ["DATABASE_URL"] = url
+    os.environ["DEV_DATABASE_URL"] = url
+    os.environ.setdefault("SLOW_QUERY_MS", "0")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from app import create_app
+    from tests import budgets
+
+    app = create_app()
+    sizes = sorted({int(s) for s in args.rows.split(",")})
+    if sizes[0] < 10:
+        sys.exit("--rows sizes must be at least 10")
+
+    no_budget, stale = budgets.missing_budgets(app)
+    failures = [f"{e}: budget for an endpoint that no longer exists" for e in stale]
+    per_size = {n: budgets.run(app, n) for n in sizes}
+    covered = set().union(*per_size.values())
+
+    print(f"{'endpoint':<32}{'budget':>7}" + "".join(f"{f'n={n}':>8}" for n in sizes))
+    for endpoint in sorted(covered | set(budgets.BUDGETS) - set(stale)):
+        budget = budgets.BUDGETS.get(endpoint)
+        worst = [max((len(s) for _u, _st, s in per_size[n].get(endpoint, [])), default="-") for n in sizes]
+        print(f"{endpoint:<32}{budget if budget is not None else '-':>7}" + "".join(f"{w:>8}" for w in worst))
+        for message, statements in budgets.problems(endpoint, per_size):
+            failures.append(message)
+            if args.verbose:
+                failures += [f"    {' '.join(s.split())[:200]}" for s in statements]
+    failures += [f"{e}: no budget declared" for e in no_budget if e not in covered]
+
+    if failures:
+        print("\nFAILED")
+        print("\n".join(failures))
+        sys.exit(1)
+    print(f"\nall {len(covered)} endpoints within budget")
+
+
+if __name__ == "__main__":
+    main()
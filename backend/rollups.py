@@ -0,0 +1,188 @@
+# backend/rollups.py
+"""
+Monthly consumption rollup: approved and used quantities per (tool, facility, month).
+
+The consumption_rollup table is kept current incrementally, inside the transaction
+that changes the source rows:
+  - record_approvals(req_ids) after request lines are approved (sign=-1 to take an
+    approved request back out, e.g. when it is rejected afterwards)
+  - ToolUsage inserts/updates/deletes through the ORM, via mapper events below
+
+Facility is the requesting/using user's facility at the time of the write; month is
+the first day of the approval (or usage) month. Bulk writes that bypass the ORM and
+any historical data are covered by rebuild(), run as `flask rebuild-rollups`.
+"""
+from datetime import date
+
+from sqlalchemy import Date, cast, delete, event, extract, func, insert, inspect, literal, select, union_all, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from extensions import db
+from models import (ConsumptionRollup, Request as RequestModel, RequestedTool, ToolUsage, Users,
+                    _approved_filter)
+
+KEY_COLUMNS = ("tool_id", "facility", "month")
+USAGE_FIELDS = ("tool_id", "user_id", "date_used", "quantity_used")
+
+
+def month_start(dt):
+    return date(dt.year, dt.month, 1) if dt else None
+
+
+def apply(deltas, connection=None):
+    """
+    Add deltas {(tool_id, facility, month): (approved, used)} to the rollup with one
+    upsert statement. Runs on `connection` (mapper events) or the current session.
+    """
+    rows = [
+        {"tool_id": tid, "facility": fac or "", "month": month, "approved_qty": a, "used_qty": u}
+        for (tid, fac, month), (a, u) in deltas.items()
+        if month is not None and (a or u)
+    ]
+    if not rows:
+        return
+    execute = connection.execute if connection is not None else db.session.execute
+    dialect = (connection.dialect if connection is not None else db.session.get_bind().dialect).name
+    table = ConsumptionRollup.__table__
+    if dialect in ("postgresql", "sqlite"):
+        stmt = (postgresql if dialect == "postgresql" else sqlite).insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(KEY_COLUMNS),
+            set_={
+                "approved_qty": table.c.approved_qty + stmt.excluded.approved_qty,
+                "used_qty": table.c.used_qty + stmt.excluded.used_qty,
+            },
+        )
+        execute(stmt, rows)
+        return
+    # generic fallback: update in place, insert the keys that did not exist yet
+    for row in rows:
+        res = execute(
+            update(table)
+            .where(*(table.c[k] == row[k] for k in KEY_COLUMNS))
+            .values(approved_qty=table.c.approved_qty + row["approved_qty"],
+                    used_qty=table.c.used_qty + row["used_qty"])
+        )
+        if res.rowcount == 0:
+            execute(insert(table), [row])
+
+
+def record_approvals(req_ids, sign=1):
+    """Add (sign=1) or remove (sign=-1) the approved lines of req_ids, in the caller's transaction."""
+    req_ids = list(req_ids)
+    if not req_ids:
+        return
+    deltas = {}
+    for tid, facility, approved_at, requested_at, qty in (
+        db.session.query(RequestedTool.tool_id, Users.facility, RequestModel.date_approved,
+                         RequestModel.date_requested, RequestedTool.quantity)
+        .join(RequestModel, RequestedTool.request_id == RequestModel.id)
+        .outerjoin(Users, RequestModel.user_id == Users.id)
+        .filter(RequestedTool.request_id.in_(req_ids), _approved_filter())
+    ):
+        key = (tid, facility or "", month_start(approved_at or requested_at))
+        deltas[key] = (deltas.get(key, (0, 0))[0] + sign * (qty or 0), 0)
+    apply(deltas)
+
+
+# ---------- ToolUsage writes ----------
+def _usage_key(connection, tool_id, user_id, used_at):
+    facility = connection.execute(select(Users.facility).where(Users.id == user_id)).scalar() if user_id else None
+    return (tool_id, facility or "", month_start(used_at))
+
+
+@event.listens_for(ToolUsage, "after_insert")
+def _usage_inserted(mapper, connection, target):
+    key = _usage_key(connection, target.tool_id, target.user_id, target.date_used)
+    apply({key: (0, target.quantity_used or 0)}, connection)
+
+
+@event.listens_for(ToolUsage, "before_update")
+def _usage_updated(mapper, connection, target):
+    # old values come from the row itself: expired attributes carry no history
+    state = inspect(target)
+    if not any(state.attrs[a].history.has_changes() for a in USAGE_FIELDS):
+        return
+    old = connection.execute(
+        select(*(ToolUsage.__table__.c[a] for a in USAGE_FIELDS)).where(ToolUsage.__table__.c.id == target.id)
+    ).first()
+    if old is None:
+        return
+    deltas = {}
+    old_key = _usage_key(connection, old.tool_id, old.user_id, old.date_used)
+    new_key = _usage_key(connection, target.tool_id, target.user_id, target.date_used)
+    deltas[old_key] = (0, -(old.quantity_used or 0))
+    deltas[new_key] = (0, deltas.get(new_key, (0, 0))[1] + (target.quantity_used or 0))
+    apply(deltas, connection)
+
+
+@event.listens_for(ToolUsage, "after_delete")
+def _usage_deleted(mapper, connection, target):
+    key = _usage_key(connection, target.tool_id, target.user_id, target.date_used)
+    apply({key: (0, -(target.quantity_used or 0))}, connection)
+
+
+# ---------- Backfill ----------
+NATIVE_MONTH_DIALECTS = ("postgresql", "sqlite")
+
+
+def _month_expr(column, dialect):
+    """First day of the month as a DATE, for NATIVE_MONTH_DIALECTS."""
+    if dialect == "postgresql":
+        return cast(func.date_trunc("month", column), Date)
+    return func.date(column, "start of month")
+
+
+def _month_parts(column):
+    return extract("year", column), extract("month", column)
+
+
+def rebuild():
+    """Recompute the whole rollup from requested_tool and tool_usage. Returns the row count."""
+    dialect = db.session.get_bind().dialect.name
+    native = dialect in NATIVE_MONTH_DIALECTS
+
+    def month(column):
+        # native: one DATE column; elsewhere year and month columns, joined in Python below
+        return [_month_expr(column, dialect).label("month")] if native else [
+            part.label(name) for part, name in zip(_month_parts(column), ("year", "month"))
+        ]
+
+    facility = func.coalesce(Users.facility, "")
+    approved = (
+        select(RequestedTool.tool_id.label("tool_id"), facility.label("facility"),
+               *month(func.coalesce(RequestModel.date_approved, RequestModel.date_requested)),
+               RequestedTool.quantity.label("approved_qty"), literal(0).label("used_qty"))
+        .join(RequestModel, RequestedTool.request_id == RequestModel.id)
+        .outerjoin(Users, RequestModel.user_id == Users.id)
+        .where(_approved_filter())
+    )
+    used = (
+        select(ToolUsage.tool_id, facility, *month(ToolUsage.date_used),
+               literal(0), ToolUsage.quantity_used)
+        .outerjoin(Users, ToolUsage.user_id == Users.id)
+        .where(ToolUsage.date_used.isnot(None))
+    )
+    movements = union_all(approved, used).subquery()
+    keys = [movements.c.tool_id, movements.c.facility] + (
+        [movements.c.month] if native else [movements.c.year, movements.c.month]
+    )
+    grouped = (
+        select(*keys, func.coalesce(func.sum(movements.c.approved_qty), 0), func.coalesce(func.sum(movements.c.used_qty), 0))
+        .where(movements.c.month.isnot(None))
+        .group_by(*keys)
+    )
+    table = ConsumptionRollup.__table__
+    db.session.execute(delete(table))
+    columns = ["tool_id", "facility", "month", "approved_qty", "used_qty"]
+    if native:
+        db.session.execute(insert(table).from_select(columns, grouped))
+    else:
+        rows = [
+            dict(zip(columns, (tid, fac, date(int(y), int(m), 1), a, u)))
+            for tid, fac, y, m, a, u in db.session.execute(grouped)
+        ]
+        if rows:
+            db.session.execute(insert(table), rows)
+    db.session.commit()
+    return db.session.query(func.count()).select_from(table).scalar()
@@ -0,0 +1,226 @@
+# backend/search.py
+"""
+Ranked tool search over name, description and category name.
+
+Postgres: tool_search table (tsvector document + GIN, lowercased body + pg_trgm GIN
+for typo tolerance), created by the b3f1c9d2e7a4 migration.
+SQLite (local runs): FTS5 virtual table tool_fts, created by the same migration or by
+ensure_index() during app setup.
+
+The index is maintained explicitly by the write paths (create/update/import/seed/delete)
+inside their own transaction. If no index is available, search_tool_ids() and
+match_ids() return None and callers fall back to a plain ILIKE filter.
+
+search_tool_ids() returns ranked (id, score) pairs for relevance-ordered results;
+match_ids() is an uncapped subquery for callers that filter and page in the database.
+"""
+import re
+from sqlalchemy import Integer, column, text, bindparam
+from sqlalchemy.exc import DBAPIError
+
+from extensions import db
+
+TRGM_MIN_WORD_SIMILARITY = 0.4
+
+_ready = {}  # engine url -> bool (index usable)
+
+_PG_UPSERT = """
+    INSERT INTO tool_search (tool_id, body, document)
+    SELECT t.id,
+           lower(coalesce(t.name, '') || ' ' || coalesce(c.name, '') || ' ' || coalesce(t.description, '')),
+           setweight(to_tsvector('simple', coalesce(t.name, '')), 'A')
+             || setweight(to_tsvector('simple', coalesce(c.name, '')), 'B')
+             || setweight(to_tsvector('simple', coalesce(t.description, '')), 'C')
+    FROM tool t LEFT JOIN tool_category c ON c.id = t.category_id
+    WHERE {where}
+    ON CONFLICT (tool_id) DO UPDATE SET body = EXCLUDED.body, document = EXCLUDED.document
+"""
+
+_SQLITE_INSERT = """
+    INSERT INTO tool_fts (rowid, name, category, description)
+    SELECT t.id, coalesce(t.name, ''), coalesce(c.name, ''), coalesce(t.description, '')
+    FROM tool t LEFT JOIN tool_category c ON c.id = t.category_id
+    WHERE {where}
+"""
+
+SQLITE_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS tool_fts USING fts5("
+    "name, category, description, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+)
+
+
+def _dialect():
+    return db.session.get_bind().dialect.name
+
+
+def _tokens(q):
+    return re.findall(r"\w+", (q or "").lower())[:8]
+
+
+def ensure_index():
+    """Create and backfill the SQLite FTS5 table if it is missing. Postgres relies on the migration."""
+    if _dialect() != "sqlite":
+        return
+    exists = db.session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tool_fts'")
+    ).first()
+    if exists:
+        return
+    try:
+        db.session.execute(text(SQLITE_FTS_DDL))
+        db.session.execute(text(_SQLITE_INSERT.format(where="1 = 1")))
+        db.session.commit()
+    except DBAPIError:  # SQLite built without FTS5 -> ILIKE fallback
+        db.session.rollback()
+    _ready.pop(str(db.session.get_bind().url), None)
+
+
+def is_available():
+    """True if the search index exists for the current database (checked once per engine)."""
+    bind = db.session.get_bind()
+    key = str(bind.url)
+    if key not in _ready:
+        if bind.dialect.name == "postgresql":
+            ok = db.session.execute(text("SELECT to_regclass('tool_search') IS NOT NULL")).scalar()
+        elif bind.dialect.name == "sqlite":
+            ok = db.session.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tool_fts'")
+            ).first() is not None
+        else:
+            ok = False
+        _ready[key] = bool(ok)
+    return _ready[key]
+
+
+def _reindex(where, params):
+    if not is_available():
+        return
+    if _dialect() == "postgresql":
+        stmt = text(_PG_UPSERT.format(where=where))
+    else:
+        # FTS5 has no upsert: clear the affected rows, then re-insert them
+        db.session.execute(
+            text(f"DELETE FROM tool_fts WHERE rowid IN (SELECT t.id FROM tool t WHERE {where})").bindparams(
+                *[bindparam(k, expanding=True) for k in params]
+            ),
+            params,
+        )
+        stmt = text(_SQLITE_INSERT.format(where=where))
+    db.session.execute(stmt.bindparams(*[bindparam(k, expanding=True) for k in params]), params)
+
+
+def index_tools(tool_ids):
+    """(Re)index the given tools. Runs in the caller's transaction."""
+    ids = sorted({int(i) for i in tool_ids})
+    if ids:
+        _reindex("t.id IN :ids", {"ids": ids})
+
+
+def index_tools_by_name(names):
+    """(Re)index every tool whose name is in names (used by bulk paths that never see ids)."""
+    names = sorted({n for n in names if n})
+    for i in range(0, len(names), 500):
+        _reindex("t.name IN :names", {"names": names[i:i + 500]})
+
+
+def remove_tools(tool_ids):
+    """Drop tools from the index. Postgres cascades via the FK; FTS5 needs an explicit delete."""
+    ids = sorted({int(i) for i in tool_ids})
+    if not ids or not is_available() or _dialect() != "sqlite":
+        return
+    db.session.execute(
+        text("DELETE FROM tool_fts WHERE rowid IN :ids").bindparams(bindparam("ids", expanding=True)),
+        {"ids": ids},
+    )
+
+
+def rebuild():
+    """Rebuild the whole index from the tool table."""
+    if not is_available():
+        return False
+    if _dialect() == "postgresql":
+        db.session.execute(text("DELETE FROM tool_search"))
+        db.session.execute(text(_PG_UPSERT.format(where="TRUE")))
+    else:
+        db.session.execute(text("DELETE FROM tool_fts"))
+        db.session.execute(text(_SQLITE_INSERT.format(where="1 = 1")))
+    return True
+
+
+def _pg_params(tokens):
+    # transaction-local threshold for the <% operator (default 0.6 is too strict for typos)
+    db.session.execute(
+        text("SELECT set_config('pg_trgm.word_similarity_threshold', :v, true)"),
+        {"v": str(TRGM_MIN_WORD_SIMILARITY)},
+    )
+    return {"tsq": " & ".join(f"{t}:*" for t in tokens), "raw": " ".join(tokens)}
+
+
+def _fts_match(tokens):
+    return " AND ".join(f'"{t}"*' for t in tokens)
+
+
+def match_ids(q):
+    """
+    Subquery of every matching tool id (no cap, no ranking), for Tool.id.in_(...).
+    Returns None when no index is available, or an empty list for a query with no terms.
+    """
+    tokens = _tokens(q)
+    if not tokens:
+        return []
+    if not is_available():
+        return None
+    if _dialect() == "postgresql":
+        stmt = text(
+            "SELECT s.tool_id FROM tool_search s "
+            "WHERE s.document @@ to_tsquery('simple', :tsq) OR :raw <% s.body"
+        ).bindparams(**_pg_params(tokens))
+    else:
+        stmt = text("SELECT rowid FROM tool_fts WHERE tool_fts MATCH :m").bindparams(m=_fts_match(tokens))
+    return stmt.columns(column("tool_id", Integer))
+
+
+def search_tool_ids(q, limit=None):
+    """
+    Ranked matches for q as a list of (tool_id, score), best first; every match when
+    limit is None. Every term is matched as a prefix; on Postgres, trigram word
+    similarity also catches misspellings. Returns None when no index is available.
+    """
+    tokens = _tokens(q)
+    if not tokens:
+        return []
+    if not is_available():
+        return None
+    limit_sql = "LIMIT :limit" if limit is not None else ""
+
+    if _dialect() == "postgresql":
+        params = _pg_params(tokens)
+        if limit is not None:
+            params["limit"] = limit
+        rows = db.session.execute(
+            text(f"""
+                SELECT s.tool_id,
+                       ts_rank_cd(s.document, to_tsquery('simple', :tsq)) + word_similarity(:raw, s.body) AS score
+                FROM tool_search s
+                WHERE s.document @@ to_tsquery('simple', :tsq) OR :raw <% s.body
+                ORDER BY score DESC, s.tool_id
+                {limit_sql}
+            """),
+            params,
+        )
+        return [(tid, float(score)) for tid, score in rows]
+
+    # bm25() is lower-is-better; weight name > category > description
+    params = {"m": _fts_match(tokens)}
+    if limit is not None:
+        params["limit"] = limit
+    rows = db.session.execute(
+        text(f"""
+            SELECT rowid, bm25(tool_fts, 10.0, 4.0, 1.0) AS score
+            FROM tool_fts WHERE tool_fts MATCH :m
+            ORDER BY score, rowid
+            {limit_sql}
+        """),
+        params,
+    )
+    return [(tid, -float(score)) for tid, score in rows]
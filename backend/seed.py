@@ -3,10 +3,19 @@ import csv
 import argparse
 from typing import Optional
 
+from sqlalchemy import insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+
 from app import create_app
 from extensions import db
+import search
+import catalog_cache
+import category_cache
+import stock_ledger
 from models import ToolCategory, Tool
 
+IN_CHUNK = 500  # keep IN (...) lists well under driver/SQLite parameter limits
+
 
 def str_to_bool(val: Optional[str]) -> bool:
     if val is None:
@@ -15,110 +24,181 @@ def str_to_bool(val: Optional[str]) -> bool:
     return s in ("1", "true", "yes", "y", "t")
 
 
-def upsert_row(category_name: str, tool_name: str, description: str) -> str:
-    """
-    Create or update ToolCategory & Tool. Returns one of: 'created', 'updated', 'skipped'
-    """
-    # Category
-    cat = ToolCategory.query.filter_by(name=category_name).first()
-    if not cat:
-        cat = ToolCategory(name=category_name.strip())
-        db.session.add(cat)
-        db.session.flush()  # get cat.id
-
-    # Tool (unique by name per your current schema)
-    tool = Tool.query.filter_by(name=tool_name).first()
-    if tool:
-        changed = False
-        # Move tool to a different category if needed
-        if tool.category_id != cat.id:
-            tool.category = cat
-            changed = True
-        # Update description if provided and changed
-        if description and (tool.description or "").strip() != description.strip():
-            tool.description = description.strip()
-            changed = True
-        return "updated" if changed else "skipped"
-    else:
-        tool = Tool(name=tool_name.strip(), description=(description or "").strip(), category=cat)
-        db.session.add(tool)
-        return "created"
+def _chunks(seq, size=IN_CHUNK):
+    seq = list(seq)
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
 
 
-def delete_inactive(tool_name: str) -> bool:
+def load_csv(path: str):
     """
-    Delete a tool by name if it exists. Returns True if deleted.
+    Read the catalog CSV once.
+    Returns (rows, skipped) where rows maps tool_name -> dict(row, category, description, active)
+    (last occurrence wins) and skipped is a list of (row_no, reason) for unusable rows.
     """
-    tool = Tool.query.filter_by(name=tool_name).first()
-    if tool:
-        db.session.delete(tool)
-        return True
-    return False
-
-
-def process_csv(path: str, dry_run: bool = False, delete_inactive_rows: bool = False):
     if not os.path.isfile(path):
         raise FileNotFoundError(f"CSV file not found: {path}")
 
-    created = updated = skipped = deleted = 0
-    seen_tools = set()
-
+    rows = {}
+    skipped = []
     with open(path, "r", newline="", encoding="utf-8") as fh:
         reader = csv.DictReader(fh)
         # Validate required headers
         required = {"category_name", "tool_name"}
-        missing = [h for h in required if h not in reader.fieldnames]
+        missing = [h for h in required if h not in (reader.fieldnames or [])]
         if missing:
             raise ValueError(f"CSV missing required columns: {', '.join(missing)}")
 
         for i, row in enumerate(reader, start=2):  # start=2 to account for header row
             category_name = (row.get("category_name") or "").strip()
             tool_name = (row.get("tool_name") or "").strip()
-            description = (row.get("description") or "").strip()
-            is_active = str_to_bool(row.get("is_active"))
-
             if not category_name or not tool_name:
-                print(f"Row {i}: skipped (missing category_name or tool_name)")
-                skipped += 1
+                skipped.append((i, "missing category_name or tool_name"))
                 continue
-
-            seen_tools.add(tool_name)
-
-            if not is_active:
-                # Optionally delete inactive
-                if delete_inactive_rows:
-                    if delete_inactive(tool_name):
-                        print(f"Row {i}: deleted (inactive) — {tool_name}")
-                        deleted += 1
-                    else:
-                        print(f"Row {i}: skipped (inactive; not found) — {tool_name}")
-                        skipped += 1
-                else:
-                    print(f"Row {i}: skipped (inactive) — {tool_name}")
-                    skipped += 1
-                continue
-
-            result = upsert_row(category_name, tool_name, description)
-            if result == "created":
-                print(f"Row {i}: created — {category_name} :: {tool_name}")
-                created += 1
-            elif result == "updated":
-                print(f"Row {i}: updated — {category_name} :: {tool_name}")
-                updated += 1
+            if tool_name in rows:
+                skipped.append((rows[tool_name]["row"], f"superseded by row {i} — {tool_name}"))
+            rows[tool_name] = {
+                "row": i,
+                "category": category_name,
+                "description": (row.get("description") or "").strip(),
+                "active": str_to_bool(row.get("is_active")),
+            }
+    return rows, skipped
+
+
+def build_plan(rows: dict, delete_inactive_rows: bool = False) -> dict:
+    """
+    Diff the CSV rows against the database using set-based reads only
+    (one category query plus one tool query per IN_CHUNK names). Nothing is added to the session.
+    """
+    plan = {"new_categories": [], "create": [], "update": [], "delete": [], "skipped": []}
+
+    cat_ids = dict(db.session.query(ToolCategory.name, ToolCategory.id).all())
+    cat_names = {cid: name for name, cid in cat_ids.items()}
+    wanted_cats = {r["category"] for r in rows.values() if r["active"]}
+    plan["new_categories"] = sorted(wanted_cats - set(cat_ids))
+
+    existing = {}
+    for names in _chunks(rows):
+        for tid, name, cat_id, desc in (
+            db.session.query(Tool.id, Tool.name, Tool.category_id, Tool.description)
+            .filter(Tool.name.in_(names))
+            .order_by(Tool.id.asc())
+        ):
+            existing.setdefault(name, (tid, cat_id, desc))
+
+    for name, r in sorted(rows.items(), key=lambda kv: kv[1]["row"]):
+        cur = existing.get(name)
+        if not r["active"]:
+            if delete_inactive_rows and cur:
+                plan["delete"].append({"row": r["row"], "id": cur[0], "name": name})
             else:
-                print(f"Row {i}: skipped (no change) — {category_name} :: {tool_name}")
-                skipped += 1
+                reason = "inactive; not found" if delete_inactive_rows else "inactive"
+                plan["skipped"].append((r["row"], f"{reason} — {name}"))
+            continue
 
-    if dry_run:
-        db.session.rollback()
+        if not cur:
+            plan["create"].append({"row": r["row"], "name": name, "category": r["category"],
+                                   "description": r["description"]})
+            continue
+
+        tid, cur_cat_id, cur_desc = cur
+        change = {}
+        # Move tool to a different category if needed
+        if cat_names.get(cur_cat_id) != r["category"]:
+            change["category"] = r["category"]
+        # Update description if provided and changed
+        if r["description"] and (cur_desc or "").strip() != r["description"]:
+            change["description"] = r["description"]
+        if change:
+            plan["update"].append({"row": r["row"], "id": tid, "name": name, **change})
+        else:
+            plan["skipped"].append((r["row"], f"no change — {r['category']} :: {name}"))
+    return plan
+
+
+def _insert_categories(names):
+    """INSERT ... ON CONFLICT (name) DO NOTHING where the dialect supports it."""
+    if not names:
+        return
+    dialect = db.session.get_bind().dialect.name
+    values = [{"name": n} for n in names]
+    if dialect == "postgresql":
+        stmt = postgresql.insert(ToolCategory).on_conflict_do_nothing(index_elements=["name"])
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(ToolCategory).on_conflict_do_nothing(index_elements=["name"])
     else:
+        # generic fallback: re-check right before inserting
+        present = {n for (n,) in db.session.query(ToolCategory.name).filter(ToolCategory.name.in_(names))}
+        values = [v for v in values if v["name"] not in present]
+        stmt = insert(ToolCategory)
+    if values:
+        db.session.execute(stmt, values)
+        category_cache.categories_inserted()
+
+
+def apply_plan(plan: dict):
+    """Apply a plan produced by build_plan with bulk statements (no per-row ORM objects)."""
+    _insert_categories(plan["new_categories"])
+    needed = {c["category"] for c in plan["create"]} | {u["category"] for u in plan["update"] if "category" in u}
+    cat_ids = category_cache.resolve_many(needed)
+
+    if plan["create"]:
+        db.session.execute(insert(Tool), [
+            {"name": c["name"], "description": c["description"], "category_id": cat_ids[c["category"]]}
+            for c in plan["create"]
+        ])
+
+    # executemany needs uniform parameter sets, so group updates by the columns they touch
+    groups = {}
+    for u in plan["update"]:
+        params = {"id": u["id"]}
+        if "category" in u:
+            params["category_id"] = cat_ids[u["category"]]
+        if "description" in u:
+            params["description"] = u["description"]
+        groups.setdefault(tuple(sorted(params)), []).append(params)
+    for batch in groups.values():
+        db.session.execute(update(Tool), batch)
+
+    for ids in _chunks(d["id"] for d in plan["delete"]):
+        # same bookkeeping as DELETE /api/tools/<id>: ledger tombstone, derived rows
+        stock_ledger.delete_tools(ids)
+        search.remove_tools(ids)
+
+    search.index_tools_by_name([c["name"] for c in plan["create"]] + [u["name"] for u in plan["update"]])
+
+
+def print_plan(plan: dict, skipped_rows=()):
+    for name in plan["new_categories"]:
+        print(f"Category: created — {name}")
+    lines = [(i, f"skipped ({reason})") for i, reason in skipped_rows]
+    lines += [(i, f"skipped ({reason})") for i, reason in plan["skipped"]]
+    lines += [(c["row"], f"created — {c['category']} :: {c['name']}") for c in plan["create"]]
+    for u in plan["update"]:
+        fields = ", ".join(k for k in ("category", "description") if k in u)
+        lines.append((u["row"], f"updated ({fields}) — {u['name']}"))
+    lines += [(d["row"], f"deleted (inactive) — {d['name']}") for d in plan["delete"]]
+    for i, msg in sorted(lines, key=lambda x: x[0]):
+        print(f"Row {i}: {msg}")
+
+
+def process_csv(path: str, dry_run: bool = False, delete_inactive_rows: bool = False):
+    rows, skipped_rows = load_csv(path)
+    plan = build_plan(rows, delete_inactive_rows=delete_inactive_rows)
+    print_plan(plan, skipped_rows)
+
+    if not dry_run:
+        apply_plan(plan)
         db.session.commit()
+        catalog_cache.invalidate()
 
     print("\nSummary:")
-    print(f"  created: {created}")
-    print(f"  updated: {updated}")
-    print(f"  deleted: {deleted}")
-    print(f"  skipped: {skipped}")
+    print(f"  categories: {len(plan['new_categories'])}")
+    print(f"  created: {len(plan['create'])}")
+    print(f"  updated: {len(plan['update'])}")
+    print(f"  deleted: {len(plan['delete'])}")
+    print(f"  skipped: {len(plan['skipped']) + len(skipped_rows)}")
     if dry_run:
         print("  (dry-run: changes were NOT saved)")
 
@@ -134,7 +214,7 @@ def main():
     parser.add_argument(
         "--dry-run",
         action="store_true",
-        help="Preview changes without committing to the database.",
+        help="Print the diff plan without writing to the database.",
     )
     parser.add_argument(
         "--delete-inactive",
@@ -151,4 +231,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,165 @@
+# backend/spa_assets.py
+"""
+Manifest for the Vite build in frontend/dist.
+
+The dist folder is scanned once at startup (stat only, no file is read); requests are
+looked up in the manifest without per-request path checks and the file is streamed
+from disk, so workers hold no asset bodies in memory.
+
+Compressible files are served from their `.gz` / `.br` siblings, which precompress()
+writes once per build at gzip 9 / brotli 11 (brotli needs the optional `brotli`
+package): `python spa_assets.py` in the Render build command, after the frontend build
+when it runs there. Workers never compress assets; a file without an up-to-date sibling
+is served uncompressed.
+
+Cache policy:
+  - fingerprinted build assets (name-<hash>.ext): public, max-age=31536000, immutable
+  - index.html: no-cache (always revalidated via ETag)
+  - anything else in dist: public, max-age=3600
+"""
+import os
+import re
+import gzip
+import mimetypes
+
+from flask import Response, request
+from werkzeug.wsgi import wrap_file
+
+from compression import negotiate
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+DEFAULT_DIST = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "frontend", "dist"))
+
+COMPRESSIBLE = {".js", ".mjs", ".css", ".html", ".svg", ".json", ".txt", ".map", ".xml", ".webmanifest"}
+MIN_COMPRESS_BYTES = 1024
+HASHED_NAME = re.compile(r"[-.][A-Za-z0-9_-]{8,}\.[a-z0-9]+$")
+SIBLINGS = (("br", ".br"), ("gzip", ".gz"))
+
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDATE = "no-cache"
+CACHE_DEFAULT = "public, max-age=3600"
+
+
+def _compressible(rel, size):
+    return os.path.splitext(rel)[1].lower() in COMPRESSIBLE and size >= MIN_COMPRESS_BYTES
+
+
+def precompress(dist=DEFAULT_DIST):
+    """Write missing or stale .gz/.br siblings for compressible files in dist. Returns how many were written."""
+    written = 0
+    for root, _dirs, files in os.walk(dist):
+        for name in files:
+            if name.endswith((".gz", ".br")):
+                continue
+            path = os.path.join(root, name)
+            st = os.stat(path)
+            if not _compressible(name, st.st_size):
+                continue
+            body = None
+            for encoding, ext in SIBLINGS:
+                if encoding == "br" and brotli is None:
+                    continue
+                if os.path.isfile(path + ext) and os.stat(path + ext).st_mtime_ns >= st.st_mtime_ns:
+                    continue  # up to date
+                if body is None:
+                    with open(path, "rb") as fh:
+                        body = fh.read()
+                data = brotli.compress(body, quality=11) if encoding == "br" else gzip.compress(body, compresslevel=9, mtime=0)
+                with open(path + ext, "wb") as fh:
+                    fh.write(data)
+                written += 1
+    return written
+
+
+class Asset:
+    __slots__ = ("mimetype", "cache_control", "variants", "compressible")
+
+    def __init__(self, path, rel, st):
+        self.mimetype = mimetypes.guess_type(rel)[0] or "application/octet-stream"
+        if rel == "index.html":
+            self.cache_control = CACHE_REVALIDATE
+        elif rel.startswith("assets/") and HASHED_NAME.search(rel):
+            self.cache_control = CACHE_IMMUTABLE
+        else:
+            self.cache_control = CACHE_DEFAULT
+        etag = f"{st.st_size:x}-{st.st_mtime_ns:x}"  # same in every worker, no read needed
+        # encoding -> (path, size, etag); identity is always present
+        self.variants = {"identity": (path, st.st_size, etag)}
+        self.compressible = _compressible(rel, st.st_size)
+        if self.compressible:
+            for encoding, ext in SIBLINGS:
+                try:
+                    sib = os.stat(path + ext)
+                except OSError:
+                    continue
+                if sib.st_mtime_ns >= st.st_mtime_ns:  # older than the source: stale build output
+                    self.variants[encoding] = (path + ext, sib.st_size, f"{etag}-{encoding}")
+
+    def variant(self, encoding):
+        """(path, size, etag) for encoding, identity when that sibling is missing."""
+        return self.variants.get(encoding, self.variants["identity"])
+
+
+class SpaAssets:
+    def __init__(self, dist_folder):
+        self.dist = dist_folder
+        self.assets = {}
+        self.scan()
+
+    def scan(self):
+        assets = {}
+        if os.path.isdir(self.dist):
+            for root, _dirs, files in os.walk(self.dist):
+                for name in files:
+                    if name.endswith((".gz", ".br")) and os.path.isfile(os.path.join(root, name[:-3])):
+                        continue  # precompressed sibling, attached to its source below
+                    full = os.path.join(root, name)
+                    rel = os.path.relpath(full, self.dist).replace(os.sep, "/")
+                    assets[rel] = Asset(full, rel, os.stat(full))
+        self.assets = assets
+
+    @property
+    def has_index(self):
+        return "index.html" in self.assets
+
+    def _pick_encoding(self, asset):
+        offered = tuple(enc for enc, _ext in SIBLINGS if enc in asset.variants)
+        if not offered:
+            return "identity"
+        return negotiate(request.headers.get("Accept-Encoding"), offered)
+
+    def response(self, rel):
+        """Response for a manifest entry, or None if rel is not a file in dist."""
+        asset = self.assets.get(rel)
+        if asset is None:
+            return None
+        encoding = self._pick_encoding(asset)
+        path, size, etag = asset.variant(encoding)
+
+        if request.if_none_match.contains(etag):
+            resp = Response(status=304)
+        else:
+            try:
+                fh = open(path, "rb")
+            except OSError:
+                return None  # removed since the scan
+            resp = Response(wrap_file(request.environ, fh), mimetype=asset.mimetype, direct_passthrough=True)
+            resp.content_length = size
+            if encoding != "identity":
+                resp.headers["Content-Encoding"] = encoding
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = asset.cache_control
+        if asset.compressible:
+            resp.headers["Vary"] = "Accept-Encoding"
+        return resp
+
+
+if __name__ == "__main__":
+    # build step: python spa_assets.py [dist]
+    import sys
+    dist = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DIST
+    print(f"{precompress(dist)} precompressed file(s) written in {dist}")
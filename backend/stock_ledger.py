@@ -0,0 +1,205 @@
+# backend/stock_ledger.py
+"""
+Append-only ledger of stock changes, with periodic per-tool snapshots.
+
+Every write to Tool.quantity appends a stock_movement row in the same transaction
+(record / record_many): tool creation, restock, approval deductions (and their reversal
+when an approved request is rejected), manual edits and CSV imports. The migration
+opens the ledger with each tool's quantity at that time.
+record_many also refreshes those tools in the low-stock set (low_stock.py), so call it
+after the quantity write.
+Deleting a tool keeps its movements (tool_id is set to NULL); delete_tools() first
+appends a 'deletion' movement that zeroes the balance and names the tool.
+
+snapshot() (`flask stock-snapshot`, run nightly) stores each changed tool's ledger
+quantity; quantities_at() answers "stock on date X" from the nearest snapshot at or
+before X plus the movements after it. reconcile() (`flask reconcile-stock`) compares
+Tool.quantity with the ledger sum for every tool in one grouped query.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app, has_request_context
+from flask_login import current_user
+from sqlalchemy import delete, func, insert, select, text, update
+
+from extensions import db
+import low_stock
+from models import ConsumptionRollup, LowStock, RequestedTool, StockMovement, StockSnapshot, Tool
+
+KINDS = ("opening", "initial", "restock", "approval", "edit", "import", "adjustment", "reversal", "deletion")
+
+
+def _actor_id():
+    if has_request_context() and getattr(current_user, "is_authenticated", False):
+        return current_user.id
+    return None
+
+
+def record_many(rows):
+    """
+    Append movements; rows are dicts with tool_id, delta, kind and optional request_id/note.
+    Zero deltas are dropped, except for the 'deletion' tombstone. Call inside the
+    transaction that changes Tool.quantity.
+    """
+    actor = _actor_id()
+    now = datetime.utcnow()
+    values = []
+    for r in rows:
+        if not r.get("delta") and r["kind"] != "deletion":
+            continue
+        if r["kind"] not in KINDS:
+            raise ValueError(f"unknown stock movement kind: {r['kind']}")
+        values.append({
+            "tool_id": r["tool_id"], "delta": int(r["delta"]), "kind": r["kind"],
+            "request_id": r.get("request_id"), "note": r.get("note"),
+            "user_id": actor, "created_at": now,
+        })
+    if values:
+        db.session.execute(insert(StockMovement), values)
+        low_stock.refresh(v["tool_id"] for v in values)
+
+
+def record(tool_id, delta, kind, request_id=None, note=None):
+    record_many([{"tool_id": tool_id, "delta": delta, "kind": kind, "request_id": request_id, "note": note}])
+
+
+def delete_tools(tool_ids):
+    """
+    Delete tools with bulk statements, in the caller's transaction: a 'deletion' tombstone
+    per tool, then their request lines, snapshots, low-stock and consumption rollup rows.
+    Movements stay with tool_id NULL. Everything is explicit rather than left to the FK
+    actions, which SQLite does not enforce (and a reused rowid would inherit stale rows).
+    Used by the DELETE endpoint and the seeder's --delete-inactive.
+    """
+    ids = sorted({int(i) for i in tool_ids})
+    if not ids:
+        return
+    record_many(
+        {"tool_id": tid, "delta": -(qty or 0), "kind": "deletion", "note": f"tool {tid} '{name}' deleted"[:255]}
+        for tid, name, qty in db.session.execute(select(Tool.id, Tool.name, Tool.quantity).where(Tool.id.in_(ids)))
+    )
+    for model in (RequestedTool, StockSnapshot, LowStock, ConsumptionRollup):
+        db.session.execute(delete(model).where(model.tool_id.in_(ids)).execution_options(synchronize_session=False))
+    db.session.execute(
+        update(StockMovement).where(StockMovement.tool_id.in_(ids)).values(tool_id=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(delete(Tool).where(Tool.id.in_(ids)).execution_options(synchronize_session=False))
+
+
+def _latest_snapshots(at=None):
+    """Subquery: newest snapshot per tool (taken at or before `at` when given)."""
+    newest = select(StockSnapshot.tool_id, func.max(StockSnapshot.id).label("sid")).group_by(StockSnapshot.tool_id)
+    if at is not None:
+        newest = newest.where(StockSnapshot.taken_at <= at)
+    newest = newest.subquery()
+    return (
+        select(StockSnapshot.tool_id, StockSnapshot.quantity, StockSnapshot.last_movement_id)
+        .join(newest, StockSnapshot.id == newest.c.sid)
+        .subquery()
+    )
+
+
+def _snapshot_cutoff():
+    """
+    Movements created before this are safe to fold into a snapshot: no transaction that
+    is still open can commit one with a lower id. On Postgres that is the start of the
+    oldest other open transaction; the STOCK_SNAPSHOT_SAFETY_S margin also covers clock
+    skew between app hosts and long transactions elsewhere.
+    """
+    cutoff = datetime.utcnow()
+    bind = db.session.get_bind()
+    if bind.dialect.name == "postgresql":
+        oldest = db.session.execute(text(
+            "SELECT min(xact_start) AT TIME ZONE 'UTC' FROM pg_stat_activity "
+            "WHERE datname = current_database() AND pid <> pg_backend_pid() AND xact_start IS NOT NULL"
+        )).scalar()
+        if oldest is not None:
+            cutoff = min(cutoff, oldest)
+    return cutoff - timedelta(seconds=current_app.config.get("STOCK_SNAPSHOT_SAFETY_S", 300))
+
+
+def snapshot():
+    """
+    Snapshot every tool whose ledger moved since its last snapshot. Returns the number written.
+
+    Only movements up to the newest one created before _snapshot_cutoff() are folded in,
+    so a movement from a transaction still in flight (lower id, committed later) is never
+    skipped; each snapshot records the last movement id it actually summed for its tool.
+    """
+    high = db.session.query(func.max(StockMovement.id)).filter(StockMovement.created_at < _snapshot_cutoff()).scalar()
+    if high is None:
+        return 0
+    snaps = _latest_snapshots()
+    rows = db.session.execute(
+        select(StockMovement.tool_id, func.sum(StockMovement.delta), func.max(StockMovement.id), func.max(snaps.c.quantity))
+        .outerjoin(snaps, snaps.c.tool_id == StockMovement.tool_id)
+        .where(
+            StockMovement.tool_id.isnot(None),  # movements of deleted tools
+            StockMovement.id > func.coalesce(snaps.c.last_movement_id, 0),
+            StockMovement.id <= high,
+        )
+        .group_by(StockMovement.tool_id)
+    ).all()
+    now = datetime.utcnow()
+    values = [
+        {"tool_id": tid, "taken_at": now, "quantity": int(prev or 0) + int(delta or 0), "last_movement_id": last}
+        for tid, delta, last, prev in rows
+    ]
+    if values:
+        db.session.execute(insert(StockSnapshot), values)
+    db.session.commit()
+    return len(values)
+
+
+def quantities_at(tool_ids, at):
+    """
+    Stock per tool at datetime `at`: nearest snapshot at or before `at` plus later movements
+    up to `at`. Returns {tool_id: int}; tools with no history map to 0.
+    """
+    ids = list({int(i) for i in tool_ids})
+    if not ids:
+        return {}
+    snaps = _latest_snapshots(at)
+    base = dict.fromkeys(ids, 0)
+    after = dict.fromkeys(ids, 0)
+    for tid, qty, _last in db.session.execute(select(snaps).where(snaps.c.tool_id.in_(ids))):
+        base[tid] = qty
+    for tid, delta in db.session.execute(
+        select(StockMovement.tool_id, func.sum(StockMovement.delta))
+        .outerjoin(snaps, snaps.c.tool_id == StockMovement.tool_id)
+        .where(
+            StockMovement.tool_id.in_(ids),
+            StockMovement.id > func.coalesce(snaps.c.last_movement_id, 0),
+            StockMovement.created_at <= at,
+        )
+        .group_by(StockMovement.tool_id)
+    ):
+        after[tid] = int(delta or 0)
+    return {tid: base[tid] + after[tid] for tid in ids}
+
+
+def reconcile(fix=False):
+    """
+    Tools whose quantity differs from their ledger sum, as dicts. With fix=True an
+    'adjustment' movement brings each ledger in line with Tool.quantity (and commits).
+    """
+    ledger = func.coalesce(func.sum(StockMovement.delta), 0)
+    rows = db.session.execute(
+        select(Tool.id, Tool.name, Tool.quantity, ledger)
+        .outerjoin(StockMovement, StockMovement.tool_id == Tool.id)
+        .group_by(Tool.id, Tool.name, Tool.quantity)
+        .having(func.coalesce(Tool.quantity, 0) != ledger)
+        .order_by(Tool.id)
+    ).all()
+    drift = [
+        {"tool_id": tid, "name": name, "quantity": qty or 0, "ledger": int(total), "drift": (qty or 0) - int(total)}
+        for tid, name, qty, total in rows
+    ]
+    if fix and drift:
+        record_many([
+            {"tool_id": d["tool_id"], "delta": d["drift"], "kind": "adjustment", "note": "reconcile-stock"}
+            for d in drift
+        ])
+        db.session.commit()
+    return drift
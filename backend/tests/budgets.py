@@ -0,0 +1,323 @@
+"""
+SQL statement budgets per API endpoint, to catch N+1 regressions.
+
+BUDGETS maps every endpoint in api.py to the most statements one request may issue.
+Each is a ceiling chosen for the endpoint, not its current count: reads get the
+statements their design needs plus a little room, writes the same for their ledger,
+rollup, low-stock and cache-version bookkeeping. Small changes fit under a ceiling;
+raise one only when a route is meant to do more work.
+
+Ceilings alone would let a per-row query hide under them on small tables, so the
+suite seeds a scratch database at two sizes, runs scenarios() for every endpoint at
+each size and also fails when an endpoint issues more statements at the larger size.
+A serializer that starts touching a lazy relationship per row (tool -> category,
+request -> user, requested tool -> tool, usage -> user) breaks that immediately.
+
+test_query_budget.py runs it under pytest (fixtures in conftest.py); query_budget.py
+in backend/ is the same check as a command with a table of counts. Single requests can
+be checked in any test:
+
+    with count_queries() as statements:
+        client.get("/api/tools").get_data()
+    assert len(statements) <= BUDGETS["api.list_tools"]
+
+or assert_within_budget(client, "GET", "/api/tools"), which resolves the endpoint
+from the URL and raises BudgetExceeded with the offending statements.
+
+Counts are taken with cold caches (user, category and catalog caches are cleared
+before each size), so the ceilings also cover the first request after a deploy.
+"""
+import io
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import event
+
+SIZES = (10, 100)  # seed sizes; the second must be large enough for growth to show
+
+BUDGETS = {
+    # auth and meta
+    "api.ping": 0,
+    "api.api_signup": 3,
+    "api.api_login": 2,
+    "api.me": 1,
+    "api.api_logout": 0,
+    "api.categories": 1,
+    "api.users": 2,
+    # tool reads
+    "api.list_tools": 4,
+    "api.search_tools": 3,
+    "api.tool_stock_at": 4,
+    "api.tool_logs": 3,
+    "api.export_csv": 2,
+    "api.catalog": 5,
+    # tool writes: ledger movement, low-stock refresh, search index, catalog version
+    "api.create_tool": 15,
+    "api.update_tool": 16,
+    "api.restock_tool": 8,
+    "api.delete_tool": 13,
+    "api.checkout_tool": 4,
+    "api.checkin_tool": 4,
+    "api.import_csv": 20,
+    # requests
+    "api.create_request": 5,
+    "api.my_requests": 2,
+    "api.admin_list_requests": 8,
+    "api.admin_edit_request": 3,
+    "api.admin_delete_request": 5,
+    # approvals: stock, ledger, rollup, low-stock and catalog version in one transaction
+    "api.admin_approve_request": 15,
+    "api.admin_batch_requests": 15,
+    "api.admin_reject_request": 14,
+    # reports
+    "api.admin_low_stock": 2,
+    "api.admin_consumption_report": 2,
+    # per-worker stats, no database
+    "api.admin_cache_stats": 0,
+    "api.admin_compression_stats": 0,
+    "api.prometheus_metrics": 0,
+    "api.admin_slow_queries": 0,
+    "api.admin_pool_stats": 0,
+}
+
+
+class BudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def count_queries(engine=None):
+    """Yields a list that collects every statement executed on `engine` (default: db.engine) inside the block."""
+    if engine is None:
+        from extensions import db
+        engine = db.engine
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _count)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", _count)
+
+
+def _endpoint_for(app, method, url):
+    path, _, query = url.partition("?")
+    adapter = app.url_map.bind("localhost", query_args=query)
+    endpoint, _args = adapter.match(path, method=method)
+    return endpoint
+
+
+def measure(client, method, url, **kwargs):
+    """(response, statements) for one request; streamed bodies are read in full inside the count."""
+    from extensions import db
+    with client.application.app_context():
+        engine = db.engine
+    with count_queries(engine) as statements:
+        r = client.open(url, method=method, **kwargs)
+        r.get_data()
+        r.close()
+    return r, statements
+
+
+def assert_within_budget(client, method, url, endpoint=None, **kwargs):
+    """Issue the request and raise BudgetExceeded if it runs more statements than its endpoint's budget."""
+    endpoint = endpoint or _endpoint_for(client.application, method, url)
+    r, statements = measure(client, method, url, **kwargs)
+    budget = BUDGETS[endpoint]
+    if len(statements) > budget:
+        listing = "\n".join(f"  {i}. {' '.join(s.split())[:200]}" for i, s in enumerate(statements, 1))
+        raise BudgetExceeded(f"{method} {url} ({endpoint}) ran {len(statements)} statements, budget {budget}:\n{listing}")
+    return r
+
+
+def missing_budgets(app):
+    """(endpoints with no budget, budgets naming no endpoint) for the api blueprint."""
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules() if rule.endpoint.startswith("api.")}
+    return sorted(endpoints - set(BUDGETS)), sorted(set(BUDGETS) - endpoints)
+
+
+# ---------- Scratch data and scenarios ----------
+def seed(n):
+    """Seed n tools, requests, usage rows and extra users. Returns the ids the scenarios need."""
+    from sqlalchemy import insert
+    from werkzeug.security import generate_password_hash
+    from extensions import db
+    from models import (Users, Tool, ToolCategory, ToolUsage, Request as RequestModel,
+                        RequestedTool, StockMovement)
+    import low_stock
+    import rollups
+    import stock_ledger
+
+    pw = generate_password_hash("budget")
+    db.session.execute(insert(Users), [
+        {"first_name": "Admin", "email": "admin@budget", "username": "budget-admin", "facility": "HQ",
+         "password": pw, "roles": "admin", "is_active_flag": True},
+        {"first_name": "User", "email": "user@budget", "username": "budget-user", "facility": "F1",
+         "password": pw, "roles": "user", "is_active_flag": True},
+    ] + [
+        {"first_name": f"Staff {i}", "email": f"s{i}@budget", "username": f"staff-{i}", "facility": f"F{i % 4}",
+         "password": pw, "roles": "user", "is_active_flag": True}
+        for i in range(n)
+    ])
+    admin_id = db.session.query(Users.id).filter_by(username="budget-admin").scalar()
+    user_id = db.session.query(Users.id).filter_by(username="budget-user").scalar()
+
+    db.session.execute(insert(ToolCategory), [{"name": f"Budget Category {i}"} for i in range(max(3, n // 10))])
+    cat_ids = [c for (c,) in db.session.query(ToolCategory.id).order_by(ToolCategory.id)]
+    db.session.execute(insert(Tool), [
+        {"name": f"Tool {i:05d}", "description": f"budget tool {i}", "quantity": 100 + i % 7,
+         "reorder_level": 105 if i % 3 == 0 else 0, "category_id": cat_ids[i % len(cat_ids)]}
+        for i in range(n)
+    ])
+    tools = db.session.query(Tool.id, Tool.quantity).order_by(Tool.id).all()
+    tool_ids = [tid for tid, _q in tools]
+    db.session.execute(insert(StockMovement), [
+        {"tool_id": tid, "delta": qty, "kind": "opening", "created_at": datetime.utcnow()} for tid, qty in tools
+    ])
+
+    now = datetime.utcnow()
+    db.session.execute(insert(RequestModel), [
+        {"user_id": user_id, "status": "Approved" if i % 5 == 0 else "Pending", "date_requested": now,
+         "date_approved": now if i % 5 == 0 else None}
+        for i in range(n)
+    ])
+    requests = db.session.query(RequestModel.id, RequestModel.status).order_by(RequestModel.id).all()
+    db.session.execute(insert(RequestedTool), [
+        {"request_id": rid, "tool_id": tool_ids[(rid + k) % n], "quantity": 1, "status": status}
+        for rid, status in requests for k in (0, 1)
+    ])
+    db.session.execute(insert(ToolUsage), [
+        {"tool_id": tool_ids[0], "user_id": admin_id if i % 2 else user_id, "quantity_used": 1, "date_used": now}
+        for i in range(n)
+    ])
+    db.session.commit()
+    rollups.rebuild()
+    low_stock.rebuild()
+    stock_ledger.snapshot()
+
+    pending = [rid for rid, status in requests if status == "Pending"]
+    approved = [rid for rid, status in requests if status == "Approved"]
+    line_ids = [lid for (lid,) in db.session.query(RequestedTool.id).filter_by(request_id=pending[-2])]
+    return {"n": n, "tools": tool_ids, "pending": pending, "approved": approved, "edit_lines": line_ids,
+            "category": "Budget Category 0"}
+
+
+def scenarios(ids):
+    """(endpoint, role, method, url, request kwargs). role is 'admin', 'user' or None (anonymous)."""
+    n, tools, pending = ids["n"], ids["tools"], ids["pending"]
+    batch = pending[1:-3]  # the last three are kept pending for reject, edit and delete
+    half = len(batch) // 2
+    csv_rows = "".join(  # half existing names (updates), half new
+        f"Tool {i:05d},{ids['category'] if i % 2 else 'Imported Category'},imported,{i}\n" for i in range(n // 2, n + n // 2)
+    )
+    csv_body = ("name,category,description,quantity\n" + csv_rows).encode("utf-8")
+    return [
+        ("api.ping", None, "GET", "/api/ping", {}),
+        ("api.api_signup", None, "POST", "/api/signup",
+         {"json": {"username": "budget-new", "password": "pw", "first_name": "New", "facility": "F1"}}),
+        ("api.api_login", None, "POST", "/api/login", {"json": {"username": "budget-user", "password": "budget"}}),
+        ("api.me", "user", "GET", "/api/me", {}),
+        ("api.api_logout", "user", "POST", "/api/logout", {}),
+        ("api.list_tools", "user", "GET", "/api/tools", {}),
+        ("api.list_tools", "user", "GET", "/api/tools?limit=20&include_total=1&stock=in", {}),
+        ("api.list_tools", "user", "GET", "/api/tools?q=Tool", {}),
+        ("api.search_tools", "user", "GET", "/api/tools/search?q=tool", {}),
+        ("api.create_tool", "admin", "POST", "/api/tools",
+         {"json": {"name": "Budget New Tool", "category": ids["category"], "quantity": 5, "reorder_level": 10}}),
+        ("api.update_tool", "admin", "PUT", f"/api/tools/{tools[1]}",
+         {"json": {"quantity": 3, "reorder_level": 4, "category": "Budget Category 1"}}),
+        ("api.restock_tool", "admin", "POST", f"/api/tools/{tools[1]}/restock", {"json": {"quantity": 5}}),
+        ("api.tool_stock_at", "admin", "GET", f"/api/tools/{tools[1]}/stock?at={datetime.utcnow().date().isoformat()}", {}),
+        ("api.checkout_tool", "admin", "POST", f"/api/tools/{tools[2]}/checkout", {"json": {"assignee": "x"}}),
+        ("api.checkin_tool", "admin", "POST", f"/api/tools/{tools[2]}/checkin", {}),
+        ("api.tool_logs", "admin", "GET", f"/api/tools/{tools[0]}/logs", {}),
+        ("api.tool_logs", "admin", "GET", f"/api/tools/{tools[0]}/logs?limit=20", {}),
+        ("api.export_csv", "admin", "GET", "/api/tools/export", {}),
+        ("api.import_csv", "admin", "POST", "/api/tools/import",
+         {"data": {"file": (io.BytesIO(csv_body), "tools.csv")}, "content_type": "multipart/form-data"}),
+        ("api.categories", "user", "GET", "/api/categories", {}),
+        ("api.users", "admin", "GET", "/api/users", {}),
+        ("api.catalog", "user", "GET", "/api/catalog", {}),
+        ("api.create_request", "user", "POST", "/api/requests",
+         {"json": {"items": [{"tool_id": t, "quantity": 1} for t in tools[:max(3, n // 10)]]}}),
+        ("api.my_requests", "user", "GET", "/api/requests", {}),
+        ("api.admin_cache_stats", "admin", "GET", "/api/admin/caches", {}),
+        ("api.admin_compression_stats", "admin", "GET", "/api/admin/compression", {}),
+        ("api.prometheus_metrics", "admin", "GET", "/api/metrics", {}),
+        ("api.admin_slow_queries", "admin", "GET", "/api/admin/slow-queries", {}),
+        ("api.admin_pool_stats", "admin", "GET", "/api/admin/pool", {}),
+        ("api.admin_list_requests", "admin", "GET", "/api/admin/requests", {}),
+        ("api.admin_list_requests", "admin", "GET", "/api/admin/requests?status=Pending&limit=20", {}),
+        ("api.admin_low_stock", "admin", "GET", "/api/admin/low-stock", {}),
+        ("api.admin_consumption_report", "admin", "GET", "/api/admin/reports/consumption", {}),
+        ("api.admin_approve_request", "admin", "POST", f"/api/admin/requests/{pending[0]}/approve", {}),
+        ("api.admin_batch_requests", "admin", "POST", "/api/admin/requests/batch",
+         {"json": {"action": "approve", "ids": batch[:half]}}),
+        ("api.admin_batch_requests", "admin", "POST", "/api/admin/requests/batch",
+         {"json": {"action": "reject", "ids": batch[half:]}}),
+        ("api.admin_reject_request", "admin", "POST", f"/api/admin/requests/{pending[-1]}/reject", {}),
+        ("api.admin_reject_request", "admin", "POST", f"/api/admin/requests/{ids['approved'][0]}/reject", {}),
+        ("api.admin_edit_request", "admin", "PUT", f"/api/admin/requests/{pending[-2]}",
+         {"json": {"lines": [{"id": lid, "quantity": 2} for lid in ids["edit_lines"]]}}),
+        ("api.admin_delete_request", "admin", "DELETE", f"/api/admin/requests/{pending[-3]}", {}),
+        ("api.delete_tool", "admin", "DELETE", f"/api/tools/{tools[-1]}", {"json": {"password": "ecews@2022"}}),
+    ]
+
+
+def run(app, n):
+    """Seed a fresh database with n rows per table and run every scenario. Returns {endpoint: [(url, status, statements)]}."""
+    from extensions import db
+    import catalog_cache
+    import category_cache
+    import user_cache
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        ids = seed(n)
+        db.session.remove()
+        user_cache.invalidate()
+        category_cache.invalidate()
+        catalog_cache.invalidate()
+
+    results = {}
+    for endpoint, role, method, url, kwargs in scenarios(ids):
+        client = app.test_client()
+        if role:
+            login = client.post("/api/login", json={"username": f"budget-{role}", "password": "budget"})
+            login.close()
+            if login.status_code != 200:
+                raise RuntimeError(f"could not log in as {role}: {login.status_code}")
+        r, statements = measure(client, method, url, **kwargs)
+        results.setdefault(endpoint, []).append((f"{method} {url}", r.status_code, statements))
+    return results
+
+
+def problems(endpoint, per_size):
+    """
+    Failures of one endpoint given per_size = {n: run(app, n)}, as (message, statements):
+    error statuses, requests over budget, and requests issuing more statements than
+    at the smallest size.
+    """
+    sizes = sorted(per_size)
+    budget = BUDGETS.get(endpoint)
+    out = []
+    if budget is None:
+        out.append((f"{endpoint}: no budget declared", []))
+    if any(endpoint not in per_size[n] for n in sizes):
+        return out + [(f"{endpoint}: no scenario", [])]
+    for n in sizes:
+        for (req, status, statements), (_r0, _s0, small) in zip(per_size[n][endpoint], per_size[sizes[0]][endpoint]):
+            problem = None
+            if status >= 400:
+                problem = f"returned {status}"
+            elif budget is not None and len(statements) > budget:
+                problem = f"{len(statements)} statements, budget {budget}"
+            elif len(statements) > len(small):
+                problem = f"{len(statements)} statements vs {len(small)} at n={sizes[0]} (grows with rows)"
+            if problem:
+                out.append((f"{endpoint}: {req} at n={n}: {problem}", statements))
+    return out
@@ -0,0 +1,71 @@
+"""
+Shared fixtures. The app runs against a scratch database: a temporary SQLite file, or
+TEST_DATABASE_URL (e.g. a throwaway Postgres database; ALL TABLES ARE DROPPED).
+"""
+import os
+import tempfile
+
+import pytest
+
+_url = os.environ.get("TEST_DATABASE_URL") or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+# read by config.py at import time, so set before the app is imported
+os.environ["DATABASE_URL"] = _url
+os.environ["DEV_DATABASE_URL"] = _url
+os.environ.setdefault("SLOW_QUERY_MS", "0")
+os.environ.setdefault("STARTUP_TIMING_REPORT", "0")
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import create_app
+    return create_app()
+
+
+@pytest.fixture(scope="session")
+def budget_runs(app):
+    """Every budget scenario run at each of budgets.SIZES: {n: {endpoint: [(request, status, statements)]}}."""
+    from tests import budgets
+    return {n: budgets.run(app, n) for n in budgets.SIZES}
+
+
+@pytest.fixture
+def accounts(app):
+    """Empty schema with an admin and a user (password 'pw'); returns {'admin': id, 'user': id}."""
+    from werkzeug.security import generate_password_hash
+    from extensions import db
+    from models import Users
+    import catalog_cache
+    import category_cache
+    import user_cache
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        pw = generate_password_hash("pw")
+        for name, role in (("admin", "admin"), ("user", "user")):
+            db.session.add(Users(first_name=name.title(), email=f"{name}@test", username=name, facility="F1",
+                                 password=pw, roles=role))
+        db.session.commit()
+        ids = {u.username: u.id for u in Users.query}
+        db.session.remove()
+        user_cache.invalidate()
+        category_cache.invalidate()
+        catalog_cache.invalidate()
+    return ids
+
+
+def _login(app, username):
+    client = app.test_client()
+    r = client.post("/api/login", json={"username": username, "password": "pw"})
+    assert r.status_code == 200, r.get_data(as_text=True)
+    return client
+
+
+@pytest.fixture
+def admin(app, accounts):
+    return _login(app, "admin")
+
+
+@pytest.fixture
+def user(app, accounts):
+    return _login(app, "user")
@@ -0,0 +1,16 @@
+"""SQL timing hooks (metrics.py)."""
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from extensions import db
+
+
+def test_failed_statements_do_not_leave_start_times(app, accounts):
+    with app.app_context():
+        conn = db.session.connection()
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+        conn.execute(text("SELECT 1"))
+        assert conn.info.get("ecews_query_start") == []
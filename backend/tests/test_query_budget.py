@@ -0,0 +1,20 @@
+"""SQL statement budgets for every API endpoint (see budgets.py)."""
+import pytest
+
+from tests import budgets
+
+
+def test_every_endpoint_has_a_budget(app):
+    no_budget, stale = budgets.missing_budgets(app)
+    assert not no_budget, f"endpoints without a budget: {no_budget}"
+    assert not stale, f"budgets for endpoints that no longer exist: {stale}"
+
+
+@pytest.mark.parametrize("endpoint", sorted(budgets.BUDGETS))
+def test_within_budget(budget_runs, endpoint):
+    failures = budgets.problems(endpoint, budget_runs)
+    detail = []
+    for message, statements in failures:
+        detail.append(message)
+        detail += [f"    {' '.join(s.split())[:200]}" for s in statements]
+    assert not failures, "\n".join(detail)
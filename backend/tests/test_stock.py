@@ -0,0 +1,252 @@
+"""Stock deduction on approval, its reversal, the retry wrapper (api.py) and tool deletion."""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
+
+import api
+from extensions import db
+from models import (ConsumptionRollup, LowStock, Request, RequestedTool, StockMovement, StockSnapshot,
+                    Tool)
+
+
+def create_tool(admin, name, quantity):
+    r = admin.post("/api/tools", json={"name": name, "category": "Test", "quantity": quantity})
+    assert r.status_code == 201, r.get_data(as_text=True)
+    return r.get_json()["id"]
+
+
+def create_request(user, *lines):
+    r = user.post("/api/requests", json={"items": [{"tool_id": t, "quantity": q} for t, q in lines]})
+    assert r.status_code == 201, r.get_data(as_text=True)
+    return r.get_json()["request_id"]
+
+
+def quantity(app, tid):
+    with app.app_context():
+        return db.session.get(Tool, tid).quantity
+
+
+def movements(app, tid):
+    with app.app_context():
+        return [(m.kind, m.delta) for m in StockMovement.query.filter_by(tool_id=tid).order_by(StockMovement.id)]
+
+
+def test_approve_deducts_stock_and_records_movement(app, admin, user):
+    tid = create_tool(admin, "Drill", 5)
+    rid = create_request(user, (tid, 3))
+
+    assert admin.post(f"/api/admin/requests/{rid}/approve").status_code == 200
+    assert quantity(app, tid) == 2
+    assert movements(app, tid) == [("initial", 5), ("approval", -3)]
+
+
+def test_approve_short_stock_is_409_and_changes_nothing(app, admin, user):
+    tid = create_tool(admin, "Drill", 5)
+    first = create_request(user, (tid, 3))
+    second = create_request(user, (tid, 3))
+
+    assert admin.post(f"/api/admin/requests/{first}/approve").status_code == 200
+    r = admin.post(f"/api/admin/requests/{second}/approve")
+    assert r.status_code == 409
+    assert "Insufficient stock" in r.get_json()["error"]
+    assert quantity(app, tid) == 2
+    assert movements(app, tid) == [("initial", 5), ("approval", -3)]
+    statuses = {x["id"]: x["status"] for x in admin.get("/api/admin/requests").get_json()}
+    assert statuses == {first: "Approved", second: "Pending"}
+
+
+def test_approve_twice_deducts_once(app, admin, user):
+    tid = create_tool(admin, "Drill", 5)
+    rid = create_request(user, (tid, 1))
+
+    assert admin.post(f"/api/admin/requests/{rid}/approve").status_code == 200
+    assert admin.post(f"/api/admin/requests/{rid}/approve").status_code == 400  # no longer pending
+    assert quantity(app, tid) == 4
+
+
+def test_reject_approved_request_restores_stock(app, admin, user):
+    tid = create_tool(admin, "Drill", 5)
+    rid = create_request(user, (tid, 3))
+    assert admin.post(f"/api/admin/requests/{rid}/approve").status_code == 200
+
+    assert admin.post(f"/api/admin/requests/{rid}/reject").status_code == 200
+    assert quantity(app, tid) == 5
+    assert movements(app, tid) == [("initial", 5), ("approval", -3), ("reversal", 3)]
+    # already rejected: no second reversal
+    admin.post(f"/api/admin/requests/{rid}/reject")
+    assert quantity(app, tid) == 5
+    assert len(movements(app, tid)) == 3
+
+
+def test_reject_pending_request(app, admin, user):
+    tid = create_tool(admin, "Drill", 5)
+    rid = create_request(user, (tid, 3))
+
+    assert admin.post(f"/api/admin/requests/{rid}/reject").status_code == 200
+    with app.app_context():
+        r = db.session.get(Request, rid)
+        assert r.status == "Rejected"
+        assert [ln.status for ln in r.requested_tools] == ["Rejected"]
+    assert admin.post(f"/api/admin/requests/{rid}/reject").status_code == 409
+    assert quantity(app, tid) == 5
+
+
+def test_reject_loses_to_an_approval_committed_after_the_read(admin, user, monkeypatch):
+    tid = create_tool(admin, "Drill", 5)
+    rid = create_request(user, (tid, 3))
+    real = api._claim_pending
+
+    def approved_meanwhile(req_ids, new_status, stamp_column):
+        # what a concurrent approval leaves behind once it commits
+        db.session.execute(update(Request).where(Request.id.in_(req_ids)).values(status="Approved"))
+        return real(req_ids, new_status, stamp_column)
+
+    monkeypatch.setattr(api, "_claim_pending", approved_meanwhile)
+    r = admin.post(f"/api/admin/requests/{rid}/reject")
+    assert r.status_code == 409
+
+
+def _serialization_failure():
+    orig = Exception("could not serialize access")
+    orig.pgcode = "40001"
+    return OperationalError("UPDATE tool ...", {}, orig)
+
+
+def test_with_retry_reruns_after_serialization_failure(app, accounts, monkeypatch):
+    monkeypatch.setattr(api.time, "sleep", lambda _s: None)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) == 1:
+            raise _serialization_failure()
+        return "done"
+
+    with app.app_context():
+        assert api._with_retry(fn) == "done"
+    assert len(calls) == 2
+
+
+def test_with_retry_gives_up_and_reraises(app, accounts, monkeypatch):
+    monkeypatch.setattr(api.time, "sleep", lambda _s: None)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        raise _serialization_failure()
+
+    with app.app_context(), pytest.raises(OperationalError):
+        api._with_retry(fn)
+    assert len(calls) == api.APPROVE_MAX_ATTEMPTS
+
+
+def test_with_retry_does_not_retry_other_errors(app, accounts):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        raise OperationalError("SELECT 1", {}, Exception("syntax error"))
+
+    with app.app_context(), pytest.raises(OperationalError):
+        api._with_retry(fn)
+    assert len(calls) == 1
+
+
+def test_batch_approve_allocates_stock_per_tool_across_the_batch(app, admin, user):
+    tid = create_tool(admin, "Drill", 5)
+    other = create_tool(admin, "Saw", 1)
+    a = create_request(user, (tid, 3))
+    b = create_request(user, (tid, 3), (other, 1))  # does not fit after a
+    c = create_request(user, (tid, 2))
+
+    r = admin.post("/api/admin/requests/batch", json={"action": "approve", "ids": [a, b, c]})
+    assert r.status_code == 200
+    results = {o["id"]: o["result"] for o in r.get_json()["results"]}
+    assert results == {a: "approved", b: "insufficient_stock", c: "approved"}
+    assert quantity(app, tid) == 0
+    assert quantity(app, other) == 1  # b is all or nothing
+    assert movements(app, tid) == [("initial", 5), ("approval", -3), ("approval", -2)]
+    assert movements(app, other) == [("initial", 1)]
+    statuses = {x["id"]: x["status"] for x in admin.get("/api/admin/requests").get_json()}
+    assert statuses == {a: "Approved", b: "Pending", c: "Approved"}
+
+
+def test_batch_reject_leaves_stock_alone(app, admin, user):
+    tid = create_tool(admin, "Drill", 5)
+    a = create_request(user, (tid, 3))
+    b = create_request(user, (tid, 3))
+    assert admin.post(f"/api/admin/requests/{a}/approve").status_code == 200
+
+    r = admin.post("/api/admin/requests/batch", json={"action": "reject", "ids": [a, b]})
+    assert {o["id"]: o["result"] for o in r.get_json()["results"]} == {a: "not_pending", b: "rejected"}
+    assert quantity(app, tid) == 2
+
+
+@pytest.mark.parametrize("bad", [True, 2.7, "x", None])
+def test_batch_rejects_non_integer_ids(admin, bad):
+    r = admin.post("/api/admin/requests/batch", json={"action": "approve", "ids": [bad]})
+    assert r.status_code == 400
+
+
+@pytest.mark.parametrize("field", ["tool_id", "quantity"])
+@pytest.mark.parametrize("bad", [True, 2.7])
+def test_create_request_rejects_non_integer_lines(app, admin, user, field, bad):
+    tid = create_tool(admin, "Drill", 5)
+    line = {"tool_id": tid, "quantity": 1, field: bad}
+    assert user.post("/api/requests", json={"items": [line]}).status_code == 400
+    assert user.get("/api/requests").get_json() == []
+
+
+def test_create_request_accepts_integral_numbers(app, admin, user):
+    tid = create_tool(admin, "Drill", 5)
+    r = user.post("/api/requests", json={"items": [{"tool_id": str(tid), "quantity": 2.0}]})
+    assert r.status_code == 201
+
+
+def _leftovers(tid):
+    return {
+        model.__tablename__: db.session.query(model).filter(model.tool_id == tid).count()
+        for model in (RequestedTool, StockSnapshot, LowStock, ConsumptionRollup, StockMovement)
+    }
+
+
+def _approved_low_tool(app, admin, user):
+    r = admin.post("/api/tools", json={"name": "Drill", "category": "Test", "quantity": 5, "reorder_level": 10})
+    tid = r.get_json()["id"]
+    rid = create_request(user, (tid, 3))
+    assert admin.post(f"/api/admin/requests/{rid}/approve").status_code == 200
+    with app.app_context():
+        db.session.add(StockSnapshot(tool_id=tid, taken_at=datetime.utcnow(), quantity=2, last_movement_id=1))
+        db.session.commit()
+        assert all(_leftovers(tid).values())
+    return tid
+
+
+def _tombstones(name):
+    return [(m.tool_id, m.delta) for m in StockMovement.query.filter_by(kind="deletion")
+            if f"'{name}'" in (m.note or "")]
+
+
+def test_delete_tool_removes_derived_rows_and_keeps_the_ledger(app, admin, user):
+    tid = _approved_low_tool(app, admin, user)
+
+    assert admin.delete(f"/api/tools/{tid}", json={"password": "ecews@2022"}).status_code == 200
+    with app.app_context():
+        assert not any(_leftovers(tid).values())
+        assert _tombstones("Drill") == [(None, -2)]
+        assert StockMovement.query.filter(StockMovement.tool_id.is_(None)).count() == 3
+
+
+def test_seeder_deletes_tools_like_the_endpoint(app, admin, user):
+    import seed
+
+    tid = _approved_low_tool(app, admin, user)
+    with app.app_context():
+        seed.apply_plan({"new_categories": [], "create": [], "update": [], "skipped": [],
+                         "delete": [{"row": 2, "id": tid, "name": "Drill"}]})
+        db.session.commit()
+        assert db.session.get(Tool, tid) is None
+        assert not any(_leftovers(tid).values())
+        assert _tombstones("Drill") == [(None, -2)]
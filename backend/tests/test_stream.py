@@ -0,0 +1,41 @@
+"""Streamed JSON arrays (json_provider.stream_json_array)."""
+import pytest
+
+import api
+from extensions import db
+from models import Tool, ToolCategory
+
+
+@pytest.fixture
+def many_tools(app, accounts):
+    n = api.STREAM_BATCH_SIZE * 2 + 1
+    with app.app_context():
+        cat = ToolCategory(name="Bulk")
+        db.session.add(cat)
+        db.session.flush()
+        db.session.add_all(Tool(name=f"T{i:05d}", quantity=i, category_id=cat.id) for i in range(n))
+        db.session.commit()
+    return n
+
+
+def test_orm_rows_stream_past_the_first_batch(app, admin, many_tools):
+    r = admin.get("/api/tools")
+    assert r.status_code == 200
+    assert len(r.get_json()) == many_tools
+    with app.app_context():
+        assert db.engine.pool.checkedout() == 0
+
+
+def test_failure_mid_stream_is_raised_not_truncated(admin, many_tools, monkeypatch):
+    real = api.tool_to_dict
+    calls = []
+
+    def failing(t):
+        calls.append(t.id)
+        if len(calls) > api.STREAM_BATCH_SIZE:
+            raise RuntimeError("late")
+        return real(t)
+
+    monkeypatch.setattr(api, "tool_to_dict", failing)
+    with pytest.raises(RuntimeError, match="late"):
+        admin.get("/api/tools")
@@ -0,0 +1,98 @@
+# backend/user_cache.py
+"""
+Per-worker cache for Flask-Login's user_loader.
+
+Only the columns needed for auth, role checks and /api/me are loaded (never the
+password hash), into a small detached AuthUser object that is safe to share between
+threads. Entries live for USER_CACHE_TTL seconds in a bounded LRU; ORM updates and
+deletes of Users evict the affected id immediately in this worker, and the TTL bounds
+how long other workers can see an old role or active flag.
+"""
+import time
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import event
+
+from extensions import db
+from models import Users
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # (db url, user id) -> (AuthUser, stored_at)
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+AUTH_COLUMNS = ("id", "first_name", "username", "email", "facility", "roles", "is_active_flag")
+
+
+class AuthUser(UserMixin):
+    """Read-only snapshot of a Users row for current_user."""
+
+    def __init__(self, row):
+        for col in AUTH_COLUMNS:
+            setattr(self, col, getattr(row, col))
+
+    @property
+    def is_active(self):
+        return bool(self.is_active_flag) if self.is_active_flag is not None else True
+
+    def __repr__(self):
+        return f"<AuthUser {self.id} {self.username}>"
+
+
+def _key(user_id):
+    return (str(db.session.get_bind().url), user_id)
+
+
+def load(user_id):
+    """AuthUser for user_id, or None if the user does not exist."""
+    cfg = current_app.config
+    ttl = cfg.get("USER_CACHE_TTL", 60)
+    key = _key(user_id)
+    with _lock:
+        hit = _entries.get(key)
+        if hit is not None and time.monotonic() - hit[1] <= ttl:
+            _entries.move_to_end(key)
+            _stats["hits"] += 1
+            return hit[0]
+        _stats["misses"] += 1
+
+    row = (
+        db.session.query(*[getattr(Users, c) for c in AUTH_COLUMNS])
+        .filter(Users.id == user_id)
+        .first()
+    )
+    if row is None:
+        invalidate(user_id)
+        return None
+    user = AuthUser(row)
+    with _lock:
+        _entries[key] = (user, time.monotonic())
+        _entries.move_to_end(key)
+        while len(_entries) > cfg.get("USER_CACHE_SIZE", 2048):
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+    return user
+
+
+def invalidate(user_id=None):
+    """Drop one user (or everyone) from this worker's cache."""
+    with _lock:
+        if user_id is None:
+            _entries.clear()
+            return
+        for key in [k for k in _entries if k[1] == user_id]:
+            del _entries[key]
+
+
+def stats():
+    with _lock:
+        return {**_stats, "size": len(_entries), "max_size": current_app.config.get("USER_CACHE_SIZE", 2048)}
+
+
+@event.listens_for(Users, "after_update")
+@event.listens_for(Users, "after_delete")
+def _user_changed(mapper, connection, target):
+    # role, profile or active-flag edits must not be served from a stale entry
+    invalidate(target.id)
@@ -83,11 +83,29 @@ export const api = {
     return asJson(r);
   },
 
-  async toolLogs(id) {
-    const r = await fetch(`${API_URL}/api/tools/${id}/logs`, { credentials: 'include' });
+  async toolLogs(id, params = {}) {
+    // params: from, to, facility, limit, cursor (limit/cursor -> { items, next_cursor, limit })
+    const q = new URLSearchParams(params).toString();
+    const r = await fetch(`${API_URL}/api/tools/${id}/logs${q ? `?${q}` : ''}`, { credentials: 'include' });
+    return asJson(r);
+  },
+
+  async restockTool(id, quantity, note) {
+    const r = await fetch(`${API_URL}/api/tools/${id}/restock`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      credentials: 'include',
+      body: JSON.stringify({ quantity, note }),
+    });
     return asJson(r);
   },
 
+  async toolStockAt(id, at) {
+    const qs = at ? `?at=${encodeURIComponent(at)}` : '';
+    const r = await fetch(`${API_URL}/api/tools/${id}/stock${qs}`, { credentials: 'include' });
+    return asJson(r); // { tool_id, at, quantity, current }
+  },
+
   async checkoutTool(id, assignee) {
     const r = await fetch(`${API_URL}/api/tools/${id}/checkout`, {
       method: 'POST',
@@ -183,6 +201,27 @@ export const api = {
     });
     return asJson(r);
   },
+  async adminBatchRequests(ids, action) {
+    const r = await fetch(`${API_URL}/api/admin/requests/batch`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      credentials: 'include',
+      body: JSON.stringify({ ids, action }), // action: 'approve' | 'reject'
+    });
+    return asJson(r); // { results: [{ id, result, error? }], summary }
+  },
+  async adminLowStock(params = {}) {
+    // params: category_id
+    const q = new URLSearchParams(params).toString();
+    const r = await fetch(`${API_URL}/api/admin/low-stock${q ? `?${q}` : ''}`, { credentials: 'include' });
+    return asJson(r); // { items: [{ id, name, category, quantity, reorder_level, shortfall, since }], count }
+  },
+  async adminConsumptionReport(params = {}) {
+    // params: from, to (YYYY-MM), facility, tool_id, category_id
+    const q = new URLSearchParams(params).toString();
+    const r = await fetch(`${API_URL}/api/admin/reports/consumption${q ? `?${q}` : ''}`, { credentials: 'include' });
+    return asJson(r); // { items: [{ tool_id, tool_name, facility, month, approved, used }], totals }
+  },
   async adminEditRequest(id, lines) {
     const r = await fetch(`${API_URL}/api/admin/requests/${id}`, {
       method: 'PUT',